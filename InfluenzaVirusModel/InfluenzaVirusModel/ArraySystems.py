@@ -0,0 +1,264 @@
+import numpy as np
+
+import Kernels
+import Systems
+import Worldspace
+from Cells import EpithelialCell, ImmuneCell, EpithelialStates, ImmuneStates
+
+EPITHELIAL_STATE_COUNT = 6
+IMMUNE_STATE_COUNT = 3
+INITIAL_IMMUNE_CAPACITY = 64
+
+class ArrayEpithelialSystem(Systems.EpithelialSystem):
+    """Array backed EpithelialSystem. The per cell loops run as compiled kernels, see Kernels.py.
+
+    Cell data is held in flat arrays indexed x * GRID_HEIGHT + y instead of EpithelialCell objects, so there is no world
+    of Worldsites to go with it. Foci are not tracked, FocusSystem requires the object backend.
+    """
+
+    def __init__(self, rng=None, fixedRolls=False):
+        """Constructor for ArrayEpithelialSystem
+
+        Keyword arguments
+        rng -- numpy RandomState to draw from, a new unseeded one by default.
+        fixedRolls -- Draw a fixed block of rolls per cell each step, so that each cell rolls the same numbers whatever
+                      the other cells do. Slower, used to compare configurations on common random numbers.
+        """
+        Systems.EpithelialSystem.__init__(self, None)
+
+        self.rng = rng if rng != None else np.random.RandomState()
+        self.fixedRolls = fixedRolls
+        self.size = Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT
+
+        self.state        = np.full(self.size, EpithelialStates.HEALTHY, dtype=np.uint8)
+        self.nextState    = np.full(self.size, EpithelialStates.HEALTHY, dtype=np.uint8)
+        self.age          = np.zeros(self.size, dtype=np.int32)
+        self.delay        = np.zeros(self.size, dtype=np.int32)
+        self.timeInfected = np.zeros(self.size, dtype=np.int32)
+        self.canInfect    = np.ones(self.size, dtype=np.uint8)
+        self.focusId      = np.full(self.size, Kernels.NO_FOCUS, dtype=np.int32)
+        self.counts       = np.zeros(EPITHELIAL_STATE_COUNT, dtype=np.int64)
+
+    def initialise(self):
+        """Sets every cell healthy, then infects randomly chosen cells for the initial infected count."""
+
+        initialInfected = int(self.size * self.INFECT_INIT) if int(self.size * self.INFECT_INIT) > 1 else 1
+        self.initialInfected = initialInfected
+
+        if ArrayEpithelialSystem.RANDOM_AGE:
+            self.age[:] = self.rng.randint(0, EpithelialCell.CELL_LIFESPAN + 1, self.size)
+
+        infected = self.rng.choice(self.size, initialInfected, replace=False)
+        self.state[infected] = EpithelialStates.CONTAINING
+        self.nextState[infected] = EpithelialStates.CONTAINING
+        self.focusId[infected] = np.arange(initialInfected, dtype=np.int32)
+
+        self.counts[EpithelialStates.HEALTHY] = self.size - initialInfected
+        self.counts[EpithelialStates.CONTAINING] = initialInfected
+        self.__updateCounters()
+
+    def update(self):
+        """Runs the age, regeneration and infection steps over every cell."""
+
+        dead = self.counts[EpithelialStates.INFECTION_DEATH] + self.counts[EpithelialStates.NATURAL_DEATH]
+        regenChance = 1.0
+        if dead != 0:
+            regenChance = float(self.counts[EpithelialStates.HEALTHY]) / dead * 1.0 / EpithelialCell.DIVISION_TIME
+        infectChance = float((1 / ArrayEpithelialSystem.MAX_NEIGHBOURS) * (EpithelialCell.INFECT_RATE / Systems.ImmuneSystem.FLOW_RATE))
+
+        if self.fixedRolls:
+            draws = Kernels.ROLLS_PER_CELL * self.size
+        else:
+            # Upper bound on the random numbers the kernel can consume this step, each infection roll pairs an infectious and a healthy cell
+            draws = Kernels.MAX_NEIGHBOURS * min(self.counts[EpithelialStates.INFECTIOUS], self.counts[EpithelialStates.HEALTHY])
+            if ArrayEpithelialSystem.REGEN_ENABLED:
+                draws += dead
+        rand = self.rng.random_sample(draws)
+
+        Kernels.epithelialUpdate(self.state, self.nextState, self.age, self.delay, self.timeInfected, self.canInfect, self.focusId,
+                                 Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL), 0, self.size,
+                                 EpithelialCell.CELL_LIFESPAN, EpithelialCell.INFECT_LIFESPAN, EpithelialCell.EXPRESS_DELAY,
+                                 EpithelialCell.INFECT_DELAY, bool(ArrayEpithelialSystem.REGEN_ENABLED), regenChance, infectChance,
+                                 rand, 0, self.fixedRolls)
+
+    def synchronise(self):
+        """Sets the state of the epithelial cells for next iteration. Updates the internal count of cell states."""
+
+        Kernels.epithelialSynchronise(self.state, self.nextState, self.counts, 0, self.size)
+        self.__updateCounters()
+
+    def stateGrid(self):
+        """Gets the current state of every epithelial cell.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) uint8 numpy array, a view of the system's state.
+        """
+        return self.state.reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def healthyAges(self):
+        """Gets the ages of the healthy epithelial cells.
+
+        Returns int numpy array.
+        """
+        return self.age[self.state == EpithelialStates.HEALTHY]
+
+    def __updateCounters(self):
+        self.healthyCount        = int(self.counts[EpithelialStates.HEALTHY])
+        self.containingCount     = int(self.counts[EpithelialStates.CONTAINING])
+        self.expressingCount     = int(self.counts[EpithelialStates.EXPRESSING])
+        self.infectiousCount     = int(self.counts[EpithelialStates.INFECTIOUS])
+        self.naturalDeathCount   = int(self.counts[EpithelialStates.NATURAL_DEATH])
+        self.infectionDeathCount = int(self.counts[EpithelialStates.INFECTION_DEATH])
+        self.avgFociArea         = float(self.infectionDeathCount) / self.initialInfected
+
+class ArrayImmuneSystem(Systems.ImmuneSystem):
+    """Array backed ImmuneSystem, working on the arrays of an ArrayEpithelialSystem.
+
+    Immune cells are held in arrays of x, y, age and state, compacted on synchronise. Recruitment and maintenance only
+    create a handful of cells per step and stay in Python.
+    """
+
+    def __init__(self, eSys, rng=None):
+        """Constructor for ArrayImmuneSystem
+
+        Keyword arguments
+        eSys -- ArrayEpithelialSystem the immune cells encounter.
+        rng -- numpy RandomState to draw from, defaults to the one of eSys.
+        """
+        Systems.ImmuneSystem.__init__(self, None)
+
+        self.eSys = eSys
+        self.rng = rng if rng != None else eSys.rng
+
+        self.count     = 0
+        self.x         = np.zeros(INITIAL_IMMUNE_CAPACITY, dtype=np.int32)
+        self.y         = np.zeros(INITIAL_IMMUNE_CAPACITY, dtype=np.int32)
+        self.age       = np.zeros(INITIAL_IMMUNE_CAPACITY, dtype=np.int32)
+        self.state     = np.zeros(INITIAL_IMMUNE_CAPACITY, dtype=np.uint8)
+        self.nextState = np.zeros(INITIAL_IMMUNE_CAPACITY, dtype=np.uint8)
+        self.counts    = np.zeros(IMMUNE_STATE_COUNT, dtype=np.int64)
+
+    def initialise(self):
+        """Create the initial density of virgin cells at random sites."""
+
+        for i in xrange(ArrayImmuneSystem.INIT_CELLS):
+            x = self.rng.randint(0, Worldspace.GRID_WIDTH)
+            y = self.rng.randint(0, Worldspace.GRID_HEIGHT)
+            self.__addCell(x, y, self.rng.randint(0, ImmuneCell.IMM_LIFESPAN + 1), ImmuneStates.VIRGIN, ImmuneStates.VIRGIN)
+            self.counts[ImmuneStates.VIRGIN] += 1
+        self.__updateCounters()
+
+    def update(self):
+        """Ages, moves and checks encounters for every immune cell, then runs recruitment and maintenance."""
+
+        encounters = self.updateCells(self.rng.random_sample(self.count))
+        self.recruitmentTimes.extend([0] * encounters)
+
+        #Recruitment Phase
+        self.__updateRecruitment()
+
+        #Maintenance phase
+        self.__updateMaintenance()
+
+        self.__updateCounters()
+
+    def updateCells(self, rand):
+        """Runs the age, movement and encounter steps of every immune cell.
+
+        Keyword arguments:
+        rand -- A random number per immune cell.
+
+        Returns the number of encounters.
+        """
+        randIndex, encounters = Kernels.immuneUpdate(self.x, self.y, self.age, self.state, self.nextState, self.count, self.counts,
+                                                     self.eSys.state, self.eSys.nextState, self.eSys.age, self.eSys.delay,
+                                                     Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL),
+                                                     ImmuneCell.IMM_LIFESPAN, rand, 0)
+        return encounters
+
+    def synchronise(self):
+        """Removes dead cells and sets the states of the remaining cells for the next iteration."""
+
+        self.count = Kernels.immuneSynchronise(self.x, self.y, self.age, self.state, self.nextState, self.count)
+
+    def occupancyGrid(self, state=None):
+        """Gets the number of immune cells at every site.
+
+        Keyword arguments:
+        state -- Only count cells in this ImmuneState, all cells by default.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) int numpy array.
+        """
+        sites = self.x[:self.count].astype(np.int64) * Worldspace.GRID_HEIGHT + self.y[:self.count]
+        if state != None:
+            sites = sites[self.state[:self.count] == state]
+        counts = np.bincount(sites, minlength=Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
+        return counts.reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def cellAges(self, state):
+        """Gets the ages of the immune cells in a state.
+
+        Keyword arguments:
+        state -- ImmuneState of the cells.
+
+        Returns int numpy array.
+        """
+        return self.age[:self.count][self.state[:self.count] == state]
+
+    def __updateRecruitment(self):
+        """Private method, should only be called from public update() method. Creates new immune cells randomly about the Worldspace as required."""
+
+        for i in xrange(len(self.recruitmentTimes)-1,-1,-1):
+            self.recruitmentTimes[i] += 1
+
+            if self.recruitmentTimes[i] >= ArrayImmuneSystem.RECRUITMENT_DELAY:
+                del self.recruitmentTimes[i]
+
+                self.currentRecruitment += ArrayImmuneSystem.RECRUITMENT
+
+                if self.currentRecruitment >= 1:
+                    self.currentRecruitment -= 1
+
+                    x = self.rng.randint(0, Worldspace.GRID_WIDTH)
+                    y = self.rng.randint(0, Worldspace.GRID_HEIGHT)
+                    self.__addCell(x, y, 0, ImmuneStates.VIRGIN, ImmuneStates.MATURE)
+                    self.counts[ImmuneStates.MATURE] += 1
+
+    def __updateMaintenance(self):
+        """Private method, should only be called from public update() method. Creates new virgin immune cells to maintain minimum density as required."""
+
+        while self.counts[ImmuneStates.VIRGIN] < self.INIT_CELLS:
+            x = self.rng.randint(0, Worldspace.GRID_WIDTH)
+            y = self.rng.randint(0, Worldspace.GRID_HEIGHT)
+            self.__addCell(x, y, 0, ImmuneStates.VIRGIN, ImmuneStates.VIRGIN)
+            self.counts[ImmuneStates.VIRGIN] += 1
+
+    def __addCell(self, x, y, age, state, nextState):
+        if self.count == len(self.x):
+            capacity = 2 * len(self.x)
+            for name in ["x", "y", "age", "state", "nextState"]:
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:self.count] = array[:self.count]
+                setattr(self, name, grown)
+
+        self.x[self.count] = x
+        self.y[self.count] = y
+        self.age[self.count] = age
+        self.state[self.count] = state
+        self.nextState[self.count] = nextState
+        self.count += 1
+
+    def __updateCounters(self):
+        self.virginCount = int(self.counts[ImmuneStates.VIRGIN])
+        self.matureCount = int(self.counts[ImmuneStates.MATURE])
+
+def warmUp():
+    """Compiles the kernels by stepping a throwaway pair of systems once, so that compilation isn't timed as a step."""
+    eSys = ArrayEpithelialSystem(np.random.RandomState(0))
+    immSys = ArrayImmuneSystem(eSys)
+    eSys.initialise()
+    immSys.initialise()
+    eSys.update()
+    immSys.update()
+    eSys.synchronise()
+    immSys.synchronise()
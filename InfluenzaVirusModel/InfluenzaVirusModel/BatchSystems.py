@@ -0,0 +1,273 @@
+import numpy as np
+
+import Kernels
+import Systems
+import Worldspace
+from Cells import EpithelialCell, ImmuneCell, EpithelialStates, ImmuneStates
+
+EPITHELIAL_STATE_COUNT = 6
+IMMUNE_STATE_COUNT = 3
+INITIAL_IMMUNE_CAPACITY = 64
+
+class BatchEpithelialSystem(object):
+    """Advances the epithelial cells of several replicates of the same configuration together.
+
+    Each replicate is a row of (replicates, GRID_WIDTH * GRID_HEIGHT) arrays laid out like ArrayEpithelialSystem, and one
+    kernel call steps every row. Each replicate draws from its own RandomState, in the same order as an
+    ArrayEpithelialSystem would, so a replicate matches a single array backend run given the same RandomState.
+    """
+
+    ENABLED = BATCH_SIZE = None
+
+    def __init__(self, rngs):
+        """Constructor for BatchEpithelialSystem
+
+        Keyword arguments
+        rngs -- list of numpy RandomState, one per replicate.
+        """
+        self.rngs = rngs
+        self.replicates = len(rngs)
+        self.size = Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT
+
+        shape = (self.replicates, self.size)
+        self.state        = np.full(shape, EpithelialStates.HEALTHY, dtype=np.uint8)
+        self.nextState    = np.full(shape, EpithelialStates.HEALTHY, dtype=np.uint8)
+        self.age          = np.zeros(shape, dtype=np.int32)
+        self.delay        = np.zeros(shape, dtype=np.int32)
+        self.timeInfected = np.zeros(shape, dtype=np.int32)
+        self.canInfect    = np.ones(shape, dtype=np.uint8)
+        self.focusId      = np.full(shape, Kernels.NO_FOCUS, dtype=np.int32)
+        self.counts       = np.zeros((self.replicates, EPITHELIAL_STATE_COUNT), dtype=np.int64)
+        self.initialInfected = 0
+
+    def initialise(self):
+        """Sets every cell healthy, then infects randomly chosen cells of each replicate for the initial infected count."""
+
+        initialInfected = int(self.size * Systems.EpithelialSystem.INFECT_INIT) if int(self.size * Systems.EpithelialSystem.INFECT_INIT) > 1 else 1
+        self.initialInfected = initialInfected
+
+        for r in xrange(self.replicates):
+            rng = self.rngs[r]
+            if Systems.EpithelialSystem.RANDOM_AGE:
+                self.age[r] = rng.randint(0, EpithelialCell.CELL_LIFESPAN + 1, self.size)
+
+            infected = rng.choice(self.size, initialInfected, replace=False)
+            self.state[r, infected] = EpithelialStates.CONTAINING
+            self.nextState[r, infected] = EpithelialStates.CONTAINING
+            self.focusId[r, infected] = np.arange(initialInfected, dtype=np.int32)
+
+        self.counts[:, EpithelialStates.HEALTHY] = self.size - initialInfected
+        self.counts[:, EpithelialStates.CONTAINING] = initialInfected
+
+    def update(self):
+        """Runs the age, regeneration and infection steps over every cell of every replicate."""
+
+        dead = self.counts[:, EpithelialStates.INFECTION_DEATH] + self.counts[:, EpithelialStates.NATURAL_DEATH]
+        regenChance = np.ones(self.replicates)
+        anyDead = dead != 0
+        regenChance[anyDead] = self.counts[anyDead, EpithelialStates.HEALTHY].astype(np.float64) / dead[anyDead] * 1.0 / EpithelialCell.DIVISION_TIME
+        infectChance = float((1 / Systems.EpithelialSystem.MAX_NEIGHBOURS) * (EpithelialCell.INFECT_RATE / Systems.ImmuneSystem.FLOW_RATE))
+
+        # Upper bound on the random numbers each replicate can consume this step, as in ArrayEpithelialSystem
+        draws = Kernels.MAX_NEIGHBOURS * np.minimum(self.counts[:, EpithelialStates.INFECTIOUS], self.counts[:, EpithelialStates.HEALTHY])
+        if Systems.EpithelialSystem.REGEN_ENABLED:
+            draws += dead
+        rand, randOffsets = drawUniform(self.rngs, draws)
+
+        Kernels.epithelialUpdateBatch(self.state, self.nextState, self.age, self.delay, self.timeInfected, self.canInfect, self.focusId,
+                                      Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL),
+                                      EpithelialCell.CELL_LIFESPAN, EpithelialCell.INFECT_LIFESPAN, EpithelialCell.EXPRESS_DELAY,
+                                      EpithelialCell.INFECT_DELAY, bool(Systems.EpithelialSystem.REGEN_ENABLED), regenChance,
+                                      infectChance, rand, randOffsets)
+
+    def synchronise(self):
+        """Sets the state of the epithelial cells of every replicate for next iteration. Updates the counts of cell states."""
+
+        Kernels.epithelialSynchroniseBatch(self.state, self.nextState, self.counts)
+
+    def stateGrid(self, replicate):
+        """Gets the current state of every epithelial cell of a replicate.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) uint8 numpy array, a view of the system's state.
+        """
+        return self.state[replicate].reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def healthyAges(self, replicate):
+        """Gets the ages of the healthy epithelial cells of a replicate.
+
+        Returns int numpy array.
+        """
+        return self.age[replicate][self.state[replicate] == EpithelialStates.HEALTHY]
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the BatchEpithelialSystem class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        BatchEpithelialSystem.ENABLED    = settings["bIsEnabled"]
+        BatchEpithelialSystem.BATCH_SIZE = settings["iBatchSize"]
+
+class BatchImmuneSystem(object):
+    """Advances the immune cells of the replicates of a BatchEpithelialSystem together.
+
+    Each replicate is a row of (replicates, capacity) arrays, of which the first count[r] entries are in use.
+    """
+
+    def __init__(self, eSys):
+        """Constructor for BatchImmuneSystem
+
+        Keyword arguments
+        eSys -- BatchEpithelialSystem the immune cells encounter, also providing the random streams.
+        """
+        self.eSys = eSys
+        self.rngs = eSys.rngs
+        self.replicates = eSys.replicates
+
+        shape = (self.replicates, INITIAL_IMMUNE_CAPACITY)
+        self.count     = np.zeros(self.replicates, dtype=np.int64)
+        self.x         = np.zeros(shape, dtype=np.int32)
+        self.y         = np.zeros(shape, dtype=np.int32)
+        self.age       = np.zeros(shape, dtype=np.int32)
+        self.state     = np.zeros(shape, dtype=np.uint8)
+        self.nextState = np.zeros(shape, dtype=np.uint8)
+        self.counts    = np.zeros((self.replicates, IMMUNE_STATE_COUNT), dtype=np.int64)
+        self.encounters = np.zeros(self.replicates, dtype=np.int64)
+
+        # Encounters are recruited RECRUITMENT_DELAY steps later. All encounters of a step wait equally long, so rather than
+        # a list of times per encounter like ImmuneSystem, each replicate keeps a ring of encounter counts per step.
+        self.steps              = 0
+        self.pending            = np.zeros((self.replicates, max(Systems.ImmuneSystem.RECRUITMENT_DELAY, 1)), dtype=np.int64)
+        self.currentRecruitment = [0.0] * self.replicates
+
+        Systems.ImmuneSystem.INIT_CELLS = int((Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT) * Systems.ImmuneSystem.BASE_IMM_CELL) if int((Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT) * Systems.ImmuneSystem.BASE_IMM_CELL) > 1 else 1
+        self.INIT_CELLS = Systems.ImmuneSystem.INIT_CELLS
+
+    def initialise(self):
+        """Create the initial density of virgin cells at random sites of each replicate."""
+
+        for r in xrange(self.replicates):
+            rng = self.rngs[r]
+            for i in xrange(self.INIT_CELLS):
+                x = rng.randint(0, Worldspace.GRID_WIDTH)
+                y = rng.randint(0, Worldspace.GRID_HEIGHT)
+                self.__addCell(r, x, y, rng.randint(0, ImmuneCell.IMM_LIFESPAN + 1), ImmuneStates.VIRGIN, ImmuneStates.VIRGIN)
+                self.counts[r, ImmuneStates.VIRGIN] += 1
+
+    def update(self):
+        """Ages, moves and checks encounters for every immune cell of every replicate, then runs recruitment and maintenance."""
+
+        rand, randOffsets = drawUniform(self.rngs, self.count)
+        Kernels.immuneUpdateBatch(self.x, self.y, self.age, self.state, self.nextState, self.count, self.counts,
+                                  self.eSys.state, self.eSys.nextState, self.eSys.age, self.eSys.delay,
+                                  Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL),
+                                  ImmuneCell.IMM_LIFESPAN, rand, randOffsets, self.encounters)
+
+        #Recruitment Phase
+        delay = self.pending.shape[1]
+        self.pending[:, (self.steps + delay - 1) % delay] += self.encounters
+        recruited = self.pending[:, self.steps % delay].copy()
+        self.pending[:, self.steps % delay] = 0
+        self.steps += 1
+        for r in np.flatnonzero(recruited):
+            self.__updateRecruitment(r, recruited[r])
+
+        #Maintenance phase
+        for r in np.flatnonzero(self.counts[:, ImmuneStates.VIRGIN] < self.INIT_CELLS):
+            self.__updateMaintenance(r)
+
+    def synchronise(self):
+        """Removes dead cells and sets the states of the remaining cells of every replicate for the next iteration."""
+
+        Kernels.immuneSynchroniseBatch(self.x, self.y, self.age, self.state, self.nextState, self.count)
+
+    def occupancyGrid(self, replicate, state=None):
+        """Gets the number of immune cells at every site of a replicate.
+
+        Keyword arguments:
+        replicate -- Index of the replicate.
+        state -- Only count cells in this ImmuneState, all cells by default.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) int numpy array.
+        """
+        count = self.count[replicate]
+        sites = self.x[replicate, :count].astype(np.int64) * Worldspace.GRID_HEIGHT + self.y[replicate, :count]
+        if state != None:
+            sites = sites[self.state[replicate, :count] == state]
+        counts = np.bincount(sites, minlength=Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
+        return counts.reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def cellAges(self, replicate, state):
+        """Gets the ages of the immune cells of a replicate in a state.
+
+        Keyword arguments:
+        replicate -- Index of the replicate.
+        state -- ImmuneState of the cells.
+
+        Returns int numpy array.
+        """
+        count = self.count[replicate]
+        return self.age[replicate, :count][self.state[replicate, :count] == state]
+
+    def recruitmentDelays(self, replicate):
+        """Gets the number of timesteps until each pending encounter of a replicate is recruited.
+
+        Returns int numpy array.
+        """
+        delay = self.pending.shape[1]
+        slots = np.arange(delay)
+        return np.repeat((slots - self.steps) % delay + 1, self.pending[replicate])
+
+    def __updateRecruitment(self, r, encounters):
+        """Private method, should only be called from public update() method. Creates new immune cells in a replicate for encounters whose delay is over."""
+
+        for i in xrange(encounters):
+            self.currentRecruitment[r] += Systems.ImmuneSystem.RECRUITMENT
+
+            if self.currentRecruitment[r] >= 1:
+                self.currentRecruitment[r] -= 1
+
+                x = self.rngs[r].randint(0, Worldspace.GRID_WIDTH)
+                y = self.rngs[r].randint(0, Worldspace.GRID_HEIGHT)
+                self.__addCell(r, x, y, 0, ImmuneStates.VIRGIN, ImmuneStates.MATURE)
+                self.counts[r, ImmuneStates.MATURE] += 1
+
+    def __updateMaintenance(self, r):
+        """Private method, should only be called from public update() method. Creates new virgin immune cells in a replicate to maintain minimum density."""
+
+        while self.counts[r, ImmuneStates.VIRGIN] < self.INIT_CELLS:
+            x = self.rngs[r].randint(0, Worldspace.GRID_WIDTH)
+            y = self.rngs[r].randint(0, Worldspace.GRID_HEIGHT)
+            self.__addCell(r, x, y, 0, ImmuneStates.VIRGIN, ImmuneStates.VIRGIN)
+            self.counts[r, ImmuneStates.VIRGIN] += 1
+
+    def __addCell(self, r, x, y, age, state, nextState):
+        count = self.count[r]
+        if count == self.x.shape[1]:
+            capacity = 2 * self.x.shape[1]
+            for name in ["x", "y", "age", "state", "nextState"]:
+                array = getattr(self, name)
+                grown = np.zeros((self.replicates, capacity), dtype=array.dtype)
+                grown[:, :array.shape[1]] = array
+                setattr(self, name, grown)
+
+        self.x[r, count] = x
+        self.y[r, count] = y
+        self.age[r, count] = age
+        self.state[r, count] = state
+        self.nextState[r, count] = nextState
+        self.count[r] = count + 1
+
+def drawUniform(rngs, draws):
+    """Draws uniform random numbers from each RandomState into one buffer.
+
+    Keyword arguments:
+    rngs -- list of numpy RandomState, one per replicate.
+    draws -- Number of random numbers to draw for each replicate.
+
+    Returns (buffer, offsets), replicate r's numbers being buffer[offsets[r]:offsets[r + 1]].
+    """
+    offsets = np.zeros(len(rngs) + 1, dtype=np.int64)
+    np.cumsum(draws, out=offsets[1:])
+    return np.concatenate([rngs[r].random_sample(draws[r]) for r in xrange(len(rngs))]), offsets
@@ -0,0 +1,416 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from timeit import default_timer as timer
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is reported as None there.
+    resource = None
+
+import numpy as np
+
+import Systems
+import ArraySystems
+import Cells
+import Worldspace
+from Worldspace import Worldsite, Vector2d
+from Cells import EpithelialStates
+from Graph import OverallSimulationDataGraph, SimulationData
+from Logger import StdOutLogger as Log
+import SimUtils
+
+BENCHMARK_DIR_NAME = "benchmarks/"
+RESULTS_FILE_NAME = "benchmark_results.json"
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_STEPS = 50
+DEFAULT_SEED = 1234
+GRAPH_RUNS = 5
+
+OBJECT_ENGINE = "object"
+ARRAY_ENGINE = "array"
+ENGINES = [OBJECT_ENGINE, ARRAY_ENGINE]
+
+GRID_SIZES = [(50, 50), (100, 100), (440, 280)]
+INFECTION_DENSITIES = [0.001, 0.01, 0.05]
+IMMUNE_DENSITIES = [0.00015, 0.0015]
+
+QUICK_GRID_SIZES = [(30, 30), (60, 60)]
+QUICK_INFECTION_DENSITIES = [0.01, 0.05]
+QUICK_IMMUNE_DENSITIES = [0.0015]
+
+# Fixed workload so results stay comparable between machines regardless of the local config.ini.
+BASE_SETTINGS = {
+    "bIsToroidal": True,
+    "bRegenEnabled": True,
+    "bRandomAge": True,
+    "fRecruitment": 0.25,
+    "iRecruitDelay": 7,
+    "iCollisionsForMergePercentage": 20,
+    "bDebugTextEnabled": False,
+    "iEpithelialLifespan": 2280,
+    "iDivisionTime": 72,
+    "iExpressDelay": 24,
+    "iInfectDelay": 12,
+    "iInfectLifespan": 144,
+    "fInfectRate": 2.0,
+    "iImmuneLifespan": 1008,
+}
+
+EPITHELIAL_UPDATE = "EpithelialSystem.update"
+EPITHELIAL_SYNCHRONISE = "EpithelialSystem.synchronise"
+IMMUNE_UPDATE = "ImmuneSystem.update"
+IMMUNE_SYNCHRONISE = "ImmuneSystem.synchronise"
+FOCUS_UPDATE = "FocusSystem.update"
+MOORE_NEIGHBOURS = "Worldspace.getMooreNeighbours"
+DRAW_SIM_WORLD = "SimVis.drawSimWorld"
+GRAPH_ADD = "Graph.addSimulationData"
+GRAPH_AGGREGATE = "Graph.getStandardDeviationValues"
+
+STEP_PHASES = [EPITHELIAL_UPDATE, IMMUNE_UPDATE, EPITHELIAL_SYNCHRONISE, IMMUNE_SYNCHRONISE, FOCUS_UPDATE]
+
+class PhaseTimings(object):
+    """Accumulates wall time and call counts for named phases of a benchmark case."""
+
+    def __init__(self):
+        self.phases = {}
+
+    def call(self, name, func, *args):
+        """Calls func with the given arguments and adds the elapsed time to the named phase.
+
+        Keyword arguments:
+        name -- Name of the phase to accumulate into.
+        func -- Callable to time.
+
+        Returns the return value of func.
+        """
+        start = timer()
+        result = func(*args)
+        self.add(name, timer() - start)
+        return result
+
+    def add(self, name, elapsed, calls=1):
+        entry = self.phases.get(name)
+        if entry == None:
+            entry = self.phases[name] = {"calls": 0, "totalTime": 0.0}
+        entry["calls"] += calls
+        entry["totalTime"] += elapsed
+
+    def total(self, name):
+        entry = self.phases.get(name)
+        if entry == None:
+            return 0.0
+        return entry["totalTime"]
+
+    def toDict(self):
+        result = {}
+        for name, entry in self.phases.items():
+            result[name] = {"calls": entry["calls"],
+                            "totalTime": entry["totalTime"],
+                            "meanTime": entry["totalTime"] / entry["calls"] if entry["calls"] > 0 else 0.0}
+        return result
+
+def buildMatrix(quick=False, engine=OBJECT_ENGINE):
+    """Builds the list of benchmark cases from the grid size, infection and immune density matrix.
+
+    Keyword arguments:
+    quick -- Use the reduced matrix, intended for fast local checks.
+    engine -- Systems to run the cases with, the object systems or the array backend.
+
+    Returns list of dict.
+    """
+    gridSizes = QUICK_GRID_SIZES if quick else GRID_SIZES
+    infectionDensities = QUICK_INFECTION_DENSITIES if quick else INFECTION_DENSITIES
+    immuneDensities = QUICK_IMMUNE_DENSITIES if quick else IMMUNE_DENSITIES
+
+    cases = []
+    for width, height in gridSizes:
+        for infectInit in infectionDensities:
+            for baseImmCell in immuneDensities:
+                cases.append({"name": getCaseName(width, height, infectInit, baseImmCell, engine),
+                              "gridWidth": width,
+                              "gridHeight": height,
+                              "infectInit": infectInit,
+                              "baseImmCell": baseImmCell,
+                              "engine": engine})
+    return cases
+
+def getCaseName(width, height, infectInit, baseImmCell, engine=OBJECT_ENGINE):
+    name = "%dx%d_inf%s_imm%s" % (width, height, infectInit, baseImmCell)
+    if engine != OBJECT_ENGINE:
+        name += "_" + engine
+    return name
+
+def configureCase(case):
+    """Sets the static configuration of the simulation classes for a benchmark case.
+
+    Keyword arguments:
+    case -- dict describing the grid size and densities of the case.
+    """
+    settings = dict(BASE_SETTINGS)
+    settings["iGridWidth"] = case["gridWidth"]
+    settings["iGridHeight"] = case["gridHeight"]
+    settings["fInfectInit"] = case["infectInit"]
+    settings["fBaseImmCell"] = case["baseImmCell"]
+
+    Worldspace.Configure(settings)
+    Cells.EpithelialCell.Configure(settings)
+    Cells.ImmuneCell.Configure(settings)
+    Systems.EpithelialSystem.Configure(settings)
+    Systems.ImmuneSystem.Configure(dict(settings, bIsEnabled=True))
+    Systems.FocusSystem.Configure(dict(settings, bIsEnabled=True))
+
+def getPeakMemoryKB():
+    """Returns the peak resident memory of the current process in KB, or None if it can't be measured."""
+    if resource == None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024 # reported in bytes on OS X
+    return peak
+
+def runCase(case, steps=DEFAULT_STEPS, seed=DEFAULT_SEED, draw=False):
+    """Runs a single benchmark case and returns its results.
+
+    Keyword arguments:
+    case -- dict describing the grid size and densities of the case.
+    steps -- Number of timesteps to simulate.
+    seed -- Seed for the random number generator, so that each case does identical work on every run.
+    draw -- Also time SimVis.drawSimWorld. Requires a display, and clears the images folder.
+
+    Returns dict.
+    """
+    configureCase(case)
+    if case.get("engine", OBJECT_ENGINE) == ARRAY_ENGINE:
+        return runArrayCase(case, steps, seed)
+    random.seed(seed)
+
+    timings = PhaseTimings()
+
+    world = []
+    for x in xrange(Worldspace.GRID_WIDTH):
+        world.append([])
+        for y in xrange(Worldspace.GRID_HEIGHT):
+            world[x].append(Worldsite(Vector2d(x, y)))
+
+    eSys = Systems.EpithelialSystem(world)
+    immSys = Systems.ImmuneSystem(world)
+    eSys.initialise()
+    immSys.initialise()
+
+    # FocusSystem.update is called from within EpithelialSystem.synchronise, time it separately
+    focusUpdate = eSys.fSys.update
+    eSys.fSys.update = lambda: timings.call(FOCUS_UPDATE, focusUpdate)
+
+    simVis = None
+    if draw:
+        simVis = createSimVis(world)
+
+    graph = OverallSimulationDataGraph(Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT, immSys.INIT_CELLS)
+    graph.initRun()
+    data = SimulationData()
+
+    for timesteps in xrange(steps):
+        timings.call(EPITHELIAL_UPDATE, eSys.update)
+        timings.call(IMMUNE_UPDATE, immSys.update)
+        timings.call(EPITHELIAL_SYNCHRONISE, eSys.synchronise)
+        timings.call(IMMUNE_SYNCHRONISE, immSys.synchronise)
+
+        data.time             = timesteps
+        data.eCellsHealthy    = eSys.healthyCount
+        data.eCellsContaining = eSys.containingCount
+        data.eCellsExpressing = eSys.expressingCount
+        data.eCellsInfectious = eSys.infectiousCount
+        data.eCellsDead       = eSys.naturalDeathCount + eSys.infectionDeathCount
+        data.immCellsTotal    = immSys.virginCount + immSys.matureCount
+        timings.call(GRAPH_ADD, graph.addSimulationData, data)
+
+        if simVis != None:
+            changed = eSys.changedCells + list(immSys.changedSites) if timesteps > 0 else None
+            timings.call(DRAW_SIM_WORLD, simVis.drawSimWorld, False, timesteps, changed)
+
+    # Report synchronise exclusive of the nested focus update
+    timings.add(EPITHELIAL_SYNCHRONISE, -timings.total(FOCUS_UPDATE), 0)
+    stepTime = sum(timings.total(name) for name in STEP_PHASES)
+
+    for x in xrange(Worldspace.GRID_WIDTH):
+        for y in xrange(Worldspace.GRID_HEIGHT):
+            timings.call(MOORE_NEIGHBOURS, Worldspace.getMooreNeighbours, world, world[x][y].location, EpithelialStates.HEALTHY)
+
+    # Aggregate as though GRAPH_RUNS identical runs had been collected
+    for resultsList in [graph.healthyResultsList, graph.infectedResultsList, graph.containingResultsList, graph.expressingResultsList,
+                        graph.infectiousResultsList, graph.deadResultsList, graph.immCellsResultsList]:
+        timings.call(GRAPH_AGGREGATE, graph.getStandardDeviationValues, resultsList * GRAPH_RUNS)
+
+    result = dict(case)
+    result["steps"] = steps
+    result["seed"] = seed
+    result["stepsPerSecond"] = steps / stepTime if stepTime > 0 else None
+    result["peakMemoryKB"] = getPeakMemoryKB()
+    result["phases"] = timings.toDict()
+    return result
+
+def runArrayCase(case, steps, seed):
+    """Runs a single benchmark case with the array backend. Called by runCase() once the case is configured.
+
+    Drawing, foci and getMooreNeighbours belong to the object systems and aren't timed.
+
+    Returns dict.
+    """
+    # Keep kernel compilation out of the step timings
+    ArraySystems.warmUp()
+
+    timings = PhaseTimings()
+
+    eSys = ArraySystems.ArrayEpithelialSystem(np.random.RandomState(seed))
+    immSys = ArraySystems.ArrayImmuneSystem(eSys)
+    eSys.initialise()
+    immSys.initialise()
+
+    for timesteps in xrange(steps):
+        timings.call(EPITHELIAL_UPDATE, eSys.update)
+        timings.call(IMMUNE_UPDATE, immSys.update)
+        timings.call(EPITHELIAL_SYNCHRONISE, eSys.synchronise)
+        timings.call(IMMUNE_SYNCHRONISE, immSys.synchronise)
+
+    stepTime = sum(timings.total(name) for name in STEP_PHASES)
+
+    result = dict(case)
+    result["steps"] = steps
+    result["seed"] = seed
+    result["stepsPerSecond"] = steps / stepTime if stepTime > 0 else None
+    result["peakMemoryKB"] = getPeakMemoryKB()
+    result["phases"] = timings.toDict()
+    return result
+
+def createSimVis(world):
+    """Creates a SimVis for timing drawSimWorld, or returns None if no display is available."""
+    from SimulationVisualization import SimVis
+
+    SimVis.DEBUG_ID_ENABLED = False
+    try:
+        simVis = SimVis(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, 1)
+    except Exception as e:
+        Log.err("SimVis unavailable, skipping drawSimWorld: " + str(e))
+        return None
+    simVis.init(world)
+    return simVis
+
+def runCaseIsolated(args):
+    """Runs a benchmark case in a fresh process so that peak memory is measured per case."""
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(runCase, args)
+    finally:
+        pool.close()
+        pool.join()
+
+def runBenchmarks(cases, steps=DEFAULT_STEPS, seed=DEFAULT_SEED, draw=False, isolate=True):
+    """Runs every case and collects the results.
+
+    Keyword arguments:
+    cases -- list of case dicts, see buildMatrix().
+    steps -- Number of timesteps to simulate per case.
+    seed -- Seed for the random number generator.
+    draw -- Also time SimVis.drawSimWorld.
+    isolate -- Run each case in its own process.
+
+    Returns dict containing run metadata and the results of each case.
+    """
+    results = []
+    for case in cases:
+        Log.out("Running benchmark " + case["name"])
+        args = (case, steps, seed, draw)
+        result = runCaseIsolated(args) if isolate else runCase(*args)
+        Log.out("  %.2f steps/sec, peak memory %s KB" % (result["stepsPerSecond"] or 0.0, result["peakMemoryKB"]))
+        results.append(result)
+
+    return {"meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "steps": steps,
+                     "seed": seed},
+            "cases": results}
+
+def compareResults(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Compares benchmark results against a baseline.
+
+    A case regresses if its steps/sec drops, or the mean time of any phase rises, by more than the threshold fraction.
+
+    Keyword arguments:
+    current -- Results dict returned by runBenchmarks().
+    baseline -- Results dict of a previous run.
+    threshold -- Allowed fractional slowdown, e.g. 0.1 for 10%.
+
+    Returns list of str describing each regression.
+    """
+    baselineCases = {}
+    for case in baseline["cases"]:
+        baselineCases[case["name"]] = case
+
+    regressions = []
+    for case in current["cases"]:
+        base = baselineCases.get(case["name"])
+        if base == None:
+            continue
+
+        if case["stepsPerSecond"] != None and base["stepsPerSecond"] != None:
+            if case["stepsPerSecond"] < base["stepsPerSecond"] * (1.0 - threshold):
+                regressions.append("%s: steps/sec %.2f -> %.2f" % (case["name"], base["stepsPerSecond"], case["stepsPerSecond"]))
+
+        for name, phase in case["phases"].items():
+            basePhase = base["phases"].get(name)
+            if basePhase == None or basePhase["meanTime"] <= 0:
+                continue
+            if phase["meanTime"] > basePhase["meanTime"] * (1.0 + threshold):
+                regressions.append("%s: %s mean time %.6fs -> %.6fs" % (case["name"], name, basePhase["meanTime"], phase["meanTime"]))
+
+    return regressions
+
+def saveResults(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def loadResults(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths.")
+    parser.add_argument("--quick", action="store_true", help="run the reduced case matrix")
+    parser.add_argument("--steps", type=int, default=DEFAULT_STEPS, help="timesteps per case")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="random seed for every case")
+    parser.add_argument("--draw", action="store_true", help="also time SimVis.drawSimWorld (needs a display)")
+    parser.add_argument("--engine", choices=ENGINES, default=OBJECT_ENGINE, help="simulate with the object systems or the array backend")
+    parser.add_argument("--no-isolate", dest="isolate", action="store_false", help="run all cases in this process")
+    parser.add_argument("--output", default=None, help="results file, defaults to benchmarks/" + RESULTS_FILE_NAME)
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if output == None:
+        SimUtils.initFolder(folderName=BENCHMARK_DIR_NAME)
+        output = os.path.join(SimUtils.getRootPath(), BENCHMARK_DIR_NAME, RESULTS_FILE_NAME)
+
+    results = runBenchmarks(buildMatrix(args.quick, args.engine), args.steps, args.seed, args.draw, args.isolate)
+    saveResults(results, output)
+    Log.out("Results written to " + output)
+
+    if args.baseline != None:
+        regressions = compareResults(results, loadResults(args.baseline), args.threshold)
+        for regression in regressions:
+            Log.err("REGRESSION " + regression)
+        if len(regressions) > 0:
+            return 1
+        Log.out("No regressions against " + args.baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,19 @@ import Program
 import Systems
 import SimulationVisualization
 import Graph
+import Profiler
+import Recorder
+import Logger
+import Kernels
+import BatchSystems
+import FastForward
+import Statistics
+import RandomStreams
+import ResultCache
+import PairedComparison
+import SharedResults
+import Summary
+import JobBroker
 from Logger import StdOutLogger as Log
 
 class ConfigReader(object):
@@ -20,19 +33,31 @@ class ConfigReader(object):
         self.configSettings = dict()
         self.reconstruct = False
     
-    def SetConfiguration(self):
+    def SetConfiguration(self, overrides=None, sections=None, useFile=True):
         """Reads the values from the config.ini file into a dictionary and returns it.
+
+        Keyword arguments:
+        overrides -- List of (section, option, value) to use in place of the values of the file.
+        sections -- Names of the sections to configure, every section of the file by default.
+        useFile -- Whether to read the config.ini file. If not, the overrides must give every option, see readOptions().
         
         Returns dict() <str, dyanmic>
         """
 
         try:
-            self.configParser.read(os.getcwd() + "\\config.ini")
-            sections = self.configParser.sections()
+            if useFile:
+                self.configParser.read(os.getcwd() + "\\config.ini")
+                if len(self.configParser.sections()) == 0:
+                    self.__reconstruct()
+                    return self.SetConfiguration(overrides, sections)
 
-            if len(sections) == 0:
-                self.__reconstruct()
-                return self.SetConfiguration()
+            if overrides != None:
+                for section, option, value in overrides:
+                    if not self.configParser.has_section(section):
+                        self.configParser.add_section(section)
+                    self.configParser.set(section, option, value)
+            if sections == None:
+                sections = self.configParser.sections()
 
             for section in xrange(len(sections)):
                 configSettings = dict()
@@ -83,10 +108,96 @@ class ConfigReader(object):
                     configSettings["iSquareSize"] = self.checkIntValBounds(str, "iSquareSize", 1)
                     configSettings["bDebugFocusIdEnabled"] = self.configParser.getboolean(str, "bDebugFocusIdEnabled")
                     configSettings["bHighlightCollisions"] = self.configParser.getboolean(str, "bHighlightCollisions") 
+                    configSettings["bOverviewEnabled"] = self.configParser.getboolean(str, "bOverviewEnabled")
+                    configSettings["iOverviewSize"] = self.checkIntValBounds(str, "iOverviewSize", 1)
+                    configSettings["sOverviewMode"] = self.checkStringValues(str, "sOverviewMode", SimulationVisualization.OVERVIEW_MODES)
+                    configSettings["bSeparateProcess"] = self.configParser.getboolean(str, "bSeparateProcess")
                     SimulationVisualization.SimVis.Configure(configSettings)
                 elif str == "Graph":
                     configSettings["bShowGraphOnFinish"] = self.configParser.getboolean(str, "bShowGraphOnFinish")
+                    configSettings["bDownsample"] = self.configParser.getboolean(str, "bDownsample")
+                    configSettings["bHeadless"] = self.configParser.getboolean(str, "bHeadless")
+                    configSettings["sFormat"] = self.checkStringValues(str, "sFormat", Graph.Graph.FORMATS)
+                    configSettings["iDpi"] = self.checkIntValBounds(str, "iDpi", 1)
                     Graph.Graph.Configure(configSettings)
+                elif str == "Profiler":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["bCProfileEnabled"] = self.configParser.getboolean(str, "bCProfileEnabled")
+                    Profiler.Profiler.Configure(configSettings)
+                elif str == "Recorder":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iInterval"] = self.checkIntValBounds(str, "iInterval", 1)
+                    configSettings["iChunkFrames"] = self.checkIntValBounds(str, "iChunkFrames", 1)
+                    Recorder.StateRecorder.Configure(configSettings)
+                elif str == "Logger":
+                    configSettings["bBuffered"] = self.configParser.getboolean(str, "bBuffered")
+                    configSettings["sFormat"] = self.checkStringValues(str, "sFormat", Logger.FORMATS)
+                    configSettings["iSampleEvery"] = self.checkIntValBounds(str, "iSampleEvery", 1)
+                    configSettings["bPerRunFiles"] = self.configParser.getboolean(str, "bPerRunFiles")
+                    Logger.Logger.Configure(configSettings)
+                elif str == "ArrayBackend":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    Kernels.Configure(configSettings)
+                elif str == "Batch":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iBatchSize"] = self.checkIntValBounds(str, "iBatchSize", 1)
+                    BatchSystems.BatchEpithelialSystem.Configure(configSettings)
+                elif str == "FastForward":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    FastForward.FastForward.Configure(configSettings)
+                elif str == "AdaptiveRuns":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iMinRuns"] = self.checkIntValBounds(str, "iMinRuns", 3)
+                    configSettings["iMaxRuns"] = self.checkIntValBounds(str, "iMaxRuns", configSettings["iMinRuns"])
+                    configSettings["fTargetWidth"] = self.checkFloatValBounds(str, "fTargetWidth", 0.0)
+                    configSettings["fConfidence"] = self.checkFloatValBounds(str, "fConfidence", 0.5, 0.999)
+                    configSettings["sOutputs"] = self.checkStringListValues(str, "sOutputs", Statistics.OUTPUTS)
+                    Statistics.AdaptiveRuns.Configure(configSettings)
+                elif str == "Random":
+                    configSettings["iSeed"] = self.checkIntValBounds(str, "iSeed", -1, 4294967295)
+                    RandomStreams.RandomStreams.Configure(configSettings)
+                elif str == "ResultCache":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iMaxSizeMB"] = self.checkIntValBounds(str, "iMaxSizeMB", 1)
+                    ResultCache.ResultCache.Configure(configSettings)
+                elif str == "PairedComparison":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["sSection"] = self.checkStringValues(str, "sSection", PairedComparison.SECTIONS)
+                    configSettings["sOption"] = self.configParser.get(str, "sOption")
+                    configSettings["sValue"] = self.configParser.get(str, "sValue")
+                    configSettings["fConfidence"] = self.checkFloatValBounds(str, "fConfidence", 0.5, 0.999)
+                    if configSettings["bIsEnabled"] and not self.checkOverride(configSettings["sSection"], configSettings["sOption"], configSettings["sValue"]):
+                        Log.err("Disabling the paired comparison")
+                        configSettings["bIsEnabled"] = False
+                    PairedComparison.PairedComparison.Configure(configSettings)
+                elif str == "Parallel":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iWorkers"] = self.checkIntValBounds(str, "iWorkers", 0)
+                    SharedResults.SharedResults.Configure(configSettings)
+                elif str == "Summary":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["sFormat"] = self.checkStringValues(str, "sFormat", Summary.FORMATS)
+                    Summary.RunSummary.Configure(configSettings)
+                elif str == "SparseLattice":
+                    import SparseSystems # Subclasses the systems of Systems, which imports Program, which imports this module
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iChunkSize"] = self.checkIntValBounds(str, "iChunkSize", 1)
+                    configSettings["bHybridEnabled"] = self.configParser.getboolean(str, "bHybridEnabled")
+                    configSettings["iFrontDistance"] = self.checkIntValBounds(str, "iFrontDistance", 1)
+                    SparseSystems.SparseEpithelialSystem.Configure(configSettings)
+                    SparseSystems.HybridEpithelialSystem.Configure(configSettings)
+                elif str == "OutOfCore":
+                    import MemmapSystems # Subclasses the systems of Systems, which imports Program, which imports this module
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["iBandRows"] = self.checkIntValBounds(str, "iBandRows", 1)
+                    MemmapSystems.MemmapEpithelialSystem.Configure(configSettings)
+                elif str == "Broker":
+                    configSettings["bIsEnabled"] = self.configParser.getboolean(str, "bIsEnabled")
+                    configSettings["sHost"] = self.configParser.get(str, "sHost")
+                    configSettings["iPort"] = self.checkIntValBounds(str, "iPort", 0, 65535)
+                    configSettings["sAuthKey"] = self.configParser.get(str, "sAuthKey")
+                    configSettings["iLeaseTime"] = self.checkIntValBounds(str, "iLeaseTime", 1)
+                    JobBroker.JobBroker.Configure(configSettings)
 
                     
 
@@ -101,6 +212,24 @@ class ConfigReader(object):
 
         return self.configSettings
 
+    def readOptions(self):
+        """Reads every option of the config.ini file as text, without configuring anything. The defaults are read if
+        there is no file.
+
+        Returns list of (section, option, value)
+        """
+        self.configParser.read(os.getcwd() + "\\config.ini")
+        if len(self.configParser.sections()) == 0:
+            return self.defaultOptions()
+        return [(section, option, value) for section in self.configParser.sections() for option, value in self.configParser.items(section, raw=True)]
+
+    def defaultOptions(self):
+        """Gets every option of the default config.ini file.
+
+        Returns list of (section, option, value)
+        """
+        return [(section, option, value) for default in self.__createDefaults() for section, options in default.items() for option, value in options.items()]
+
     def __reconstruct(self):
         """Private method, should only be called from SetConfiguration if the config.ini file requires rebuilding."""
 
@@ -136,8 +265,23 @@ class ConfigReader(object):
         defaults.append({"FocusSystem":{"bIsEnabled":"False", "iCollisionsForMergePercentage":"10", "bDebugTextEnabled": "False"}})
         defaults.append({"EpithelialCell":{"iEpithelialLifespan":"2280","iInfectRate":"2","iInfectLifespan":"144","iExpressDelay":"24","iInfectDelay":"12","iDivisionTime":"72"}})
         defaults.append({"ImmuneCell":{"iImmuneLifespan":"1008"}})
-        defaults.append({"SimulationVisualisation": {"bIsEnabled":"True", "bSnapshotEnabled":"True", "iSnapshotWidth":"100", "iSnapshotHeight":"100", "iSquareSize":"4", "bDebugFocusIdEnabled": "False", "bHighlightCollisions": "True"}})
-        defaults.append({"Graph":{"bShowGraphOnFinish":"True"}})
+        defaults.append({"SimulationVisualisation": {"bIsEnabled":"True", "bSnapshotEnabled":"True", "iSnapshotWidth":"100", "iSnapshotHeight":"100", "iSquareSize":"4", "bDebugFocusIdEnabled": "False", "bHighlightCollisions": "True", "bOverviewEnabled": "False", "iOverviewSize": "800", "sOverviewMode": "blend", "bSeparateProcess": "False"}})
+        defaults.append({"Graph":{"bShowGraphOnFinish":"True", "bDownsample":"True", "bHeadless":"False", "sFormat":"png", "iDpi":"100"}})
+        defaults.append({"Profiler":{"bIsEnabled":"False", "bCProfileEnabled":"False"}})
+        defaults.append({"Recorder":{"bIsEnabled":"False", "iInterval":"6", "iChunkFrames":"32"}})
+        defaults.append({"Logger":{"bBuffered":"False", "sFormat":"text", "iSampleEvery":"1", "bPerRunFiles":"True"}})
+        defaults.append({"ArrayBackend":{"bIsEnabled":"False"}})
+        defaults.append({"Batch":{"bIsEnabled":"False", "iBatchSize":"20"}})
+        defaults.append({"FastForward":{"bIsEnabled":"True"}})
+        defaults.append({"AdaptiveRuns":{"bIsEnabled":"False", "iMinRuns":"5", "iMaxRuns":"100", "fTargetWidth":"0.1", "fConfidence":"0.95", "sOutputs":"peakInfected, infectionDeaths"}})
+        defaults.append({"Random":{"iSeed":"-1"}})
+        defaults.append({"ResultCache":{"bIsEnabled":"False", "iMaxSizeMB":"256"}})
+        defaults.append({"PairedComparison":{"bIsEnabled":"False", "sSection":"ImmuneSystem", "sOption":"bIsEnabled", "sValue":"False", "fConfidence":"0.95"}})
+        defaults.append({"Parallel":{"bIsEnabled":"False", "iWorkers":"0"}})
+        defaults.append({"Summary":{"bIsEnabled":"False", "sFormat":"csv"}})
+        defaults.append({"SparseLattice":{"bIsEnabled":"False", "iChunkSize":"64", "bHybridEnabled":"False", "iFrontDistance":"64"}})
+        defaults.append({"OutOfCore":{"bIsEnabled":"False", "iBandRows":"256"}})
+        defaults.append({"Broker":{"bIsEnabled":"False", "sHost":"localhost", "iPort":"6010", "sAuthKey":"influenza", "iLeaseTime":"60"}})
 
         return defaults
 
@@ -165,6 +309,44 @@ class ConfigReader(object):
                 Log.err("value of " + valueString + " must be <= " +  str(upperBound) + ", using default instead = " + str(val))
         return val
 
+    def checkStringValues(self, dictKey, valueString, allowedValues) :
+        val = self.configParser.get(dictKey, valueString)
+        if not (val in allowedValues) :
+            val = self.getValDefault(dictKey, valueString)
+            Log.err("value of " + valueString + " must be one of " + ", ".join(allowedValues) + ", using default instead = " + val)
+        return val
+
+    def checkStringListValues(self, dictKey, valueString, allowedValues) :
+        vals = [val.strip() for val in self.configParser.get(dictKey, valueString).split(",") if val.strip() != ""]
+        for val in vals :
+            if not (val in allowedValues) :
+                vals = [default.strip() for default in self.getValDefault(dictKey, valueString).split(",")]
+                Log.err("values of " + valueString + " must be among " + ", ".join(allowedValues) + ", using default instead = " + ", ".join(vals))
+                break
+        return vals
+
+    def checkOverride(self, dictKey, valueString, value) :
+        """Checks that an option of the file can be set to a value, parsing it as the type of the option's prefix."""
+        if not self.configParser.has_option(dictKey, valueString) :
+            Log.err(dictKey + " has no option " + valueString)
+            return False
+
+        original = self.configParser.get(dictKey, valueString)
+        self.configParser.set(dictKey, valueString, value)
+        try :
+            if valueString.startswith("b") :
+                self.configParser.getboolean(dictKey, valueString)
+            elif valueString.startswith("i") :
+                self.configParser.getint(dictKey, valueString)
+            elif valueString.startswith("f") :
+                self.configParser.getfloat(dictKey, valueString)
+        except ValueError :
+            Log.err("value " + value + " is not valid for " + valueString)
+            return False
+        finally :
+            self.configParser.set(dictKey, valueString, original)
+        return True
+
     def getValDefault(self, dictKey, valueString) :
         defaults = self.__createDefaults()
         dict = None
@@ -186,6 +368,36 @@ class ConfigReader(object):
             dict = defaults[7]
         elif dictKey == "Graph" :
             dict = defaults[8]
+        elif dictKey == "Profiler" :
+            dict = defaults[9]
+        elif dictKey == "Recorder" :
+            dict = defaults[10]
+        elif dictKey == "Logger" :
+            dict = defaults[11]
+        elif dictKey == "ArrayBackend" :
+            dict = defaults[12]
+        elif dictKey == "Batch" :
+            dict = defaults[13]
+        elif dictKey == "FastForward" :
+            dict = defaults[14]
+        elif dictKey == "AdaptiveRuns" :
+            dict = defaults[15]
+        elif dictKey == "Random" :
+            dict = defaults[16]
+        elif dictKey == "ResultCache" :
+            dict = defaults[17]
+        elif dictKey == "PairedComparison" :
+            dict = defaults[18]
+        elif dictKey == "Parallel" :
+            dict = defaults[19]
+        elif dictKey == "Summary" :
+            dict = defaults[20]
+        elif dictKey == "SparseLattice" :
+            dict = defaults[21]
+        elif dictKey == "OutOfCore" :
+            dict = defaults[22]
+        elif dictKey == "Broker" :
+            dict = defaults[23]
         if dict != None :
             return dict[dictKey][valueString]
         else :
@@ -0,0 +1,149 @@
+import numpy as np
+
+import Systems
+from Cells import EpithelialCell, ImmuneCell, EpithelialStates, ImmuneStates
+
+EPITHELIAL_STATE_COUNT = 6
+IMMUNE_STATE_COUNT = 3
+
+class FastForward(object):
+    """Ends runs early once they reach an absorbing state, filling in the rest of their counters without stepping.
+
+    A run is absorbed when no infected epithelial cells are left and dead cells can't regenerate. From then on no
+    infection can arise again: healthy cells only age into natural death, immune cells only age, move and are recruited
+    or maintained, and no encounters happen. Every counter for the remaining timesteps then follows from the current
+    cell ages alone, and is the same as stepping the run to the end would give.
+    """
+
+    ENABLED = None
+
+    @staticmethod
+    def isAbsorbed(infectedCount):
+        """Checks whether a run has reached an absorbing state.
+
+        Keyword arguments:
+        infectedCount -- Number of containing, expressing and infectious epithelial cells of the run.
+
+        Returns bool.
+        """
+        return bool(FastForward.ENABLED) and not Systems.EpithelialSystem.REGEN_ENABLED and infectedCount == 0
+
+    @staticmethod
+    def projectSystems(eSys, immSys, steps):
+        """Projects the counters of an absorbed run of object or array backed systems. See project().
+
+        Keyword arguments:
+        eSys -- EpithelialSystem of the run, synchronised.
+        immSys -- ImmuneSystem of the run, synchronised.
+        steps -- Number of timesteps to project.
+        """
+        eCounts = np.zeros(EPITHELIAL_STATE_COUNT, dtype=np.int64)
+        eCounts[EpithelialStates.HEALTHY]         = eSys.healthyCount
+        eCounts[EpithelialStates.NATURAL_DEATH]   = eSys.naturalDeathCount
+        eCounts[EpithelialStates.INFECTION_DEATH] = eSys.infectionDeathCount
+
+        immCounts = np.zeros(IMMUNE_STATE_COUNT, dtype=np.int64)
+        immCounts[ImmuneStates.VIRGIN] = immSys.virginCount
+        immCounts[ImmuneStates.MATURE] = immSys.matureCount
+
+        # The sparse lattice counts its healthy cells by age, as listing the pristine ones would take the whole grid
+        healthyAges = healthyAgeCounts = None
+        if hasattr(eSys, "healthyAgeCounts"):
+            healthyAgeCounts = eSys.healthyAgeCounts()
+        else:
+            healthyAges = eSys.healthyAges()
+
+        return FastForward.project(steps, eCounts, healthyAges, immCounts, immSys.cellAges(ImmuneStates.VIRGIN),
+                                   immSys.cellAges(ImmuneStates.MATURE), immSys.recruitmentDelays(), immSys.currentRecruitment,
+                                   immSys.INIT_CELLS, healthyAgeCounts)
+
+    @staticmethod
+    def project(steps, eCounts, healthyAges, immCounts, virginAges, matureAges, recruitmentDelays, currentRecruitment, initCells,
+                healthyAgeCounts=None):
+        """Computes the counters of the next timesteps of an absorbed run.
+
+        Keyword arguments:
+        steps -- Number of timesteps to project.
+        eCounts -- Number of epithelial cells in each state, indexed by state.
+        healthyAges -- Ages of the healthy epithelial cells.
+        immCounts -- Number of immune cells in each state, indexed by state.
+        virginAges -- Ages of the virgin immune cells.
+        matureAges -- Ages of the mature immune cells.
+        recruitmentDelays -- Timesteps until each pending encounter is recruited.
+        currentRecruitment -- Recruitment carried over from previous encounters.
+        initCells -- Number of virgin immune cells maintained.
+        healthyAgeCounts -- Number of healthy epithelial cells of each age, indexed by age, in place of healthyAges.
+
+        Returns (eCounts, immCounts), (steps, states) int64 numpy arrays of the counters after each of the next timesteps.
+        """
+        eSeries = np.tile(np.asarray(eCounts, dtype=np.int64), (steps, 1))
+        immSeries = np.tile(np.asarray(immCounts, dtype=np.int64), (steps, 1))
+        if steps == 0:
+            return eSeries, immSeries
+
+        # A healthy cell of age a dies of old age on the (CELL_LIFESPAN - a)th next timestep
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        healthy = int(eCounts[EpithelialStates.HEALTHY])
+        if healthyAgeCounts is None:
+            byAge = np.bincount(np.clip(np.asarray(healthyAges, dtype=np.int64), 0, lifespan - 1), minlength=lifespan)
+        else:
+            byAge = np.zeros(lifespan, dtype=np.int64)
+            byAge[:min(len(healthyAgeCounts), lifespan)] = healthyAgeCounts[:lifespan]
+            byAge[lifespan - 1] += np.sum(healthyAgeCounts[lifespan:])
+        byAge = np.cumsum(byAge)
+        remaining = lifespan - 1 - np.arange(1, steps + 1)
+        healthyLeft = np.where(remaining >= 0, byAge[np.clip(remaining, 0, lifespan - 1)], 0)
+        eSeries[:, EpithelialStates.HEALTHY] = healthyLeft
+        eSeries[:, EpithelialStates.NATURAL_DEATH] += healthy - healthyLeft
+
+        if not Systems.ImmuneSystem.ISENABLED:
+            return eSeries, immSeries
+
+        # Immune cells die of old age the same way. Recruitment and maintenance add cells of age 0, whose deaths are
+        # scheduled as they are added.
+        lifespan = ImmuneCell.IMM_LIFESPAN
+        virginDeaths = FastForward.__deathSchedule(virginAges, lifespan, steps)
+        matureDeaths = FastForward.__deathSchedule(matureAges, lifespan, steps)
+        recruitments = np.bincount(np.clip(np.asarray(recruitmentDelays, dtype=np.int64), 1, None), minlength=steps + 1)
+
+        virgin = int(immCounts[ImmuneStates.VIRGIN])
+        mature = int(immCounts[ImmuneStates.MATURE])
+        for k in xrange(1, steps + 1):
+            virgin -= virginDeaths[k]
+            mature -= matureDeaths[k]
+
+            for i in xrange(recruitments[k] if k < len(recruitments) else 0):
+                currentRecruitment += Systems.ImmuneSystem.RECRUITMENT
+                if currentRecruitment >= 1:
+                    currentRecruitment -= 1
+                    mature += 1
+                    if k + lifespan <= steps:
+                        matureDeaths[k + lifespan] += 1
+
+            if virgin < initCells:
+                if k + lifespan <= steps:
+                    virginDeaths[k + lifespan] += initCells - virgin
+                virgin = initCells
+
+            immSeries[k - 1, ImmuneStates.VIRGIN] = virgin
+            immSeries[k - 1, ImmuneStates.MATURE] = mature
+
+        return eSeries, immSeries
+
+    @staticmethod
+    def __deathSchedule(ages, lifespan, steps):
+        """Counts the cells of the given ages dying of old age on each of the next timesteps, indexed by timestep."""
+        deaths = np.zeros(steps + 1, dtype=np.int64)
+        due = np.maximum(lifespan - np.asarray(ages, dtype=np.int64), 1)
+        due = due[due <= steps]
+        deaths[:] = np.bincount(due, minlength=steps + 1)
+        return deaths
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the FastForward class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        FastForward.ENABLED = settings["bIsEnabled"]
@@ -1,4 +1,6 @@
 from abc import ABCMeta, abstractmethod
+import cPickle as pickle
+import multiprocessing
 import matplotlib.pyplot as plt
 from matplotlib.font_manager import FontProperties
 import math 
@@ -8,7 +10,15 @@ import SimUtils
 class Graph(object):
     """Class for displaying Simulation Data into a graph"""
 
-    SHOW = None
+    SHOW = DOWNSAMPLE = None
+
+    # Image formats graphs can be saved in
+    FORMATS = ["png", "svg", "pdf"]
+
+    # Defaults of the [Graph] section, so that graphs can be saved before configuration
+    HEADLESS = False
+    FORMAT = FORMATS[0]
+    DPI = 100
 
     __metaclass__ = ABCMeta
 
@@ -146,6 +156,32 @@ class Graph(object):
     def setTimestepsInXMeasurement(self, timestepsInX):
         self.timestepsInX = timestepsInX
 
+    def downsampleForAxes(self, ax, time, lower, upper):
+        """Downsamples a band and its time to the pixel width of the axes it is plotted on, if Graph.DOWNSAMPLE is set,
+        see downsampleIndices. Only the plotted copies are downsampled.
+
+        Keyword arguments:
+        ax -- matplotlib Axes the band is plotted on.
+        time -- Time of each point.
+        lower -- Lower edge of the band at each point.
+        upper -- Upper edge of the band at each point.
+
+        Returns (time, lower, upper) lists.
+        """
+        if not Graph.DOWNSAMPLE:
+            return time, lower, upper
+
+        indices = downsampleIndices(lower, upper, int(ax.get_window_extent().width))
+        return np.take(time, indices).tolist(), np.take(lower, indices).tolist(), np.take(upper, indices).tolist()
+
+    def saveFigure(self):
+        """Saves the current figure in FORMAT at DPI. When HEADLESS, the figure is then closed, otherwise it is shown."""
+        plt.savefig(self.folderName + self.graphFileName + "." + Graph.FORMAT, format=Graph.FORMAT, dpi=Graph.DPI)
+        if Graph.HEADLESS:
+            plt.close()
+        else:
+            plt.show()
+
     @staticmethod
     def plotData(arr):
         plt.plot(arr)
@@ -153,7 +189,11 @@ class Graph(object):
 
     @staticmethod
     def Configure(settings):
-        Graph.SHOW = settings["bShowGraphOnFinish"]
+        Graph.SHOW       = settings["bShowGraphOnFinish"]
+        Graph.DOWNSAMPLE = settings["bDownsample"]
+        Graph.HEADLESS   = settings["bHeadless"]
+        Graph.FORMAT     = settings["sFormat"]
+        Graph.DPI        = settings["iDpi"]
 
     @abstractmethod
     def showGraph(normalize):
@@ -230,6 +270,29 @@ class OverallSimulationDataGraph(Graph):
         else :
             self._Graph__addDataTo(data.eCellsContaining + data.eCellsExpressing + data.eCellsInfectious, self.infectedResultsList[self.index])
 
+    def addRunData(self, time, eCellsHealthy, eCellsContaining, eCellsExpressing, eCellsInfectious, eCellsDead, immCellsTotal):
+        """Adds the series of every timestep of the current run at once.
+
+        The series are kept as given rather than copied, so numpy arrays such as views of the shared results of parallel
+        runs are read in place. Series must not be changed after being added.
+
+        Keyword arguments:
+        time -- Timestep of each value.
+        eCellsHealthy, eCellsContaining, eCellsExpressing, eCellsInfectious, eCellsDead, immCellsTotal -- Series of the
+            counters, one value per timestep.
+        """
+        if self.index < 0 :
+            raise AttributeError('index is less than zero - have you called initRun()?')
+        if self.index == 0:
+            self.time = list(time)
+        self.healthyResultsList[self.index] = eCellsHealthy
+        self.containingResultsList[self.index] = eCellsContaining
+        self.expressingResultsList[self.index] = eCellsExpressing
+        self.infectiousResultsList[self.index] = eCellsInfectious
+        self.deadResultsList[self.index] = eCellsDead
+        self.immCellsResultsList[self.index] = immCellsTotal
+        self.infectedResultsList[self.index] = eCellsContaining + eCellsExpressing + eCellsInfectious
+
     def __normalizeECellData(self, dataArr) :
         if dataArr == None :
             raise AttributeError('dataArr is null')
@@ -292,7 +355,9 @@ class OverallSimulationDataGraph(Graph):
             if len(mins) == 0 or len(maxs) == 0 :
                 return
 
-            if normalize and lists != self.immCellsResultsList:
+            time, mins, maxs = self.downsampleForAxes(self.ax, self.time, mins, maxs)
+
+            if normalize and lists is not self.immCellsResultsList:
                 self.__normalizeECellData(maxs)
                 self.__normalizeECellData(mins)
             else :
@@ -303,8 +368,8 @@ class OverallSimulationDataGraph(Graph):
             #ax.plot(self.time, maxs, label=labelStr, color=color)
             #ax.fill_between(self.time, mins, maxs, facecolor=color, color=color)
 
-            self.ax.plot(self.time, maxs, label=labelStr, color=color)
-            self.ax.fill_between(self.time, mins, maxs, facecolor=color, color=color)
+            self.ax.plot(time, maxs, label=labelStr, color=color)
+            self.ax.fill_between(time, mins, maxs, facecolor=color, color=color)
 
     def showGraph(self, normalize):
         self.ax = plt.subplot()
@@ -347,9 +412,56 @@ class OverallSimulationDataGraph(Graph):
         self.ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.12),
                   fancybox=True, shadow=True, ncol=3, prop=fontP)
 
-        plt.savefig(self.folderName + self.graphFileName)
-        plt.show()
+        self.saveFigure()
+
+
+class GraphRenderer(object):
+    """Saves graphs to files in a background process with a non-interactive backend, so that neither the simulation nor
+    the main thread waits for matplotlib, and no display is needed.
+
+    Each graph is pickled when it is passed in, so the graph can go on being changed straight away. The process saves
+    graphs in the order they were passed in, until closed.
+    """
+
+    def __init__(self):
+        """Constructor for GraphRenderer. Starts the process."""
+        self.graphs = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=renderGraphs, args=(self.graphs, Graph.DOWNSAMPLE, Graph.FORMAT, Graph.DPI))
+        self.process.start()
+
+    def render(self, graph, normalize):
+        """Passes a graph to the process to be saved, see Graph.showGraph.
+
+        Keyword arguments:
+        graph -- Graph to save.
+        normalize -- Whether to normalize the graph's data.
+        """
+        self.graphs.put(pickle.dumps((graph, normalize), pickle.HIGHEST_PROTOCOL))
+
+    def close(self):
+        """Waits for every graph passed in to be saved, then ends the process."""
+        self.graphs.put(None)
+        self.process.join()
 
+def renderGraphs(graphs, downsample, format, dpi):
+    """Target of the process of a GraphRenderer.
+
+    Keyword arguments:
+    graphs -- Queue of pickled (graph, normalize) to save, None to stop.
+    downsample, format, dpi -- Graph.DOWNSAMPLE, Graph.FORMAT and Graph.DPI of the program.
+    """
+    plt.switch_backend("Agg")
+    Graph.HEADLESS = True
+    Graph.DOWNSAMPLE = downsample
+    Graph.FORMAT = format
+    Graph.DPI = dpi
+
+    while True:
+        job = graphs.get()
+        if job == None:
+            break
+        graph, normalize = pickle.loads(job)
+        graph.showGraph(normalize)
 
 class SimulationData(object):
     """
@@ -392,6 +504,23 @@ class FociAreaGraph(Graph):
 
         return avgFociAreaMM2
 
+    def addAverageFociAreaSeries(self, avgFociAreaCells, time):
+        """Adds the average focus area of every timestep of the current run at once, see addRunData.
+
+        Keyword arguments:
+        avgFociAreaCells -- numpy array of the average focus area in cells at each timestep.
+        time -- Timestep of each value.
+
+        Returns numpy array of the average focus area in mm2 at each timestep.
+        """
+        avgFociAreaMM2 = avgFociAreaCells * self.scaledCellArea
+
+        self.fociAreaList[self.index] = avgFociAreaMM2
+        if self.index == 0 :
+            self.time = list(time)
+
+        return avgFociAreaMM2
+
     def showGraph(self, normalize):
 
         if normalize :
@@ -410,8 +539,7 @@ class FociAreaGraph(Graph):
         plt.title("Foci Area Graph")      
         plt.ylabel('Average Foci Area (mm2)')
         plt.xlabel('Time (' + self.xMeasure + ')')
-        plt.savefig(self.folderName + self.graphFileName)
-        plt.show()
+        self.saveFigure()
 
     def __subplot(self, lists, color, labelStr):
         minsmaxs = self.getStandardDeviationValues(lists)
@@ -424,8 +552,9 @@ class FociAreaGraph(Graph):
                 return
              
             ax = plt.subplot()
-            ax.plot(self.time, maxs, label=labelStr, color=color)
-            ax.fill_between(self.time, mins, maxs, facecolor=color, color=color)
+            time, mins, maxs = self.downsampleForAxes(ax, self.time, mins, maxs)
+            ax.plot(time, maxs, label=labelStr, color=color)
+            ax.fill_between(time, mins, maxs, facecolor=color, color=color)
 
     def initRun(self) :
         self.index += 1
@@ -437,3 +566,33 @@ class FociAreaGraph(Graph):
         returns what area a single \"cell\" (square) of the given grid size represents in mm2
         '''
         return (FociAreaGraph.CELLS_PER_PETRI_DISH_95MM / (gridHeight * gridWidth)) * FociAreaGraph.CELL_AREA_MM2
+
+def downsampleIndices(lower, upper, buckets):
+    """Chooses the points of a band to plot so that its shape is kept at a width of buckets pixels.
+
+    The points are split into buckets of consecutive points. The point of each bucket where the lower edge is lowest and
+    the one where the upper edge is highest are kept, along with the first and last points. Both edges are plotted at
+    the same points, so the extremes of every pixel column are drawn exactly.
+
+    Keyword arguments:
+    lower -- Lower edge of the band at each point.
+    upper -- Upper edge of the band at each point.
+    buckets -- Number of buckets, usually the pixel width of the plot.
+
+    Returns sorted int numpy array of the indices of the points to plot, every index if there are too few to reduce.
+    """
+    count = len(upper)
+    if buckets < 1 or count <= 2 * buckets:
+        return np.arange(count)
+
+    bucketSize = -(-count // buckets)
+    buckets = -(-count // bucketSize)
+    padded = np.full(buckets * bucketSize, np.inf)
+    padded[:count] = lower
+    lowest = padded.reshape(buckets, bucketSize).argmin(axis=1)
+    padded[:count] = upper
+    padded[count:] = -np.inf
+    highest = padded.reshape(buckets, bucketSize).argmax(axis=1)
+
+    starts = np.arange(buckets) * bucketSize
+    return np.unique(np.concatenate(([0, count - 1], starts + lowest, starts + highest)))
@@ -0,0 +1,360 @@
+import argparse
+import collections
+import socket
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from Queue import Queue, Empty
+from StringIO import StringIO
+
+import numpy as np
+
+from Results import RunResults
+from Logger import StdOutLogger as Log
+
+# Messages from the workers
+TAKE = "take"
+HEARTBEAT = "heartbeat"
+DONE = "done"
+
+# Replies to TAKE
+JOB = "job"
+WAIT = "wait"
+STOP = "stop"
+
+# Seconds an idle worker waits before asking for a job again
+WAIT_INTERVAL = 1.0
+
+# Heartbeats sent by a worker per lease time
+HEARTBEATS_PER_LEASE = 4
+
+# Seconds a worker daemon waits before connecting again once the coordinator has gone
+RECONNECT_INTERVAL = 5.0
+
+# Options of the runs overridden by the workers, which neither draw, record, graph nor share their runs out any further
+HEADLESS_OVERRIDES = [("SimulationVisualisation", "bIsEnabled", "False"), ("Recorder", "bIsEnabled", "False"),
+                      ("Graph", "bShowGraphOnFinish", "False"), ("Profiler", "bIsEnabled", "False"),
+                      ("Logger", "bBuffered", "False"), ("Batch", "bIsEnabled", "False"),
+                      ("AdaptiveRuns", "bIsEnabled", "False"), ("ResultCache", "bIsEnabled", "False"),
+                      ("PairedComparison", "bIsEnabled", "False"), ("Parallel", "bIsEnabled", "False"),
+                      ("Summary", "bIsEnabled", "False"), ("Broker", "bIsEnabled", "False")]
+
+class JobBroker(object):
+    """Coordinator of runs done by worker daemons, which connect to it over TCP from this or other machines.
+
+    Each job is the specification of a run, (options, seed, run): every option of the configuration as
+    (section, option, value), the seed and the index of the run. A worker takes a job, simulates the run headlessly and
+    sends back its counters, see packResults(). A job taken by a worker is leased to it for LEASE_TIME seconds, which
+    the worker renews while the run goes on. Jobs are queued again if their lease runs out or their worker's connection
+    is lost, and the first results sent back for a job are the ones kept.
+
+    Workers are trusted: messages are pickled, and only the authentication key keeps others out.
+    """
+
+    ENABLED = HOST = PORT = AUTHKEY = LEASE_TIME = None
+
+    def __init__(self, address=None, authkey=None, leaseTime=None):
+        """Constructor for JobBroker, which starts listening for workers.
+
+        Keyword arguments:
+        address -- (host, port) to listen on, defaults to (HOST, PORT). Port 0 picks a free port.
+        authkey -- Key the workers must know, defaults to AUTHKEY.
+        leaseTime -- Seconds a worker has a job for without renewing it, defaults to LEASE_TIME.
+        """
+        self.authkey = authkey if authkey != None else JobBroker.AUTHKEY
+        self.leaseTime = leaseTime if leaseTime != None else JobBroker.LEASE_TIME
+        self.listener = Listener(address if address != None else (JobBroker.HOST, JobBroker.PORT), authkey=self.authkey)
+        self.address = self.listener.address
+
+        self.lock = threading.Lock()
+        self.specs = []
+        self.pending = collections.deque()
+        self.leases = {}
+        self.finished = set()
+        self.completed = Queue()
+        self.connections = 0
+        self.closed = False
+
+        self.acceptThread = threading.Thread(target=self.__accept)
+        self.acceptThread.daemon = True
+        self.acceptThread.start()
+
+    def submit(self, spec):
+        """Queues a job.
+
+        Keyword arguments:
+        spec -- (options, seed, run) of the run, see JobBroker.
+
+        Returns the id of the job.
+        """
+        with self.lock:
+            job = len(self.specs)
+            self.specs.append(spec)
+            self.pending.append(job)
+        return job
+
+    def nextResult(self, timeout=None):
+        """Waits for a job to finish, queuing again the jobs whose lease runs out in the meantime.
+
+        Keyword arguments:
+        timeout -- Most seconds to wait, forever by default.
+
+        Returns (job id, RunResults or None, error text or None), or None if no job finished in time.
+        """
+        end = time.time() + timeout if timeout != None else None
+        while True:
+            self.__expireLeases()
+            wait = self.leaseTime if end == None else min(self.leaseTime, end - time.time())
+            try:
+                return self.completed.get(timeout=max(wait, 0))
+            except Empty:
+                if end != None and time.time() >= end:
+                    return None
+
+    def leasedJobs(self):
+        """Gets the ids of the jobs being done by workers."""
+        with self.lock:
+            return sorted(self.leases.keys())
+
+    def close(self):
+        """Stops listening, and has the connected workers disconnect once they next ask for a job."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        # Accepting blocks until a connection is made, so one is made to wake it
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (socket.error, EOFError, IOError):
+            pass
+        self.acceptThread.join()
+        self.listener.close()
+
+    def __accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (AuthenticationError, EOFError, IOError) as e:
+                if self.closed:
+                    return
+                Log.err("Refused a worker: %s" % e)
+                continue
+
+            if self.closed:
+                connection.close()
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self.__serve, args=(connection, self.connections))
+            thread.daemon = True
+            thread.start()
+
+    def __serve(self, connection, worker):
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == TAKE:
+                    connection.send(self.__lease(worker))
+                elif message[0] == HEARTBEAT:
+                    self.__renew(worker, message[1])
+                elif message[0] == DONE:
+                    self.__complete(message[1], message[2], message[3])
+        except (EOFError, IOError):
+            pass
+        finally:
+            connection.close()
+            self.__release(worker)
+
+    def __lease(self, worker):
+        self.__expireLeases()
+        with self.lock:
+            if self.closed:
+                return (STOP,)
+            while len(self.pending) > 0:
+                job = self.pending.popleft()
+                if not job in self.finished:
+                    self.leases[job] = (worker, time.time() + self.leaseTime)
+                    return (JOB, job, self.specs[job], float(self.leaseTime) / HEARTBEATS_PER_LEASE)
+            return (WAIT, WAIT_INTERVAL)
+
+    def __renew(self, worker, job):
+        with self.lock:
+            if job in self.leases and self.leases[job][0] == worker:
+                self.leases[job] = (worker, time.time() + self.leaseTime)
+
+    def __complete(self, job, packedResults, error):
+        with self.lock:
+            if job in self.finished:
+                return
+            self.finished.add(job)
+            self.leases.pop(job, None)
+        results = unpackResults(packedResults) if packedResults != None else None
+        self.completed.put((job, results, error))
+
+    def __release(self, worker):
+        # The worker is gone, so its jobs go back to the front of the queue
+        with self.lock:
+            for job in [job for job, (holder, expiry) in self.leases.items() if holder == worker]:
+                del self.leases[job]
+                self.pending.appendleft(job)
+
+    def __expireLeases(self):
+        now = time.time()
+        with self.lock:
+            for job in [job for job, (holder, expiry) in self.leases.items() if expiry < now]:
+                Log.err("Lease of job %d ran out, queuing it again" % job)
+                del self.leases[job]
+                self.pending.appendleft(job)
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the JobBroker class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        JobBroker.ENABLED    = settings["bIsEnabled"]
+        JobBroker.HOST       = settings["sHost"]
+        JobBroker.PORT       = settings["iPort"]
+        JobBroker.AUTHKEY    = settings["sAuthKey"]
+        JobBroker.LEASE_TIME = settings["iLeaseTime"]
+
+class JobWorker(object):
+    """Worker daemon of a JobBroker. Takes jobs one at a time and simulates them in this process."""
+
+    def __init__(self, address, authkey):
+        """Constructor for JobWorker
+
+        Keyword arguments:
+        address -- (host, port) of the coordinator.
+        authkey -- Authentication key of the coordinator.
+        """
+        self.address = address
+        self.authkey = authkey
+        self.jobs = 0
+
+    def run(self, reconnect=True):
+        """Does jobs until the coordinator stops the worker, then waits for the next coordinator.
+
+        Keyword arguments:
+        reconnect -- Whether to carry on once the coordinator has gone, rather than return.
+
+        Returns the number of jobs done.
+        """
+        while True:
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+            except socket.error:
+                connection = None
+
+            if connection != None:
+                try:
+                    self.serve(connection)
+                except (EOFError, IOError):
+                    Log.err("Lost the connection to the coordinator")
+                finally:
+                    connection.close()
+
+            if not reconnect:
+                return self.jobs
+            time.sleep(RECONNECT_INTERVAL)
+
+    def serve(self, connection):
+        """Does jobs from a connection to the coordinator until it stops the worker.
+
+        Keyword arguments:
+        connection -- Connection to the coordinator.
+        """
+        while True:
+            connection.send((TAKE,))
+            reply = connection.recv()
+            if reply[0] == STOP:
+                return
+            elif reply[0] == WAIT:
+                time.sleep(reply[1])
+                continue
+
+            kind, job, spec, heartbeatInterval = reply
+            stopped = threading.Event()
+            heartbeats = threading.Thread(target=sendHeartbeats, args=(connection, job, heartbeatInterval, stopped))
+            heartbeats.daemon = True
+            heartbeats.start()
+            try:
+                packedResults, error = packResults(executeJob(spec)), None
+            except Exception:
+                packedResults, error = None, traceback.format_exc()
+            finally:
+                stopped.set()
+                heartbeats.join()
+
+            connection.send((DONE, job, packedResults, error))
+            self.jobs += 1
+
+def sendHeartbeats(connection, job, interval, stopped):
+    """Renews the lease of a job until stopped. Target of the heartbeat thread of a JobWorker."""
+    while not stopped.wait(interval):
+        try:
+            connection.send((HEARTBEAT, job))
+        except (EOFError, IOError):
+            return
+
+def configureJob(spec):
+    """Configures this process as the specification of a run, to be simulated headlessly.
+
+    Keyword arguments:
+    spec -- (options, seed, run) of the run, see JobBroker.
+
+    Returns the settings of the program.
+    """
+    import Config # Imports Program, which imports this module
+    options, seed, run = spec
+    overrides = list(options) + HEADLESS_OVERRIDES + [("Random", "iSeed", str(seed))]
+    return Config.ConfigReader().SetConfiguration(overrides, useFile=False)
+
+def executeJob(spec):
+    """Configures this process as the specification of a run and simulates it headlessly.
+
+    Keyword arguments:
+    spec -- (options, seed, run) of the run, see JobBroker.
+
+    Returns RunResults.
+    """
+    import Program
+    settings = configureJob(spec)
+    return Program.MainProgram().simulateJob(settings, spec[2])
+
+def packResults(results):
+    """Compresses the counters of a run to send them to the coordinator.
+
+    Keyword arguments:
+    results -- RunResults of the run.
+
+    Returns str.
+    """
+    buffer = StringIO()
+    np.savez_compressed(buffer, runTime=results.runTime, initCells=results.initCells, eCounts=results.eCounts,
+                        immCounts=results.immCounts, fociAreas=results.fociAreas)
+    return buffer.getvalue()
+
+def unpackResults(packedResults):
+    """Gets the RunResults packed by packResults()."""
+    with np.load(StringIO(packedResults)) as stored:
+        return RunResults(int(stored["runTime"]), int(stored["initCells"]), stored["eCounts"], stored["immCounts"], stored["fociAreas"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Do the runs of a coordinator with [Broker] enabled.")
+    parser.add_argument("--host", default="localhost", help="host of the coordinator")
+    parser.add_argument("--port", type=int, default=6010, help="port of the coordinator")
+    parser.add_argument("--authkey", default="influenza", help="authentication key of the coordinator")
+    parser.add_argument("--once", action="store_true", help="exit once the coordinator has gone, rather than wait for the next")
+    args = parser.parse_args(argv)
+
+    Log.out("Worker of %s:%d" % (args.host, args.port))
+    jobs = JobWorker((args.host, args.port), args.authkey).run(reconnect=not args.once)
+    Log.out("%d runs done" % jobs)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
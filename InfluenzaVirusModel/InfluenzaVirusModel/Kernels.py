@@ -0,0 +1,426 @@
+from Cells import EpithelialStates, ImmuneStates
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+ENABLED = None
+
+def Configure(settings):
+    """Set the constant configuration values of the array backend.
+
+    Keyword arguments:
+    settings -- The ConfigSettings instance that contains configurations.
+    """
+    global ENABLED
+    ENABLED = settings["bIsEnabled"]
+
+def jit(func):
+    """Compiles a kernel with Numba when it is installed, otherwise the kernel runs as plain Python."""
+    if NUMBA_AVAILABLE:
+        return njit(cache=True, nogil=True)(func)
+    return func
+
+# Module level constants are frozen into the compiled kernels
+HEALTHY         = EpithelialStates.HEALTHY
+CONTAINING      = EpithelialStates.CONTAINING
+EXPRESSING      = EpithelialStates.EXPRESSING
+INFECTIOUS      = EpithelialStates.INFECTIOUS
+INFECTION_DEATH = EpithelialStates.INFECTION_DEATH
+NATURAL_DEATH   = EpithelialStates.NATURAL_DEATH
+
+VIRGIN = ImmuneStates.VIRGIN
+MATURE = ImmuneStates.MATURE
+DEAD   = ImmuneStates.DEAD
+
+NO_FOCUS = -1
+
+# Slot of a chunk of a sparse lattice that isn't materialised, see SparseSystems.py
+NO_SLOT = -1
+
+# Most infection rolls per infectious or healthy cell, used to size the random buffers passed to the kernels
+MAX_NEIGHBOURS = 8
+
+# Fixed roll layout of epithelialUpdate: a slot per site of the 3x3 neighbourhood, the centre slot being the regeneration roll
+ROLLS_PER_CELL = 9
+REGEN_SLOT = 4
+
+@jit
+def setEpithelialNextState(i, newState, nextState, age, delay, timeInfected, canInfect, focusId):
+    """Array equivalent of EpithelialSystem.setNextState for the cell at flat index i."""
+    if newState == INFECTION_DEATH or newState == NATURAL_DEATH:
+        age[i] = 0
+        delay[i] = 0
+    elif newState == HEALTHY:
+        age[i] = 0
+        delay[i] = 0
+        timeInfected[i] = 0
+        canInfect[i] = 1
+        focusId[i] = NO_FOCUS
+    elif newState == CONTAINING or newState == EXPRESSING:
+        delay[i] = 0
+    nextState[i] = newState
+
+@jit
+def progressInfection(i, s, nextState, age, delay, timeInfected, canInfect, focusId, infectLifespan, expressDelay, infectDelay):
+    """Infection time and advancement substeps of EpithelialSystem.update for the infected cell at flat index i in state s.
+
+    Returns True if the cell died of infection.
+    """
+    #Infection time substep
+    timeInfected[i] += 1
+    if timeInfected[i] >= infectLifespan:
+        setEpithelialNextState(i, INFECTION_DEATH, nextState, age, delay, timeInfected, canInfect, focusId)
+        return True
+
+    #Infection advancement substep
+    if s != INFECTIOUS:
+        delay[i] += 1
+
+    if s == CONTAINING and delay[i] >= expressDelay:
+        setEpithelialNextState(i, EXPRESSING, nextState, age, delay, timeInfected, canInfect, focusId)
+    elif s == EXPRESSING and delay[i] >= infectDelay:
+        setEpithelialNextState(i, INFECTIOUS, nextState, age, delay, timeInfected, canInfect, focusId)
+    else:
+        nextState[i] = s
+    return False
+
+@jit
+def epithelialUpdate(state, nextState, age, delay, timeInfected, canInfect, focusId, width, height, toroidal, start, stop,
+                     cellLifespan, infectLifespan, expressDelay, infectDelay, regenEnabled, regenChance, infectChance, rand, randIndex,
+                     fixedRolls):
+    """Array equivalent of EpithelialSystem.update for the cells with flat index in [start, stop).
+
+    Cells are stored x major, so the cell at (x, y) has flat index x * height + y. Each dead cell consumes one random
+    number when regeneration is enabled, and each infection roll against a healthy neighbour consumes one.
+
+    With fixedRolls, rand instead holds ROLLS_PER_CELL numbers for every cell, from randIndex. Each roll reads the number
+    of its own cell and neighbour slot, so a roll gets the same number whatever rolls happened before it.
+
+    Returns the index of the next unused number in rand.
+    """
+    for i in range(start, stop):
+        s = state[i]
+
+        #Age Death Step
+        if s != NATURAL_DEATH and s != INFECTION_DEATH:
+            age[i] += 1
+            if age[i] >= cellLifespan:
+                setEpithelialNextState(i, NATURAL_DEATH, nextState, age, delay, timeInfected, canInfect, focusId)
+                continue
+
+        #Cell Regeneration Step
+        else:
+            if not regenEnabled:
+                continue
+            if fixedRolls:
+                roll = rand[randIndex + i * ROLLS_PER_CELL + REGEN_SLOT]
+            else:
+                roll = rand[randIndex]
+                randIndex += 1
+            if roll >= (1.0 - regenChance):
+                setEpithelialNextState(i, HEALTHY, nextState, age, delay, timeInfected, canInfect, focusId)
+            else:
+                nextState[i] = s
+                continue
+
+        #Infection Progression Step
+        if s == CONTAINING or s == EXPRESSING or s == INFECTIOUS:
+            if progressInfection(i, s, nextState, age, delay, timeInfected, canInfect, focusId, infectLifespan, expressDelay, infectDelay):
+                continue
+
+            #Infection attempt substep
+            if s == INFECTIOUS:
+                x = i // height
+                y = i % height
+                for dx in range(-1, 2):
+                    nx = x + dx
+                    if nx < 0 or nx >= width:
+                        if not toroidal:
+                            continue
+                        nx = (nx + width) % width
+                    for dy in range(-1, 2):
+                        if dx == 0 and dy == 0:
+                            continue
+                        ny = y + dy
+                        if ny < 0 or ny >= height:
+                            if not toroidal:
+                                continue
+                            ny = (ny + height) % height
+
+                        j = nx * height + ny
+                        if state[j] == HEALTHY and canInfect[j]:
+                            if fixedRolls:
+                                roll = rand[randIndex + i * ROLLS_PER_CELL + (dx + 1) * 3 + dy + 1]
+                            else:
+                                roll = rand[randIndex]
+                                randIndex += 1
+                            if roll >= (1.0 - infectChance):
+                                setEpithelialNextState(j, CONTAINING, nextState, age, delay, timeInfected, canInfect, focusId)
+                                canInfect[j] = 0
+                                focusId[j] = focusId[i]
+    return randIndex
+
+@jit
+def epithelialSynchronise(state, nextState, counts, start, stop):
+    """Array equivalent of EpithelialSystem.synchronise for the cells with flat index in [start, stop).
+
+    counts holds the number of cells in each state, indexed by state.
+    """
+    for i in range(start, stop):
+        if state[i] != nextState[i]:
+            counts[state[i]] -= 1
+            counts[nextState[i]] += 1
+            state[i] = nextState[i]
+
+@jit
+def sparseIndex(x, y, slots, chunkSize):
+    """Gets the flat index of the cell at (x, y) of a sparse lattice, -1 if its chunk isn't materialised.
+
+    The cell at (cx, cy) of the chunk held in slot k has flat index k * chunkSize * chunkSize + cx * chunkSize + cy.
+    """
+    k = slots[x // chunkSize, y // chunkSize]
+    if k == NO_SLOT:
+        return -1
+    return k * chunkSize * chunkSize + (x % chunkSize) * chunkSize + y % chunkSize
+
+@jit
+def sparseEpithelialUpdate(state, nextState, age, delay, timeInfected, canInfect, focusId, slots, slotX, slotY, slotCount, chunkSize,
+                           width, height, toroidal, cellLifespan, infectLifespan, expressDelay, infectDelay, regenEnabled,
+                           regenChance, infectChance, rand, randIndex):
+    """Array equivalent of EpithelialSystem.update for the materialised chunks of a sparse lattice, held in the first
+    slotCount slots. See sparseIndex for the layout, slotX and slotY hold the chunk coordinates of each slot.
+
+    Random numbers are consumed like epithelialUpdate. Cells of chunks past the edge of the grid are left alone, and
+    infection rolls against cells of chunks that aren't materialised are skipped, so every neighbouring chunk of an
+    infected cell must be materialised beforehand.
+
+    Returns the index of the next unused number in rand.
+    """
+    chunkCells = chunkSize * chunkSize
+    for k in range(slotCount):
+        for c in range(chunkCells):
+            x = slotX[k] * chunkSize + c // chunkSize
+            y = slotY[k] * chunkSize + c % chunkSize
+            if x >= width or y >= height:
+                continue
+            i = k * chunkCells + c
+            s = state[i]
+
+            #Age Death Step
+            if s != NATURAL_DEATH and s != INFECTION_DEATH:
+                age[i] += 1
+                if age[i] >= cellLifespan:
+                    setEpithelialNextState(i, NATURAL_DEATH, nextState, age, delay, timeInfected, canInfect, focusId)
+                    continue
+
+            #Cell Regeneration Step
+            else:
+                if not regenEnabled:
+                    continue
+                roll = rand[randIndex]
+                randIndex += 1
+                if roll >= (1.0 - regenChance):
+                    setEpithelialNextState(i, HEALTHY, nextState, age, delay, timeInfected, canInfect, focusId)
+                else:
+                    nextState[i] = s
+                    continue
+
+            #Infection Progression Step
+            if s == CONTAINING or s == EXPRESSING or s == INFECTIOUS:
+                if progressInfection(i, s, nextState, age, delay, timeInfected, canInfect, focusId, infectLifespan, expressDelay, infectDelay):
+                    continue
+
+                #Infection attempt substep
+                if s == INFECTIOUS:
+                    for dx in range(-1, 2):
+                        nx = x + dx
+                        if nx < 0 or nx >= width:
+                            if not toroidal:
+                                continue
+                            nx = (nx + width) % width
+                        for dy in range(-1, 2):
+                            if dx == 0 and dy == 0:
+                                continue
+                            ny = y + dy
+                            if ny < 0 or ny >= height:
+                                if not toroidal:
+                                    continue
+                                ny = (ny + height) % height
+
+                            j = sparseIndex(nx, ny, slots, chunkSize)
+                            if j >= 0 and state[j] == HEALTHY and canInfect[j]:
+                                roll = rand[randIndex]
+                                randIndex += 1
+                                if roll >= (1.0 - infectChance):
+                                    setEpithelialNextState(j, CONTAINING, nextState, age, delay, timeInfected, canInfect, focusId)
+                                    canInfect[j] = 0
+                                    focusId[j] = focusId[i]
+    return randIndex
+
+@jit
+def sparseEpithelialSynchronise(state, nextState, counts, slotInfected, slotCount, chunkSize):
+    """Array equivalent of EpithelialSystem.synchronise for the materialised chunks of a sparse lattice.
+
+    counts holds the number of cells in each state, indexed by state. slotInfected is set to whether each slot holds
+    infected cells after synchronising.
+    """
+    chunkCells = chunkSize * chunkSize
+    for k in range(slotCount):
+        infected = 0
+        for i in range(k * chunkCells, (k + 1) * chunkCells):
+            if state[i] != nextState[i]:
+                counts[state[i]] -= 1
+                counts[nextState[i]] += 1
+                state[i] = nextState[i]
+            if state[i] == CONTAINING or state[i] == EXPRESSING or state[i] == INFECTIOUS:
+                infected = 1
+        slotInfected[k] = infected
+
+@jit
+def immuneUpdate(x, y, age, state, nextState, count, counts, eState, eNextState, eAge, eDelay, width, height, toroidal,
+                 lifespan, rand, randIndex):
+    """Array equivalent of the age, movement and encounter steps of ImmuneSystem.update.
+
+    counts holds the number of cells in each immune state, indexed by state. Each moving cell consumes one random number
+    choosing one of its 8 neighbouring sites uniformly, like the rejection loop of the object system.
+
+    Returns (index of the next unused number in rand, number of encounters).
+    """
+    encounters = 0
+    for k in range(count):
+        if not ageAndMoveImmuneCell(k, x, y, age, state, nextState, counts, width, height, toroidal, lifespan, rand[randIndex]):
+            continue
+        randIndex += 1
+
+        #Encounter Step
+        if encounterEpithelialCell(k, x[k] * height + y[k], state, nextState, counts, eState, eNextState, eAge, eDelay):
+            encounters += 1
+
+    return randIndex, encounters
+
+@jit
+def sparseImmuneUpdate(x, y, age, state, nextState, count, counts, eState, eNextState, eAge, eDelay, slots, chunkSize, width, height,
+                       toroidal, lifespan, rand, randIndex):
+    """immuneUpdate for immune cells over a sparse lattice, see sparseEpithelialUpdate. Chunks that aren't materialised
+    hold no infected cells, so cells moving over them have no encounters.
+
+    Returns (index of the next unused number in rand, number of encounters).
+    """
+    encounters = 0
+    for k in range(count):
+        if not ageAndMoveImmuneCell(k, x, y, age, state, nextState, counts, width, height, toroidal, lifespan, rand[randIndex]):
+            continue
+        randIndex += 1
+
+        #Encounter Step
+        i = sparseIndex(x[k], y[k], slots, chunkSize)
+        if i >= 0 and encounterEpithelialCell(k, i, state, nextState, counts, eState, eNextState, eAge, eDelay):
+            encounters += 1
+
+    return randIndex, encounters
+
+@jit
+def ageAndMoveImmuneCell(k, x, y, age, state, nextState, counts, width, height, toroidal, lifespan, roll):
+    """Age and movement steps of ImmuneSystem.update for immune cell k, moving with the given random number.
+
+    Returns False if the cell died of old age, without using the number.
+    """
+    #Age step
+    age[k] += 1
+    if age[k] >= lifespan:
+        nextState[k] = DEAD
+        counts[state[k]] -= 1
+        return False
+
+    #Movement Step
+    move = int(roll * 8.0)
+    if move >= 4:
+        move += 1 # skip the centre of the 3x3 neighbourhood
+    dx = move // 3 - 1
+    dy = move % 3 - 1
+
+    if toroidal:
+        x[k] = (x[k] + dx + width) % width
+        y[k] = (y[k] + dy + height) % height
+    else:
+        if x[k] + dx >= 0 and x[k] + dx <= width - 1:
+            x[k] += dx
+        if y[k] + dy >= 0 and y[k] + dy <= height - 1:
+            y[k] += dy
+    return True
+
+@jit
+def encounterEpithelialCell(k, i, state, nextState, counts, eState, eNextState, eAge, eDelay):
+    """Encounter step of ImmuneSystem.update for immune cell k, on the epithelial cell at flat index i.
+
+    Returns True if the epithelial cell was expressing or infectious and is killed.
+    """
+    if eState[i] == EXPRESSING or eState[i] == INFECTIOUS:
+        if state[k] == VIRGIN:
+            nextState[k] = MATURE
+            counts[VIRGIN] -= 1
+            counts[MATURE] += 1
+
+        eAge[i] = 0
+        eDelay[i] = 0
+        eNextState[i] = NATURAL_DEATH
+        return True
+    return False
+
+@jit
+def immuneSynchronise(x, y, age, state, nextState, count):
+    """Array equivalent of ImmuneSystem.synchronise. Removes dead cells, keeping the order of the remaining cells.
+
+    Returns the new number of cells.
+    """
+    kept = 0
+    for k in range(count):
+        if nextState[k] == DEAD:
+            continue
+        x[kept] = x[k]
+        y[kept] = y[k]
+        age[kept] = age[k]
+        state[kept] = nextState[k]
+        nextState[kept] = nextState[k]
+        kept += 1
+    return kept
+
+@jit
+def epithelialUpdateBatch(state, nextState, age, delay, timeInfected, canInfect, focusId, width, height, toroidal, cellLifespan,
+                          infectLifespan, expressDelay, infectDelay, regenEnabled, regenChance, infectChance, rand, randOffsets):
+    """Runs epithelialUpdate over every replicate of (replicates, cells) arrays.
+
+    regenChance holds the regeneration chance of each replicate. Replicate r draws its random numbers from
+    rand[randOffsets[r]:randOffsets[r + 1]].
+    """
+    for r in range(state.shape[0]):
+        epithelialUpdate(state[r], nextState[r], age[r], delay[r], timeInfected[r], canInfect[r], focusId[r], width, height, toroidal,
+                         0, state.shape[1], cellLifespan, infectLifespan, expressDelay, infectDelay, regenEnabled, regenChance[r],
+                         infectChance, rand, randOffsets[r], False)
+
+@jit
+def epithelialSynchroniseBatch(state, nextState, counts):
+    """Runs epithelialSynchronise over every replicate of (replicates, cells) arrays, counts being (replicates, states)."""
+    for r in range(state.shape[0]):
+        epithelialSynchronise(state[r], nextState[r], counts[r], 0, state.shape[1])
+
+@jit
+def immuneUpdateBatch(x, y, age, state, nextState, count, counts, eState, eNextState, eAge, eDelay, width, height, toroidal,
+                      lifespan, rand, randOffsets, encounters):
+    """Runs immuneUpdate over every replicate of (replicates, capacity) arrays.
+
+    count holds the number of cells of each replicate. The number of encounters of each replicate is stored in encounters.
+    """
+    for r in range(x.shape[0]):
+        randIndex, found = immuneUpdate(x[r], y[r], age[r], state[r], nextState[r], count[r], counts[r], eState[r], eNextState[r],
+                                        eAge[r], eDelay[r], width, height, toroidal, lifespan, rand, randOffsets[r])
+        encounters[r] = found
+
+@jit
+def immuneSynchroniseBatch(x, y, age, state, nextState, count):
+    """Runs immuneSynchronise over every replicate of (replicates, capacity) arrays, updating count in place."""
+    for r in range(x.shape[0]):
+        count[r] = immuneSynchronise(x[r], y[r], age[r], state[r], nextState[r], count[r])
@@ -0,0 +1,234 @@
+import ctypes
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray, RawValue
+from Queue import Empty
+import numpy as np
+
+import Worldspace
+from SimulationVisualization import SimVis
+
+# Immune cells shown at each site of a frame, mature cells being shown over virgin cells
+NO_IMMUNE_CELL = 0
+VIRGIN_IMMUNE_CELL = 1
+MATURE_IMMUNE_CELL = 2
+
+FRAME_SLOTS = 2
+
+# Fields of the header of each slot
+SEQUENCE = 0
+RUN = 1
+TIMESTEPS = 2
+HEADER_FIELDS = 3
+
+# Attempts at copying the latest frame before giving up until the next poll
+READ_ATTEMPTS = 3
+
+# Milliseconds between polls of the viewer for new frames
+POLL_INTERVAL = 20
+
+class SharedFrames(object):
+    """Double buffer of the latest frame of the simulation, in shared memory.
+
+    The simulation writes each frame to the slot not holding the latest frame, then marks it latest, so it never waits
+    for the viewer. The sequence number of a slot is odd while it is being written. The viewer copies the latest slot and
+    only keeps the copy if its sequence number was even and unchanged by the end, which fails only if the simulation has
+    written two frames in the meantime. The arrays are allocated by the simulation process and passed to the viewer
+    process when it starts.
+    """
+
+    def __init__(self, width, height):
+        """Constructor for SharedFrames
+
+        Keyword arguments:
+        width -- Width of a frame, in sites.
+        height -- Height of a frame, in sites.
+        """
+        self.width = width
+        self.height = height
+
+        self.statesBuffer = RawArray(ctypes.c_uint8, FRAME_SLOTS * width * height)
+        self.immuneBuffer = RawArray(ctypes.c_uint8, FRAME_SLOTS * width * height)
+        self.headerBuffer = RawArray(ctypes.c_int64, FRAME_SLOTS * HEADER_FIELDS)
+        self.latestSlot = RawValue(ctypes.c_int32, 0)
+        self.seenSequence = RawValue(ctypes.c_int64, 0)
+        self.frames = 0
+        self.__createViews()
+
+    def __createViews(self):
+        self.states = np.frombuffer(self.statesBuffer, dtype=np.uint8).reshape(FRAME_SLOTS, self.width, self.height)
+        self.immune = np.frombuffer(self.immuneBuffer, dtype=np.uint8).reshape(FRAME_SLOTS, self.width, self.height)
+        self.header = np.frombuffer(self.headerBuffer, dtype=np.int64).reshape(FRAME_SLOTS, HEADER_FIELDS)
+
+    def __getstate__(self):
+        # Pickling the views would copy the data, only the buffers are passed to a starting process
+        return (self.width, self.height, self.frames, self.statesBuffer, self.immuneBuffer, self.headerBuffer, self.latestSlot, self.seenSequence)
+
+    def __setstate__(self, state):
+        self.width, self.height, self.frames, self.statesBuffer, self.immuneBuffer, self.headerBuffer, self.latestSlot, self.seenSequence = state
+        self.__createViews()
+
+    def publish(self, run, timesteps, stateGrid, virginGrid, matureGrid):
+        """Writes a frame and makes it the latest. The grids are cropped to the size of a frame.
+
+        Keyword arguments:
+        run -- Number of the run.
+        timesteps -- Timestep of the frame.
+        stateGrid -- (width, height) array of epithelial states.
+        virginGrid -- (width, height) array of virgin immune cell counts.
+        matureGrid -- (width, height) array of mature immune cell counts.
+        """
+        slot = 1 - self.latestSlot.value
+        self.frames += 1
+        self.header[slot, SEQUENCE] = 2 * self.frames - 1
+
+        self.states[slot] = stateGrid[:self.width, :self.height]
+        immune = self.immune[slot]
+        immune[:] = NO_IMMUNE_CELL
+        immune[virginGrid[:self.width, :self.height] > 0] = VIRGIN_IMMUNE_CELL
+        immune[matureGrid[:self.width, :self.height] > 0] = MATURE_IMMUNE_CELL
+        self.header[slot, RUN] = run
+        self.header[slot, TIMESTEPS] = timesteps
+
+        self.header[slot, SEQUENCE] = 2 * self.frames
+        self.latestSlot.value = slot
+
+    def isCaughtUp(self):
+        """Gets whether the viewer has read the latest frame."""
+        return self.seenSequence.value == 2 * self.frames
+
+    def read(self):
+        """Copies the latest frame if the viewer hasn't read it yet.
+
+        Returns (run, timesteps, states, immune) or None if there is no new frame. states and immune are (width, height)
+        uint8 numpy arrays, immune holding the immune cells shown at each site.
+        """
+        for attempt in xrange(READ_ATTEMPTS):
+            slot = self.latestSlot.value
+            sequence = self.header[slot, SEQUENCE]
+            if sequence == self.seenSequence.value:
+                return None
+
+            frame = (int(self.header[slot, RUN]), int(self.header[slot, TIMESTEPS]), self.states[slot].copy(), self.immune[slot].copy())
+            if sequence % 2 == 0 and self.header[slot, SEQUENCE] == sequence:
+                self.seenSequence.value = sequence
+                return frame
+        return None
+
+class LiveView(object):
+    """Stands in for SimVis in the simulation, while a SimVis in a viewer process draws the frames at its own pace.
+
+    Frames are drawn from the grids of either backend. Live frames go through SharedFrames, and are only made when the
+    viewer has read the last one. Frames to be saved are also queued, so that none are skipped. Collisions aren't
+    highlighted.
+    """
+
+    def __init__(self, width, height, squareSize, blockSize=1):
+        """Constructor for LiveView, see SimVis.
+
+        Keyword arguments:
+        width -- Width of the drawn world, in squares.
+        height -- Height of the drawn world, in squares.
+        squareSize -- Size of a square in pixels.
+        blockSize -- Sites along each side of the block of the grids drawn as one square.
+        """
+        self.width = width
+        self.height = height
+        self.squareSize = squareSize
+        self.blockSize = blockSize
+        self.timeMeasurement = "timesteps"
+        self.timeStepsInMeasurement = 1
+        self.run = 0
+
+        self.frames = SharedFrames(min(width * blockSize, Worldspace.GRID_WIDTH), min(height * blockSize, Worldspace.GRID_HEIGHT))
+        self.savedFrames = multiprocessing.Queue()
+        self.process = None
+
+    def setTimeStepsInMeasurement(self, val):
+        self.timeStepsInMeasurement = val
+
+    def setTimeMeasurement(self, measurement):
+        self.timeMeasurement = measurement
+
+    def init(self, world, run=0):
+        self.run = run
+
+    def display(self):
+        """Starts the viewer process, then waits for its window to be closed."""
+        self.process = multiprocessing.Process(target=runViewer, args=(self.frames, self.savedFrames, self.width, self.height, self.squareSize,
+                                                                      self.blockSize, self.timeMeasurement, self.timeStepsInMeasurement))
+        self.process.daemon = True
+        self.process.start()
+        self.process.join()
+
+    def wantsFrame(self, save):
+        """Gets whether drawGrids would use a frame, which is worth knowing before making its grids.
+
+        Keyword arguments:
+        save -- Whether the frame is to be saved.
+        """
+        if self.process != None and not self.process.is_alive():
+            return False
+        return save or self.frames.isCaughtUp()
+
+    def drawGrids(self, stateGrid, virginGrid, matureGrid, save, timesteps):
+        """Passes a frame to the viewer, see SimVis.drawGrids."""
+        if self.process != None and not self.process.is_alive():
+            return
+
+        if save:
+            frames = self.frames
+            self.savedFrames.put((self.run, timesteps, np.array(stateGrid[:frames.width, :frames.height]),
+                                  np.array(virginGrid[:frames.width, :frames.height]), np.array(matureGrid[:frames.width, :frames.height])))
+        else:
+            self.frames.publish(self.run, timesteps, stateGrid, virginGrid, matureGrid)
+
+class Viewer(object):
+    """Draws the frames of a LiveView with a SimVis, from within the Tk main loop of the viewer process."""
+
+    def __init__(self, simVis, frames, savedFrames):
+        """Constructor for Viewer
+
+        Keyword arguments:
+        simVis -- SimVis to draw with.
+        frames -- SharedFrames of the live frames.
+        savedFrames -- Queue of the frames to be saved.
+        """
+        self.simVis = simVis
+        self.frames = frames
+        self.savedFrames = savedFrames
+
+    def poll(self):
+        """Draws the frames to be saved, then the latest live frame if there is a new one."""
+        try:
+            while True:
+                run, timesteps, states, virgin, mature = self.savedFrames.get_nowait()
+                self.__draw(run, timesteps, states, virgin, mature, True)
+        except Empty:
+            pass
+
+        frame = self.frames.read()
+        if frame != None:
+            run, timesteps, states, immune = frame
+            self.__draw(run, timesteps, states, immune >= VIRGIN_IMMUNE_CELL, immune == MATURE_IMMUNE_CELL, False)
+
+        self.simVis.root.after(POLL_INTERVAL, self.poll)
+
+    def __draw(self, run, timesteps, states, virgin, mature, save):
+        if run != self.simVis.simRun:
+            self.simVis.init(None, run)
+        self.simVis.drawGrids(states, virgin, mature, save, timesteps)
+
+def runViewer(frames, savedFrames, width, height, squareSize, blockSize, timeMeasurement, timeStepsInMeasurement):
+    """Target of the viewer process of a LiveView."""
+    if SimVis.ENABLED == None:
+        # Started as a new interpreter rather than forked, so nothing is configured yet
+        import Config # Imports Program, which imports this module
+        Config.ConfigReader().SetConfiguration()
+
+    simVis = SimVis(width, height, squareSize, blockSize)
+    simVis.setTimeMeasurement(timeMeasurement)
+    simVis.setTimeStepsInMeasurement(timeStepsInMeasurement)
+
+    viewer = Viewer(simVis, frames, savedFrames)
+    simVis.root.after(POLL_INTERVAL, viewer.poll)
+    simVis.display()
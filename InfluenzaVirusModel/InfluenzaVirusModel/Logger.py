@@ -1,8 +1,29 @@
 from abc import ABCMeta, abstractmethod
+from threading import Thread
+from Queue import Queue
+import json
+import os
+
+import SimUtils
+
+TEXT_FORMAT = "text"
+JSON_FORMAT = "jsonl"
+CSV_FORMAT = "csv"
+FORMATS = [TEXT_FORMAT, JSON_FORMAT, CSV_FORMAT]
+
+LOG_DIR_NAME = "logs/"
+LOG_FILE_NAME = "simulation"
+TEXT_FILE_EXTENSION = ".log"
+SIM_RUN_FILE_PREFIX = "run"
 
 class Logger(object):
     __metaclass__ = ABCMeta
 
+    BUFFERED = False
+    FORMAT = TEXT_FORMAT
+    SAMPLE_EVERY = 1
+    PER_RUN_FILES = False
+
     @staticmethod
     @abstractmethod
     def out(str):
@@ -13,7 +34,44 @@ class Logger(object):
     def err(str):
         pass
 
+    @staticmethod
+    @abstractmethod
+    def record(fields):
+        pass
+
+    @staticmethod
+    def formatRecord(fields, header=False):
+        """Formats a structured record as a line of the configured format.
+
+        Keyword arguments:
+        fields -- OrderedDict of field names to values.
+        header -- Return the CSV header line instead of the values.
+
+        Returns str.
+        """
+        if Logger.FORMAT == JSON_FORMAT:
+            return json.dumps(fields)
+        elif Logger.FORMAT == CSV_FORMAT:
+            if header:
+                return ",".join(fields.keys())
+            return ",".join(["" if value == None else str(value) for value in fields.values()])
+        return "\n".join(["%s: %s" % (key, value) for key, value in fields.items()])
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the Logger class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        Logger.BUFFERED      = settings["bBuffered"]
+        Logger.FORMAT        = settings["sFormat"]
+        Logger.SAMPLE_EVERY  = settings["iSampleEvery"]
+        Logger.PER_RUN_FILES = settings["bPerRunFiles"]
+
 class StdOutLogger(Logger):
+    headerWritten = False
+
     def __init__(self, *args):
         super(StdOutLogger, self).__init__()
 
@@ -24,3 +82,158 @@ class StdOutLogger(Logger):
     @staticmethod
     def out(str):
         print(str)
+
+    @staticmethod
+    def record(fields):
+        if Logger.FORMAT == CSV_FORMAT and not StdOutLogger.headerWritten:
+            print(Logger.formatRecord(fields, True))
+            StdOutLogger.headerWritten = True
+        print(Logger.formatRecord(fields))
+
+class BufferedLogger(Logger):
+    """Logger that queues messages and records and writes them to file from a background thread.
+
+    Text messages go to a .log file. Records go to the same file in text format, otherwise to a .jsonl or .csv file of
+    their own. With PER_RUN_FILES each run started with openRun() gets its own files.
+    """
+
+    OUT, ERR, RECORD, OPEN_RUN, FLUSH, STOP = range(6)
+
+    queue = None
+    thread = None
+    folder = None
+
+    def __init__(self, *args):
+        super(BufferedLogger, self).__init__()
+
+    @staticmethod
+    def start(folder=None):
+        """Starts the writer thread. Any previous log files in the folder are removed.
+
+        Keyword arguments:
+        folder -- Folder to write log files to, defaults to the logs folder.
+        """
+        if BufferedLogger.thread != None:
+            return
+
+        if folder == None:
+            root = SimUtils.getRootPath()
+            folder = (root + "/" if root != "" else "") + LOG_DIR_NAME
+        SimUtils.initFolderPath(folderPath=folder, overwrite=True)
+
+        BufferedLogger.folder = folder
+        BufferedLogger.queue = Queue()
+        BufferedLogger.thread = Thread(target=BufferedLogger.__write, args=(BufferedLogger.queue, folder))
+        BufferedLogger.thread.daemon = True
+        BufferedLogger.thread.start()
+
+    @staticmethod
+    def stop():
+        """Writes everything queued, closes the log files and stops the writer thread."""
+        if BufferedLogger.thread == None:
+            return
+        BufferedLogger.queue.put((BufferedLogger.STOP, None))
+        BufferedLogger.thread.join()
+        BufferedLogger.thread = None
+        BufferedLogger.queue = None
+
+    @staticmethod
+    def flush():
+        """Blocks until everything queued so far has been written to disk."""
+        if BufferedLogger.thread != None:
+            BufferedLogger.queue.put((BufferedLogger.FLUSH, None))
+            BufferedLogger.queue.join()
+
+    @staticmethod
+    def openRun(run):
+        """Switches to the files of a new run, if per run files are enabled.
+
+        Keyword arguments:
+        run -- Number of the run.
+        """
+        BufferedLogger.__put(BufferedLogger.OPEN_RUN, run)
+
+    @staticmethod
+    def out(str):
+        BufferedLogger.__put(BufferedLogger.OUT, str)
+
+    @staticmethod
+    def err(str):
+        BufferedLogger.__put(BufferedLogger.ERR, str)
+
+    @staticmethod
+    def record(fields):
+        BufferedLogger.__put(BufferedLogger.RECORD, fields)
+
+    @staticmethod
+    def __put(kind, payload):
+        if BufferedLogger.queue == None:
+            BufferedLogger.start()
+        BufferedLogger.queue.put((kind, payload))
+
+    @staticmethod
+    def __write(queue, folder):
+        """Writer thread loop. Formatting is done here so that it costs the simulation thread nothing."""
+        writer = LogFileWriter(folder)
+        while True:
+            kind, payload = queue.get()
+            try:
+                if kind == BufferedLogger.OUT:
+                    writer.writeText(payload)
+                elif kind == BufferedLogger.ERR:
+                    writer.writeText("ERROR: " + payload)
+                elif kind == BufferedLogger.RECORD:
+                    writer.writeRecord(payload)
+                elif kind == BufferedLogger.OPEN_RUN:
+                    if Logger.PER_RUN_FILES:
+                        writer.open(SIM_RUN_FILE_PREFIX + str(payload))
+                elif kind == BufferedLogger.FLUSH:
+                    writer.flush()
+                elif kind == BufferedLogger.STOP:
+                    writer.close()
+                    return
+            finally:
+                queue.task_done()
+
+class LogFileWriter(object):
+    """Owns the open log files of the BufferedLogger. Only used from the writer thread."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.textFile = None
+        self.recordFile = None
+        self.headerWritten = False
+
+    def open(self, name):
+        self.close()
+        self.textFile = open(os.path.join(self.folder, name + TEXT_FILE_EXTENSION), 'a')
+        if Logger.FORMAT != TEXT_FORMAT:
+            self.recordFile = open(os.path.join(self.folder, name + "." + Logger.FORMAT), 'a')
+        else:
+            self.recordFile = self.textFile
+        self.headerWritten = False
+
+    def writeText(self, str):
+        if self.textFile == None:
+            self.open(LOG_FILE_NAME)
+        self.textFile.write(str + "\n")
+
+    def writeRecord(self, fields):
+        if self.recordFile == None:
+            self.open(LOG_FILE_NAME)
+        if Logger.FORMAT == CSV_FORMAT and not self.headerWritten:
+            self.recordFile.write(Logger.formatRecord(fields, True) + "\n")
+            self.headerWritten = True
+        self.recordFile.write(Logger.formatRecord(fields) + "\n")
+
+    def flush(self):
+        if self.textFile != None:
+            self.textFile.flush()
+            self.recordFile.flush()
+
+    def close(self):
+        if self.recordFile != None and self.recordFile != self.textFile:
+            self.recordFile.close()
+        if self.textFile != None:
+            self.textFile.close()
+        self.textFile = self.recordFile = None
@@ -0,0 +1,227 @@
+import json
+import os
+import numpy as np
+
+import Kernels
+import Systems
+import Worldspace
+import SimUtils
+from ArraySystems import EPITHELIAL_STATE_COUNT
+from Cells import EpithelialCell, EpithelialStates
+
+STATE_DIR_NAME = "state/"
+SIM_RUN_DIR_PREFIX = "run"
+LAYOUT_FILE_NAME = "layout.json"
+ARRAY_FILE_EXTENSION = ".dat"
+
+# Cell arrays of the layout, in the order of the arguments of the kernels
+ARRAYS = [("state", np.uint8), ("nextState", np.uint8), ("age", np.int32), ("delay", np.int32),
+          ("timeInfected", np.int32), ("canInfect", np.uint8), ("focusId", np.int32)]
+
+# Most random numbers drawn at once when discarding the unused ones of a step
+DISCARD_BLOCK = 1 << 20
+
+FORMAT_VERSION = 1
+
+class MemmapEpithelialSystem(Systems.EpithelialSystem):
+    """ArrayEpithelialSystem whose cell arrays are memory mapped files, for grids whose state doesn't fit in memory.
+
+    Each array is a raw file of the flat x major layout of the array backend, so that a row of the (GRID_WIDTH,
+    GRID_HEIGHT) grid is one contiguous range of every file, and a layout file describes them. Steps go through the grid
+    in bands of BAND_ROWS rows. The update of a band touches every array of the band, and reads or infects no further
+    than the rows on each side. Synchronising touches the state arrays only. Each band draws the random numbers it can
+    use as it reaches them, and the counters are kept per band to bound them.
+
+    The random numbers are drawn and used in the same order as ArrayEpithelialSystem, so a step of both from the same
+    cells and RandomState gives the same cells. The initial infected cells are chosen differently, as choosing them
+    like the array backend would take a permutation of every site.
+    """
+
+    ENABLED = BAND_ROWS = None
+
+    def __init__(self, folder, rng=None):
+        """Constructor for MemmapEpithelialSystem. Any previous files in the folder are replaced.
+
+        Keyword arguments
+        folder -- Folder to keep the files of the arrays in.
+        rng -- numpy RandomState to draw from, a new unseeded one by default.
+        """
+        Systems.EpithelialSystem.__init__(self, None)
+
+        self.rng = rng if rng != None else np.random.RandomState()
+        self.folder = folder
+        self.size = Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT
+        SimUtils.initFolderPath(folderPath=folder, overwrite=True)
+
+        # The kernels are given plain array views of the mapped files
+        self.maps = {}
+        for name, dtype in ARRAYS:
+            self.maps[name] = np.memmap(os.path.join(folder, name + ARRAY_FILE_EXTENSION), dtype=dtype, mode='w+', shape=(self.size,))
+            setattr(self, name, self.maps[name].view(np.ndarray))
+
+        rows = MemmapEpithelialSystem.BAND_ROWS
+        self.bands = [(x * Worldspace.GRID_HEIGHT, min(x + rows, Worldspace.GRID_WIDTH) * Worldspace.GRID_HEIGHT)
+                      for x in xrange(0, Worldspace.GRID_WIDTH, rows)]
+        self.bandCounts = np.zeros((len(self.bands), EPITHELIAL_STATE_COUNT), dtype=np.int64)
+        self.counts = np.zeros(EPITHELIAL_STATE_COUNT, dtype=np.int64)
+        self.steps = 0
+
+    def initialise(self):
+        """Sets every cell healthy, then infects randomly chosen cells for the initial infected count."""
+
+        initialInfected = int(self.size * self.INFECT_INIT) if int(self.size * self.INFECT_INIT) > 1 else 1
+        self.initialInfected = initialInfected
+
+        for start, stop in self.bands:
+            self.state[start:stop] = EpithelialStates.HEALTHY
+            self.nextState[start:stop] = EpithelialStates.HEALTHY
+            self.canInfect[start:stop] = 1
+            self.focusId[start:stop] = Kernels.NO_FOCUS
+            if MemmapEpithelialSystem.RANDOM_AGE:
+                self.age[start:stop] = self.rng.randint(0, EpithelialCell.CELL_LIFESPAN + 1, stop - start)
+
+        # Sampled by rejection, as a permutation of every site would be as large as the grid
+        sites = set()
+        while len(sites) < initialInfected:
+            sites.update(self.rng.randint(0, self.size, initialInfected - len(sites)).tolist())
+        infected = np.array(sorted(sites), dtype=np.int64)
+        self.state[infected] = EpithelialStates.CONTAINING
+        self.nextState[infected] = EpithelialStates.CONTAINING
+        self.focusId[infected] = np.arange(initialInfected, dtype=np.int32)
+
+        for band, (start, stop) in enumerate(self.bands):
+            bandInfected = np.count_nonzero((infected >= start) & (infected < stop))
+            self.bandCounts[band, EpithelialStates.HEALTHY] = stop - start - bandInfected
+            self.bandCounts[band, EpithelialStates.CONTAINING] = bandInfected
+        self.__updateCounters()
+        self.checkpoint()
+
+    def update(self):
+        """Runs the age, regeneration and infection steps over every cell, band by band."""
+
+        dead = self.counts[EpithelialStates.INFECTION_DEATH] + self.counts[EpithelialStates.NATURAL_DEATH]
+        regenChance = 1.0
+        if dead != 0:
+            regenChance = float(self.counts[EpithelialStates.HEALTHY]) / dead * 1.0 / EpithelialCell.DIVISION_TIME
+        infectChance = float((1 / MemmapEpithelialSystem.MAX_NEIGHBOURS) * (EpithelialCell.INFECT_RATE / Systems.ImmuneSystem.FLOW_RATE))
+
+        # The numbers ArrayEpithelialSystem.update would draw at once. Each band draws what it can use on top of those
+        # left unused by the bands before it, and the rest is drawn and discarded at the end.
+        draws = Kernels.MAX_NEIGHBOURS * min(self.counts[EpithelialStates.INFECTIOUS], self.counts[EpithelialStates.HEALTHY])
+        if MemmapEpithelialSystem.REGEN_ENABLED:
+            draws += dead
+        drawn = 0
+        unused = np.zeros(0)
+
+        for band, (start, stop) in enumerate(self.bands):
+            counts = self.bandCounts[band]
+            bound = Kernels.MAX_NEIGHBOURS * counts[EpithelialStates.INFECTIOUS]
+            if MemmapEpithelialSystem.REGEN_ENABLED:
+                bound += counts[EpithelialStates.INFECTION_DEATH] + counts[EpithelialStates.NATURAL_DEATH]
+            more = min(bound - len(unused), draws - drawn)
+            if more > 0:
+                unused = np.concatenate((unused, self.rng.random_sample(more)))
+                drawn += more
+
+            used = Kernels.epithelialUpdate(self.state, self.nextState, self.age, self.delay, self.timeInfected, self.canInfect, self.focusId,
+                                            Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL), start, stop,
+                                            EpithelialCell.CELL_LIFESPAN, EpithelialCell.INFECT_LIFESPAN, EpithelialCell.EXPRESS_DELAY,
+                                            EpithelialCell.INFECT_DELAY, bool(MemmapEpithelialSystem.REGEN_ENABLED), regenChance,
+                                            infectChance, unused, 0, False)
+            unused = unused[used:]
+
+        while drawn < draws:
+            more = min(draws - drawn, DISCARD_BLOCK)
+            self.rng.random_sample(more)
+            drawn += more
+
+    def synchronise(self):
+        """Sets the state of the epithelial cells for next iteration, band by band. Updates the internal count of cell
+        states."""
+
+        for band, (start, stop) in enumerate(self.bands):
+            Kernels.epithelialSynchronise(self.state, self.nextState, self.bandCounts[band], start, stop)
+        self.steps += 1
+        self.__updateCounters()
+
+    def stateGrid(self):
+        """Gets the current state of every epithelial cell.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) uint8 numpy array, a view of the mapped state file.
+        """
+        return self.state.reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def healthyAgeCounts(self):
+        """Gets the number of healthy epithelial cells of each age, band by band.
+
+        Returns int numpy array indexed by age, of length CELL_LIFESPAN + 1.
+        """
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        counts = np.zeros(lifespan + 1, dtype=np.int64)
+        for start, stop in self.bands:
+            ages = self.age[start:stop][self.state[start:stop] == EpithelialStates.HEALTHY]
+            counts += np.bincount(np.clip(ages, 0, lifespan), minlength=lifespan + 1)
+        return counts
+
+    def checkpoint(self):
+        """Flushes the mapped files and writes the layout file, so that the folder holds the cells as of the last
+        synchronise, to be opened with openLayout()."""
+
+        for name, dtype in ARRAYS:
+            self.maps[name].flush()
+
+        layout = {"version": FORMAT_VERSION, "width": Worldspace.GRID_WIDTH, "height": Worldspace.GRID_HEIGHT,
+                  "toroidal": bool(Worldspace.ISTOROIDAL), "steps": self.steps, "initialInfected": self.initialInfected,
+                  "counts": self.counts.tolist(), "arrays": [[name, np.dtype(dtype).name] for name, dtype in ARRAYS]}
+        with open(os.path.join(self.folder, LAYOUT_FILE_NAME), 'w') as f:
+            json.dump(layout, f)
+
+    def __updateCounters(self):
+        self.counts[:] = self.bandCounts.sum(axis=0)
+        self.healthyCount        = int(self.counts[EpithelialStates.HEALTHY])
+        self.containingCount     = int(self.counts[EpithelialStates.CONTAINING])
+        self.expressingCount     = int(self.counts[EpithelialStates.EXPRESSING])
+        self.infectiousCount     = int(self.counts[EpithelialStates.INFECTIOUS])
+        self.naturalDeathCount   = int(self.counts[EpithelialStates.NATURAL_DEATH])
+        self.infectionDeathCount = int(self.counts[EpithelialStates.INFECTION_DEATH])
+        self.avgFociArea         = float(self.infectionDeathCount) / self.initialInfected
+
+    @staticmethod
+    def forRun(run, rng=None):
+        """Creates a system keeping its files in the folder of a numbered run.
+
+        Keyword arguments:
+        run -- Number of the run.
+        rng -- numpy RandomState to draw from.
+        """
+        root = SimUtils.getRootPath()
+        folder = (root + "/" if root != "" else "") + STATE_DIR_NAME + SIM_RUN_DIR_PREFIX + str(run)
+        return MemmapEpithelialSystem(folder, rng)
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the MemmapEpithelialSystem class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        MemmapEpithelialSystem.ENABLED   = settings["bIsEnabled"]
+        MemmapEpithelialSystem.BAND_ROWS = settings["iBandRows"]
+
+def openLayout(folder, mode='r'):
+    """Maps the cell arrays of a folder written by MemmapEpithelialSystem.checkpoint().
+
+    Keyword arguments:
+    folder -- Folder of the files.
+    mode -- numpy memmap mode, read only by default.
+
+    Returns (layout dict, dict of array name to (width, height) numpy memmap).
+    """
+    with open(os.path.join(folder, LAYOUT_FILE_NAME)) as f:
+        layout = json.load(f)
+
+    shape = (layout["width"], layout["height"])
+    arrays = {}
+    for name, dtype in layout["arrays"]:
+        arrays[name] = np.memmap(os.path.join(folder, name + ARRAY_FILE_EXTENSION), dtype=dtype, mode=mode, shape=shape)
+    return layout, arrays
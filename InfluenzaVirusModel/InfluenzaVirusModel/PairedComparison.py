@@ -0,0 +1,90 @@
+from collections import OrderedDict
+import numpy as np
+
+from Cells import EpithelialStates, ImmuneStates
+from Statistics import RunningStatistics, PEAK_INFECTED, INFECTION_DEATHS
+
+# Config sections holding the model constants that configuration B may override
+SECTIONS = ["ImmuneSystem", "EpithelialSystem", "EpithelialCell", "ImmuneCell"]
+
+# Counter series compared at every timestep, from the RunResults of a run, in output order
+SERIES = OrderedDict([
+    ("infected", lambda results: results.eCounts[:, EpithelialStates.CONTAINING:EpithelialStates.INFECTIOUS + 1].sum(axis=1)),
+    ("healthy",  lambda results: results.eCounts[:, EpithelialStates.HEALTHY]),
+    ("dead",     lambda results: results.eCounts[:, EpithelialStates.INFECTION_DEATH] + results.eCounts[:, EpithelialStates.NATURAL_DEATH]),
+    ("immune",   lambda results: results.immCounts[:, ImmuneStates.VIRGIN] + results.immCounts[:, ImmuneStates.MATURE])])
+
+# Per run outputs compared once per pair
+OUTPUTS = [PEAK_INFECTED, INFECTION_DEATHS]
+
+class PairedComparison(object):
+    """Compares two configurations on common random numbers.
+
+    Configuration A is the one of the config file, configuration B is A with OPTION of SECTION set to VALUE. Each run
+    index is simulated under both, drawing from the same streams, so that most of the noise of the run is shared and
+    cancels out of the difference B - A. The differences are averaged over the pairs, with confidence intervals.
+    """
+
+    ENABLED = SECTION = OPTION = VALUE = CONFIDENCE = None
+
+    def __init__(self):
+        """Constructor for PairedComparison"""
+        self.series = OrderedDict((name, RunningStatistics()) for name in SERIES)
+        self.outputs = OrderedDict((name, RunningStatistics()) for name in OUTPUTS)
+        self.pairs = 0
+
+    def addPair(self, resultsA, resultsB):
+        """Adds the results of a run under both configurations.
+
+        Keyword arguments:
+        resultsA -- RunResults of the run with configuration A.
+        resultsB -- RunResults of the run with configuration B.
+        """
+        self.pairs += 1
+        for name, statistics in self.series.items():
+            statistics.add(SERIES[name](resultsB).astype(float) - SERIES[name](resultsA))
+
+        outputsA = resultsA.outputs()
+        outputsB = resultsB.outputs()
+        for name, statistics in self.outputs.items():
+            statistics.add(float(outputsB[name] - outputsA[name]))
+
+    def differences(self):
+        """Gets the mean difference of each series at every timestep, with the half width of its confidence interval.
+
+        Returns OrderedDict of series name to (mean numpy array, half width numpy array).
+        """
+        differences = OrderedDict()
+        for name, statistics in self.series.items():
+            # A single pair has an infinite half width for every timestep
+            halfWidth = np.broadcast_to(statistics.confidenceHalfWidth(PairedComparison.CONFIDENCE), statistics.mean.shape)
+            differences[name] = (statistics.mean, halfWidth)
+        return differences
+
+    def description(self):
+        """Gets the override making configuration B, as text."""
+        return "%s.%s = %s" % (PairedComparison.SECTION, PairedComparison.OPTION, PairedComparison.VALUE)
+
+    def summary(self):
+        """Gets a line per compared run output with its mean difference and confidence interval.
+
+        Returns list of str.
+        """
+        lines = []
+        for name, statistics in self.outputs.items():
+            halfWidth = statistics.confidenceHalfWidth(PairedComparison.CONFIDENCE)
+            lines.append("%s: %.6g +/- %.6g (%g%% confidence, %d pairs)" % (name, statistics.mean, halfWidth, PairedComparison.CONFIDENCE * 100, statistics.count))
+        return lines
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the PairedComparison class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        PairedComparison.ENABLED    = settings["bIsEnabled"]
+        PairedComparison.SECTION    = settings["sSection"]
+        PairedComparison.OPTION     = settings["sOption"]
+        PairedComparison.VALUE      = settings["sValue"]
+        PairedComparison.CONFIDENCE = settings["fConfidence"]
@@ -0,0 +1,191 @@
+import cProfile
+import json
+from timeit import default_timer as timer
+
+from Logger import StdOutLogger as Log
+import SimUtils
+
+PROFILE_DIR_NAME = "profiles/"
+TRACE_FILE_NAME = "profile_trace.jsonl"
+CPROFILE_FILE_PREFIX = "run"
+CPROFILE_FILE_EXTENSION = ".prof"
+
+class Profiler(object):
+    """Records wall time and call counts for each phase of the simulation step loop.
+
+    Phases are recorded by replacing the profiled methods with timing wrappers in instrumentSimulation(). Nothing is
+    replaced unless profiling is enabled, so a disabled Profiler adds no overhead to the step loop. Times are inclusive,
+    e.g. EpithelialSystem.update includes the time of its private substeps.
+    """
+
+    ENABLED = CPROFILE_ENABLED = None
+
+    phases = {}
+    runs = []
+    instrumented = []
+
+    currentRun = None
+    runStartTime = None
+    cProfile = None
+
+    @staticmethod
+    def isActive():
+        return bool(Profiler.ENABLED or Profiler.CPROFILE_ENABLED)
+
+    @staticmethod
+    def instrument(owner, attrName, phaseName):
+        """Replaces a method with a wrapper that records its time against a phase.
+
+        Keyword arguments:
+        owner -- Class that owns the method.
+        attrName -- Name of the method attribute, including name mangling for private methods.
+        phaseName -- Name of the phase to record the time against.
+        """
+        original = owner.__dict__[attrName]
+        phases = Profiler.phases
+
+        def timed(*args, **kwargs):
+            start = timer()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                entry = phases.get(phaseName)
+                if entry == None:
+                    entry = phases[phaseName] = [0, 0.0]
+                entry[0] += 1
+                entry[1] += timer() - start
+
+        setattr(owner, attrName, timed)
+        Profiler.instrumented.append((owner, attrName, original))
+
+    @staticmethod
+    def instrumentSimulation():
+        """Instruments the update, synchronise and private substeps of each system, plus drawing and graph collection."""
+        import Systems
+        import ArraySystems
+        import BatchSystems
+        from Graph import OverallSimulationDataGraph, FociAreaGraph
+        from SimulationVisualization import SimVis
+
+        if len(Profiler.instrumented) > 0:
+            return
+
+        targets = [(Systems.EpithelialSystem, ["update", "synchronise", "__updateAge", "__updateRegeneration", "__updateInfectionTime",
+                                               "__updateInfectionSeverity", "__updateAttemptInfect"]),
+                   (Systems.ImmuneSystem, ["update", "synchronise", "__updateAge", "__updateMovement", "__updateEncounter",
+                                           "__updateRecruitment", "__updateMaintenance"]),
+                   (Systems.FocusSystem, ["update", "__updatePerimeterCells", "__updateCollisions"]),
+                   (ArraySystems.ArrayEpithelialSystem, ["update", "synchronise"]),
+                   (ArraySystems.ArrayImmuneSystem, ["update", "synchronise", "__updateRecruitment", "__updateMaintenance"]),
+                   (BatchSystems.BatchEpithelialSystem, ["update", "synchronise"]),
+                   (BatchSystems.BatchImmuneSystem, ["update", "synchronise", "__updateRecruitment", "__updateMaintenance"]),
+                   (SimVis, ["drawSimWorld", "drawGrids"]),
+                   (OverallSimulationDataGraph, ["addSimulationData"]),
+                   (FociAreaGraph, ["addAverageFociAreaData"])]
+
+        for owner, methods in targets:
+            for method in methods:
+                attrName = "_" + owner.__name__ + method if method.startswith("__") else method
+                Profiler.instrument(owner, attrName, owner.__name__ + "." + method.lstrip("_"))
+
+    @staticmethod
+    def restore():
+        """Removes all timing wrappers, restoring the original methods."""
+        for owner, attrName, original in reversed(Profiler.instrumented):
+            setattr(owner, attrName, original)
+        del Profiler.instrumented[:]
+
+    @staticmethod
+    def begin():
+        """Prepares the profile output folder and instruments the simulation. Call once before the first run."""
+        SimUtils.initFolder(folderName=PROFILE_DIR_NAME, overwrite=True)
+        del Profiler.runs[:]
+        if Profiler.ENABLED:
+            Profiler.instrumentSimulation()
+
+    @staticmethod
+    def beginRun(run):
+        """Resets the phase counters for a new run, and starts cProfile if enabled.
+
+        Keyword arguments:
+        run -- Number of the run being started.
+        """
+        Profiler.currentRun = run
+        Profiler.phases.clear()
+        Profiler.runStartTime = timer()
+
+        if Profiler.CPROFILE_ENABLED:
+            Profiler.cProfile = cProfile.Profile()
+            Profiler.cProfile.enable()
+
+    @staticmethod
+    def endRun():
+        """Stores the phase counters of the current run, appends them to the trace file and dumps cProfile stats.
+
+        Returns dict record of the run.
+        """
+        wallTime = timer() - Profiler.runStartTime
+
+        if Profiler.cProfile != None:
+            Profiler.cProfile.disable()
+            Profiler.cProfile.dump_stats(Profiler.__getFolder() + CPROFILE_FILE_PREFIX + str(Profiler.currentRun) + CPROFILE_FILE_EXTENSION)
+            Profiler.cProfile = None
+
+        record = {"run": Profiler.currentRun, "wallTime": wallTime, "phases": {}}
+        for name, (calls, totalTime) in Profiler.phases.items():
+            record["phases"][name] = {"calls": calls, "totalTime": totalTime}
+        Profiler.runs.append(record)
+
+        if Profiler.ENABLED:
+            with open(Profiler.__getFolder() + TRACE_FILE_NAME, 'a') as f:
+                f.write(json.dumps(record, sort_keys=True) + "\n")
+            Profiler.printSummary([record], "Run %s profile" % Profiler.currentRun)
+
+        return record
+
+    @staticmethod
+    def end():
+        """Prints the phase summary aggregated over all runs and removes the timing wrappers."""
+        if Profiler.ENABLED and len(Profiler.runs) > 1:
+            Profiler.printSummary(Profiler.runs, "Profile of %d runs" % len(Profiler.runs))
+        Profiler.restore()
+
+    @staticmethod
+    def printSummary(records, title):
+        """Outputs a table of calls, total and mean time per phase, summed over the given run records.
+
+        Keyword arguments:
+        records -- list of dict run records, as returned by endRun().
+        title -- Title line of the table.
+        """
+        wallTime = 0.0
+        totals = {}
+        for record in records:
+            wallTime += record["wallTime"]
+            for name, phase in record["phases"].items():
+                total = totals.setdefault(name, [0, 0.0])
+                total[0] += phase["calls"]
+                total[1] += phase["totalTime"]
+
+        lines = [title + " (wall time %.3fs)" % wallTime,
+                 "%-45s %10s %12s %12s %7s" % ("Phase", "Calls", "Total (s)", "Mean (ms)", "% Run")]
+        for name in sorted(totals.keys(), key=lambda n: -totals[n][1]):
+            calls, totalTime = totals[name]
+            lines.append("%-45s %10d %12.4f %12.5f %6.1f%%" % (name, calls, totalTime, 1000.0 * totalTime / calls,
+                                                               100.0 * totalTime / wallTime if wallTime > 0 else 0.0))
+        Log.out("\n".join(lines) + "\n")
+
+    @staticmethod
+    def __getFolder():
+        root = SimUtils.getRootPath()
+        return (root + "/" if root != "" else "") + PROFILE_DIR_NAME
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the Profiler class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        Profiler.ENABLED          = settings["bIsEnabled"]
+        Profiler.CPROFILE_ENABLED = settings["bCProfileEnabled"]
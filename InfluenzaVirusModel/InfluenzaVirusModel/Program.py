@@ -1,16 +1,34 @@
 import Systems
+import Kernels
 import random
 import time
 import thread
 import Config
-from Graph import Graph, OverallSimulationDataGraph, SimulationData, FociAreaGraph
-from SimulationVisualization import SimVis
+from Graph import Graph, OverallSimulationDataGraph, SimulationData, FociAreaGraph, GraphRenderer
+from SimulationVisualization import SimVis, overviewLayout
+from LiveView import LiveView
 from Worldspace import Worldsite, Vector2d
 import Worldspace
 import Cells
 import thread
 import Config
+import multiprocessing
+import traceback
+from collections import OrderedDict
+from Logger import Logger, StdOutLogger, BufferedLogger, TEXT_FORMAT
 from Logger import StdOutLogger as Log
+from Profiler import Profiler
+from Recorder import StateRecorder
+from FastForward import FastForward
+from Statistics import AdaptiveRuns, FOCI_AREA
+from BatchSystems import BatchEpithelialSystem, BatchImmuneSystem
+from Results import RunResults
+from RandomStreams import RandomStreams
+from ResultCache import ResultCache, OBJECT_ENGINE, ARRAY_ENGINE, COMMON_RANDOM_ENGINE, SPARSE_ENGINE, OUT_OF_CORE_ENGINE, HYBRID_ENGINE
+from PairedComparison import PairedComparison
+from SharedResults import SharedResults
+from Summary import RunSummary, SummaryWriter
+from JobBroker import JobBroker
  
 from threading import Thread  # threading is better than the thread module
 from Queue import Queue
@@ -19,6 +37,11 @@ q = Queue()  # use a queue to pass messages from the worker thread to the main t
 running = [True]
 RNG = random
 
+# Labels of the per timestep debug text, in output order
+TIMESTEP_TEXT_LABELS = [("infected", "Infected cells"), ("healthy", "Healthy"), ("containing", "Containing"), ("expressing", "Expressing"),
+                        ("infectious", "Infectious"), ("dead", "Dead"), ("virgin", "Virgin"), ("mature", "Mature"),
+                        ("avgFociAreaMM2", "Average focus area (mm2)")]
+
 class MainProgram:     
 
     # TODO: Figure out a better way of passing settings. Cleanup this method.
@@ -27,16 +50,20 @@ class MainProgram:
 
         self.avgFociAreaMM2 = None
 
+        self.data = SimulationData()
+        self.graph = self.fociAreaGraph = None
         if Graph.SHOW:
-            data = SimulationData()
-            graph = OverallSimulationDataGraph()
-            graph.setXMeasurement('hours') 
-            graph.setTimestepsInXMeasurement(6)
+            self.graph = OverallSimulationDataGraph()
+            self.graph.setXMeasurement('hours') 
+            self.graph.setTimestepsInXMeasurement(6)
             
-            fociAreaGraph = FociAreaGraph()
-            #fociAreaGraph = FociAreaGraph(True, Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
-            fociAreaGraph.setXMeasurement('hours') 
-            fociAreaGraph.setTimestepsInXMeasurement(6)
+            self.fociAreaGraph = FociAreaGraph()
+            #self.fociAreaGraph = FociAreaGraph(True, Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+            self.fociAreaGraph.setXMeasurement('hours') 
+            self.fociAreaGraph.setTimestepsInXMeasurement(6)
+
+        # Headless graphs are saved by a process started before the runs allocate anything, rather than shown by the main thread
+        self.graphRenderer = GraphRenderer() if Graph.SHOW and Graph.HEADLESS else None
 
         if SimVis.ENABLED:
             q.put((simVis.display, (), {}))
@@ -45,15 +72,240 @@ class MainProgram:
         self.runTime = settings["iRunTime"]
         self.debugTextEnabled = settings["bDebugTextEnabled"]
 
+        self.log = BufferedLogger if Logger.BUFFERED else StdOutLogger
+        if Logger.BUFFERED:
+            BufferedLogger.start()
+
+        # Paired comparison needs each subsystem drawing from its own stream, which only the array backend does
+        self.pairedComparison = None
+        if PairedComparison.ENABLED:
+            self.pairedComparison = PairedComparison()
+            if not Kernels.ENABLED:
+                self.log.out("Paired comparison runs on the array backend")
+            if BatchEpithelialSystem.ENABLED:
+                self.log.err("The batch engine is not used by paired comparison")
+            if AdaptiveRuns.ENABLED:
+                self.log.err("AdaptiveRuns is not supported by paired comparison, doing iNumberOfRuns pairs")
+            if SharedResults.ENABLED:
+                self.log.err("Paired comparison runs in this process only")
+
+        # Distributed runs are simulated by the worker daemons of a job broker, so nothing can be drawn or recorded either
+        self.distributed = JobBroker.ENABLED and self.pairedComparison == None and not BatchEpithelialSystem.ENABLED
+        if self.distributed:
+            if SimVis.ENABLED:
+                self.log.err("SimulationVisualisation is not supported by distributed runs, no frames will be drawn")
+            if StateRecorder.ENABLED:
+                self.log.err("Recorder is not supported by distributed runs, no states will be recorded")
+                StateRecorder.ENABLED = False
+            if SharedResults.ENABLED:
+                self.log.err("Distributed runs are done by the workers of the broker, not by parallel processes")
+        elif JobBroker.ENABLED and BatchEpithelialSystem.ENABLED:
+            self.log.err("The batch engine runs in this process only")
+
+        # Parallel runs are simulated by worker processes, so nothing can be drawn or recorded
+        self.parallel = SharedResults.ENABLED and self.pairedComparison == None and not BatchEpithelialSystem.ENABLED and not self.distributed
+        if self.parallel:
+            if SimVis.ENABLED:
+                self.log.err("SimulationVisualisation is not supported by parallel runs, no frames will be drawn")
+            if StateRecorder.ENABLED:
+                self.log.err("Recorder is not supported by parallel runs, no states will be recorded")
+                StateRecorder.ENABLED = False
+        elif SharedResults.ENABLED and BatchEpithelialSystem.ENABLED:
+            self.log.err("The batch engine runs in this process only")
+
+        # The sparse lattice steps with the array backend kernels, over the chunks infection has reached
+        import SparseSystems # Systems imports this module, so SparseSystems can't be imported at the top
+        sparseLattice = SparseSystems.SparseEpithelialSystem.ENABLED
+        if sparseLattice and self.pairedComparison != None:
+            self.log.err("The sparse lattice is not used by paired comparison")
+            sparseLattice = False
+        elif sparseLattice and BatchEpithelialSystem.ENABLED:
+            self.log.err("The sparse lattice is not used by the batch engine")
+
+        # Out of core, the cells of the array backend are kept in files mapped into memory
+        import MemmapSystems
+        outOfCore = MemmapSystems.MemmapEpithelialSystem.ENABLED
+        if outOfCore and self.pairedComparison != None:
+            self.log.err("Out of core state is not used by paired comparison")
+            outOfCore = False
+        elif outOfCore and BatchEpithelialSystem.ENABLED:
+            self.log.err("Out of core state is not used by the batch engine")
+        elif outOfCore and sparseLattice:
+            self.log.err("Out of core state is not used by the sparse lattice, which only keeps the chunks infection has reached")
+            outOfCore = MemmapSystems.MemmapEpithelialSystem.ENABLED = False
+
+        self.arrayBackend = Kernels.ENABLED or self.pairedComparison != None or sparseLattice or outOfCore
+        self.engine = OBJECT_ENGINE
+        if sparseLattice and SparseSystems.HybridEpithelialSystem.ENABLED:
+            self.engine = "%s%d_%d" % (HYBRID_ENGINE, SparseSystems.SparseEpithelialSystem.CHUNK_SIZE, SparseSystems.HybridEpithelialSystem.FRONT_DISTANCE)
+        elif sparseLattice:
+            self.engine = "%s%d" % (SPARSE_ENGINE, SparseSystems.SparseEpithelialSystem.CHUNK_SIZE)
+        elif outOfCore:
+            self.engine = OUT_OF_CORE_ENGINE
+        elif self.arrayBackend:
+            self.engine = ARRAY_ENGINE
+        if self.arrayBackend:
+            if Systems.FocusSystem.ENABLED:
+                self.log.err("FocusSystem requires the object backend, disabling it")
+                Systems.FocusSystem.ENABLED = False
+            if not Kernels.NUMBA_AVAILABLE:
+                self.log.err("Numba is not installed, the array backend kernels will run as plain Python")
+
+        if BatchEpithelialSystem.ENABLED and self.pairedComparison == None:
+            if Systems.FocusSystem.ENABLED:
+                self.log.err("FocusSystem is not supported by the batch engine, disabling it")
+                Systems.FocusSystem.ENABLED = False
+            if SimVis.ENABLED:
+                self.log.err("SimulationVisualisation is not supported by the batch engine, no frames will be drawn")
+            if StateRecorder.ENABLED:
+                self.log.err("Recorder is not supported by the batch engine, no states will be recorded")
+                StateRecorder.ENABLED = False
+
+        # With adaptive runs, runs continue up to the maximum until the outputs' confidence intervals are narrow enough
+        self.adaptiveRuns = None
+        if AdaptiveRuns.ENABLED and self.pairedComparison == None:
+            outputs = list(AdaptiveRuns.OUTPUTS)
+            if FOCI_AREA in outputs and not Systems.FocusSystem.ENABLED:
+                self.log.err("The fociArea output requires FocusSystem, not tracking it")
+                outputs.remove(FOCI_AREA)
+            self.adaptiveRuns = AdaptiveRuns(outputs)
+            self.numberOfRuns = AdaptiveRuns.MAX_RUNS
+
+        # Only seeded runs can be repeated, and cached runs have no states to draw or record
+        self.resultCache = None
+        if ResultCache.ENABLED:
+            if not RandomStreams.isSeeded():
+                self.log.err("The result cache requires a seed, not caching results")
+            elif SimVis.ENABLED or StateRecorder.ENABLED:
+                self.log.err("The result cache can't be used with SimulationVisualisation or Recorder, not caching results")
+            else:
+                self.resultCache = ResultCache()
+
+        # Absorbed runs are only fast forwarded when nothing needs their states
+        self.fastForward = (not SimVis.ENABLED and not StateRecorder.ENABLED) or self.parallel or self.distributed
+
+        # A summary record of each output run, without needing the graphs or the log
+        self.summaryWriter = SummaryWriter() if RunSummary.ENABLED else None
+        self.summary = None
+
+        if Profiler.isActive():
+            Profiler.begin()
+
         #initialise runs
         run = 0
+        if self.pairedComparison != None:
+            run = self.__runPairs()
+        elif BatchEpithelialSystem.ENABLED:
+            run = self.__runBatches()
+        elif self.distributed:
+            run = self.__runDistributed()
+        elif self.parallel:
+            run = self.__runParallel(settings)
+
         while run < self.numberOfRuns:
 
+            if Logger.BUFFERED:
+                BufferedLogger.openRun(run + 1)
+
             if self.debugTextEnabled:
                 startTime = time.clock()
-                Log.out("Start time: %s" % startTime)
-            
-            #re-initialize world and systems if not on the initial run
+                self.log.out("Start time: %s" % startTime)
+
+            if Profiler.isActive():
+                Profiler.beginRun(run + 1)
+
+            results = None
+            if self.resultCache != None:
+                key = ResultCache.runKey(self.engine, RandomStreams.SEED, run, self.runTime)
+                results = self.resultCache.load(key)
+
+            if results != None:
+                self.__outputResults(run, results)
+            else:
+                results = self.__simulateRun(run)
+                if self.resultCache != None:
+                    self.resultCache.store(key, results)
+
+            if Profiler.isActive():
+                Profiler.endRun()
+
+            if self.debugTextEnabled:
+                endTime = time.clock()
+                self.log.out("End time: %s" % endTime)
+                self.log.out("Elapsed time: %s" % (endTime - startTime))
+
+            #increment run
+            run += 1
+
+            if self.adaptiveRuns != None:
+                self.adaptiveRuns.addRun(results.outputs())
+                if self.adaptiveRuns.isConverged():
+                    break
+
+        if self.adaptiveRuns != None:
+            self.log.out("\n".join(["Runs done: %d" % self.adaptiveRuns.runs] + self.adaptiveRuns.summary()))
+
+        if self.resultCache != None:
+            self.log.out("Result cache: %d runs loaded, %d runs simulated" % (self.resultCache.hits, self.resultCache.misses))
+
+        if self.summaryWriter != None:
+            self.summaryWriter.close()
+
+        if Profiler.isActive():
+            Profiler.end()
+
+        if Logger.BUFFERED:
+            BufferedLogger.stop()
+
+        # All runs finished: display results graph
+        if Graph.SHOW and self.graphRenderer != None:
+            if(Systems.FocusSystem.ENABLED):
+                self.graphRenderer.render(self.fociAreaGraph, True)
+            self.graphRenderer.render(self.graph, True)
+            self.graphRenderer.close()
+        elif Graph.SHOW:
+            if(Systems.FocusSystem.ENABLED):
+                q.put((self.fociAreaGraph.showGraph, ([True]), {}))
+            q.put((self.graph.showGraph, ([True]), {}))
+        q.put((stopMainLoop, (), {}))
+
+    def __simulateRun(self, run, streams=None, output=True, results=None):
+        """Simulates a run with the object or array backend, outputting each timestep as it is done.
+
+        Keyword arguments:
+        run -- Index of the run.
+        streams -- (epithelial, immune) numpy RandomStates for the array backend to draw fixed rolls from, see
+                   PairedComparison. By default the run draws from the streams of RandomStreams.forRun().
+        output -- Whether the run is graphed, logged, drawn and recorded.
+        results -- RunResults to record the run into, such as the rows of SharedResults. New ones by default.
+
+        Returns RunResults.
+        """
+        #re-initialize world and systems if not on the initial run
+        if streams != None:
+            import ArraySystems # Systems imports this module, so ArraySystems can't be imported at the top
+            world = None
+            eSys = ArraySystems.ArrayEpithelialSystem(streams[0], fixedRolls=True)
+            immSys = ArraySystems.ArrayImmuneSystem(eSys, streams[1])
+        elif self.arrayBackend:
+            import ArraySystems
+            import SparseSystems
+            import MemmapSystems
+            world = None
+            if SparseSystems.SparseEpithelialSystem.ENABLED and SparseSystems.HybridEpithelialSystem.ENABLED:
+                eSys = SparseSystems.HybridEpithelialSystem(RandomStreams.forRun(run))
+                immSys = SparseSystems.SparseImmuneSystem(eSys)
+            elif SparseSystems.SparseEpithelialSystem.ENABLED:
+                eSys = SparseSystems.SparseEpithelialSystem(RandomStreams.forRun(run))
+                immSys = SparseSystems.SparseImmuneSystem(eSys)
+            elif MemmapSystems.MemmapEpithelialSystem.ENABLED:
+                eSys = MemmapSystems.MemmapEpithelialSystem.forRun(run + 1, RandomStreams.forRun(run))
+                immSys = ArraySystems.ArrayImmuneSystem(eSys)
+            else:
+                eSys = ArraySystems.ArrayEpithelialSystem(RandomStreams.forRun(run))
+                immSys = ArraySystems.ArrayImmuneSystem(eSys)
+        else:
+            RandomStreams.forRun(run)
             world = []
             for x in xrange(Worldspace.GRID_WIDTH):
                 world.append([])
@@ -63,122 +315,628 @@ class MainProgram:
             eSys = Systems.EpithelialSystem(world)
             immSys = Systems.ImmuneSystem(world)
 
-            eSys.initialise()
+        eSys.initialise()
+        if(Systems.ImmuneSystem.ISENABLED):
+            immSys.initialise()
+
+        if results == None:
+            results = RunResults(self.runTime, immSys.INIT_CELLS)
+        results.initCells = immSys.INIT_CELLS
+        if output:
+            self.__initRunOutput(run, results)
+
+        draw = SimVis.ENABLED and output
+        record = StateRecorder.ENABLED and output
+        
+        if draw:
+            simVis.init(world, run + 1)
+
+        if record:
+            recorder = StateRecorder.forRun(run + 1, Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+        # Run simulation for a given number of timesteps
+        # 10 days = 1440 timesteps
+        timesteps = 0
+        while timesteps <= self.runTime:
+            eSys.update()
             if(Systems.ImmuneSystem.ISENABLED):
-                immSys.initialise()
-            
-            if Graph.SHOW:
-                graph.setTotalEpithelialCells(Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
-                graph.setBaseImmuneCells(immSys.INIT_CELLS)
+                immSys.update()
 
-                graph.initRun()
-                fociAreaGraph.initRun()
-            
-            if SimVis.ENABLED:
-                simVis.init(world, run + 1)
-
-            # Run simulation for a given number of timesteps
-            # 10 days = 1440 timesteps
-            timesteps = 0
-            while timesteps <= self.runTime:
-                eSys.update()
-                if(Systems.ImmuneSystem.ISENABLED):
-                    immSys.update()
-
-                eSys.synchronise()
-                if(Systems.ImmuneSystem.ISENABLED):
-                    immSys.synchronise()
-
-                if Graph.SHOW:
-                    data.time             = timesteps
-                    data.eCellsHealthy    = eSys.healthyCount
-                    data.eCellsContaining = eSys.containingCount
-                    data.eCellsExpressing = eSys.expressingCount
-                    data.eCellsInfectious = eSys.infectiousCount
-                    data.eCellsDead       = eSys.naturalDeathCount + eSys.infectionDeathCount
-                    data.immCellsTotal    = immSys.virginCount + immSys.matureCount
-
-                    graph.addSimulationData(data)
-
-                    if(Systems.FocusSystem.ENABLED):
-                        area = 0.0
-                        c = 0
-                        for foci in eSys.fSys.foci.values() :
-                            if foci.isEnabled :
-                                if foci.cellCount != 0 :
-                                    area += foci.cellCount
-                                    c += 1
-                        if c == 0 :
-                            area = 0
-                        else :
-                            area = area / c
-                        self.avgFociAreaMM2 = fociAreaGraph.addAverageFociAreaData(area, timesteps)
-
-
-                if self.debugTextEnabled:
-                    Log.out('%d: %d' %(run + 1, timesteps))
-                    Log.out("Infected cells: %s" % (eSys.containingCount + eSys.expressingCount + eSys.infectiousCount))
-                    Log.out("Healthy: %s" % (eSys.healthyCount))
-                    Log.out("Containing: %s" % (eSys.containingCount))
-                    Log.out("Expressing: %s" % (eSys.expressingCount))
-                    Log.out("Infectious: %s" % (eSys.infectiousCount))
-                    Log.out("Dead: %s" % (eSys.naturalDeathCount + eSys.infectionDeathCount))
-                    Log.out("Virgin: %s" % (immSys.virginCount))
-                    Log.out("Mature: %s" % (immSys.matureCount))
-                    if Systems.FocusSystem.ENABLED and self.avgFociAreaMM2 != None :
-                    #Log.out("Average focus area: %s" % (eSys.avgFociArea))
-                        Log.out("Average focus area (mm2): %s" % (self.avgFociAreaMM2))
-                    Log.out("\n")
-
-                if SimVis.ENABLED:
-                    if timesteps == 0 or timesteps % 72 == 0 :
-                        simVis.drawSimWorld(True, timesteps)
-                    else :
-                        simVis.drawSimWorld(False, timesteps)
-
-                    if Systems.FocusSystem.ENABLED:     
-                        if len(eSys.fSys.mergeDetected) > 0:
-                            for i in xrange(len(eSys.fSys.mergeDetected) - 1, -1, -1):
-                                if SimVis.HIGHLIGHT_COLLISIONS:
-                                    focus = eSys.fSys.mergeDetected[i]
-                                    for perimeterCell in focus.perimeter:
-                                        simVis.drawCollision(perimeterCell)
-
-                                del eSys.fSys.mergeDetected[i]
-                    
-                            # HACK: For debugging/testing purposes. Will be removed/refactored soon.
-                            if SimVis.HIGHLIGHT_COLLISIONS and SimVis.ENABLED:
-                                simVis._SimVis__savePILImageToFile(False)
-                                simVis._SimVis__updateCanvas(False)
-                                #if Systems.FocusSystem.DEBUG_TEXT_ENABLED:
-                                    #raw_input()
-
-                timesteps += 1
+            eSys.synchronise()
+            if(Systems.ImmuneSystem.ISENABLED):
+                immSys.synchronise()
+
+            results.record(timesteps, eSys, immSys, eSys.fSys.averageFociArea() if Systems.FocusSystem.ENABLED else 0.0)
+
+            if record and recorder.shouldRecord(timesteps):
+                recorder.record(timesteps, eSys.stateGrid(), immSys.occupancyGrid())
+
+            if output:
+                self.__outputRun(run, results, timesteps, timesteps + 1)
+
+            # Overviews and viewer processes are drawn from the grids of either backend
+            if draw and (self.arrayBackend or SimVis.OVERVIEW_ENABLED or SimVis.SEPARATE_PROCESS):
+                save = timesteps == 0 or timesteps % 72 == 0
+                if not SimVis.SEPARATE_PROCESS or simVis.wantsFrame(save):
+                    simVis.drawGrids(eSys.stateGrid(), immSys.occupancyGrid(Cells.ImmuneStates.VIRGIN), immSys.occupancyGrid(Cells.ImmuneStates.MATURE),
+                                     save, timesteps)
+
+            elif draw:
+                # Only sites that changed this step need redrawing after the first frame
+                changed = None
+                if timesteps > 0 :
+                    changed = eSys.changedCells + list(immSys.changedSites)
+
+                if timesteps == 0 or timesteps % 72 == 0 :
+                    simVis.drawSimWorld(True, timesteps, changed)
+                else :
+                    simVis.drawSimWorld(False, timesteps, changed)
+
+                if Systems.FocusSystem.ENABLED:     
+                    if len(eSys.fSys.mergeDetected) > 0:
+                        for i in xrange(len(eSys.fSys.mergeDetected) - 1, -1, -1):
+                            if SimVis.HIGHLIGHT_COLLISIONS:
+                                focus = eSys.fSys.mergeDetected[i]
+                                for perimeterCell in focus.perimeter:
+                                    simVis.drawCollision(perimeterCell)
+
+                            del eSys.fSys.mergeDetected[i]
+                
+                        # HACK: For debugging/testing purposes. Will be removed/refactored soon.
+                        if SimVis.HIGHLIGHT_COLLISIONS and SimVis.ENABLED:
+                            simVis._SimVis__savePILImageToFile(False)
+                            simVis._SimVis__updateCanvas(False)
+                            #if Systems.FocusSystem.DEBUG_TEXT_ENABLED:
+                                #raw_input()
+
+            timesteps += 1
+
+            # Once absorbed, the rest of the run follows from the cell ages and is filled in without stepping.
+            # Foci no longer change either, so the last average area holds.
+            if self.fastForward and timesteps <= self.runTime and FastForward.isAbsorbed(eSys.containingCount + eSys.expressingCount + eSys.infectiousCount):
+                results.eCounts[timesteps:], results.immCounts[timesteps:] = FastForward.projectSystems(eSys, immSys, self.runTime - timesteps + 1)
+                results.fociAreas[timesteps:] = results.fociAreas[timesteps - 1]
+                if output:
+                    self.__outputRun(run, results, timesteps, self.runTime + 1)
+                timesteps = self.runTime + 1
+
+        if record:
+            recorder.close()
+
+        if hasattr(eSys, "checkpoint"):
+            eSys.checkpoint()
+
+        if output:
+            self.__finishRunOutput()
+
+        if(Systems.FocusSystem.ENABLED):
+            if self.debugTextEnabled :
+                out = "remaining usable foci: "
+                c = 0
+                for focus in eSys.fSys.foci.values() :
+                    if focus.isEnabled and focus.cellCount > 0:
+                        c += 1
+                        out += str(focus.id) + ", "
+                self.log.out(out + " count = " + str(c) +"\n")
+
+        return results
+
+    def __runPairs(self):
+        """Does every run twice, with configuration A from the config file then with configuration B overriding one of its
+        options, see PairedComparison. Both runs of a pair draw fixed rolls from the same subsystem streams. Only the runs
+        of A are output run by run, the differences between the pairs are logged once every pair is done.
+
+        Returns the number of runs done.
+        """
+        config = Config.ConfigReader()
+        override = [(PairedComparison.SECTION, PairedComparison.OPTION, PairedComparison.VALUE)]
+
+        # Unseeded pairs still need a seed to share, logged so that the comparison can be repeated
+        seed = RandomStreams.SEED
+        if not RandomStreams.isSeeded():
+            seed = random.SystemRandom().randint(0, 4294967295)
+            self.log.out("Paired comparison seed: %d" % seed)
+
+        for run in xrange(self.numberOfRuns):
+            if Logger.BUFFERED:
+                BufferedLogger.openRun(run + 1)
+
+            if self.debugTextEnabled:
+                startTime = time.clock()
+                self.log.out("Start time: %s" % startTime)
+
+            if Profiler.isActive():
+                Profiler.beginRun(run + 1)
+
+            resultsA = self.__pairedRun(run, seed, True)
+            config.SetConfiguration(override, [PairedComparison.SECTION])
+            resultsB = self.__pairedRun(run, seed, False)
+            config.SetConfiguration(sections=[PairedComparison.SECTION])
+            self.pairedComparison.addPair(resultsA, resultsB)
+
+            if Profiler.isActive():
+                Profiler.endRun()
 
-            if(Systems.FocusSystem.ENABLED):
-                if self.debugTextEnabled :
-                    out = "remaining usable foci: "
-                    c = 0
-                    for focus in eSys.fSys.foci.values() :
-                        if focus.isEnabled and focus.cellCount > 0:
-                            c += 1
-                            out += str(focus.id) + ", "
-                    Log.out(out + " count = " + str(c) +"\n")
-            
             if self.debugTextEnabled:
                 endTime = time.clock()
-                Log.out("End time: %s" % endTime)
-                Log.out("Elapsed time: %s" % (endTime - startTime))
+                self.log.out("End time: %s" % endTime)
+                self.log.out("Elapsed time: %s" % (endTime - startTime))
 
-            #increment run
-            run += 1
+        self.__logPairedDifferences()
+        return self.numberOfRuns
+
+    def __pairedRun(self, run, seed, output):
+        """Loads or simulates one run of a pair with the current configuration.
+
+        Keyword arguments:
+        run -- Index of the run.
+        seed -- Seed shared by both runs of the pair.
+        output -- Whether the run is graphed, logged, drawn and recorded.
+
+        Returns RunResults.
+        """
+        key = None
+        if self.resultCache != None:
+            key = ResultCache.runKey(COMMON_RANDOM_ENGINE, seed, run, self.runTime)
+            results = self.resultCache.load(key)
+            if results != None:
+                if output:
+                    self.__outputResults(run, results)
+                return results
+
+        results = self.__simulateRun(run, RandomStreams.forSubsystems(seed, run), output)
+        if key != None:
+            self.resultCache.store(key, results)
+        return results
+
+    def __logPairedDifferences(self):
+        """Outputs the paired differences, B - A, of the run outputs and of the counters at every sampled timestep."""
+
+        self.log.out("\n".join(["Paired comparison of %s over %d pairs, B - A:" % (self.pairedComparison.description(), self.pairedComparison.pairs)] +
+                               self.pairedComparison.summary()))
+
+        differences = self.pairedComparison.differences()
+        for timesteps in xrange(0, self.runTime + 1, Logger.SAMPLE_EVERY):
+            fields = OrderedDict()
+            fields["time"] = timesteps
+            for name, (mean, halfWidth) in differences.items():
+                fields[name + "Difference"] = float(mean[timesteps])
+                fields[name + "HalfWidth"] = float(halfWidth[timesteps])
+
+            if Logger.FORMAT == TEXT_FORMAT:
+                self.log.out("%d: " % timesteps + ", ".join("%s %.6g +/- %.6g" % (name, fields[name + "Difference"], fields[name + "HalfWidth"])
+                                                            for name in differences.keys()))
+            else:
+                self.log.record(fields)
+
+    def __runParallel(self, settings):
+        """Does the runs in worker processes, which record the counters of each run into shared memory and only send
+        back the index of the run once it is done. Runs are output in order as they become available.
+
+        Keyword arguments:
+        settings -- Settings of the program, passed on to the workers.
+
+        Returns the number of runs done.
+        """
+        workers = SharedResults.WORKERS if SharedResults.WORKERS > 0 else multiprocessing.cpu_count()
+        sharedResults = SharedResults(self.numberOfRuns, self.runTime)
+        jobs = multiprocessing.Queue()
+        done = multiprocessing.Queue()
+
+        processes = []
+        for i in xrange(workers):
+            process = multiprocessing.Process(target=runWorker, args=(settings, self.arrayBackend, Systems.FocusSystem.ENABLED,
+                                                                      sharedResults, jobs, done))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+
+        # Each worker has a run in hand, or the next runs are ready to output
+        ready = {}
+        keys = {}
+        pending = 0
+        nextRun = 0
+        run = 0
+        converged = False
+        try:
+            while run < self.numberOfRuns and not converged:
+                while nextRun < self.numberOfRuns and pending + len(ready) < workers:
+                    results = None
+                    if self.resultCache != None:
+                        keys[nextRun] = ResultCache.runKey(self.engine, RandomStreams.SEED, nextRun, self.runTime)
+                        results = self.resultCache.load(keys[nextRun])
+                    if results != None:
+                        ready[nextRun] = results
+                    else:
+                        jobs.put(nextRun)
+                        pending += 1
+                    nextRun += 1
+
+                if not run in ready:
+                    n, initCells, error = done.get()
+                    pending -= 1
+                    if error != None:
+                        raise RuntimeError("Run %d failed in a worker process:\n%s" % (n + 1, error))
+                    ready[n] = sharedResults.runResults(n, initCells)
+                    if self.resultCache != None:
+                        self.resultCache.store(keys[n], ready[n])
+                    continue
+
+                if Logger.BUFFERED:
+                    BufferedLogger.openRun(run + 1)
+
+                results = ready.pop(run)
+                self.__outputResults(run, results)
+                run += 1
+
+                if self.adaptiveRuns != None:
+                    self.adaptiveRuns.addRun(results.outputs())
+                    converged = self.adaptiveRuns.isConverged()
+        finally:
+            for process in processes:
+                jobs.put(None)
+            # Workers only exit once everything they put on done has been read
+            for i in xrange(pending):
+                done.get()
+            for process in processes:
+                process.join()
+
+        if converged:
+            # Keeps the run loop from carrying on after the parallel runs
+            self.numberOfRuns = run
+        return run
+
+    def work(self, settings, arrayBackend, sharedResults, jobs, done):
+        """Simulates the runs taken from jobs in a worker process of parallel runs, until a None job.
+
+        Keyword arguments:
+        settings -- Settings of the program.
+        arrayBackend -- Whether to simulate with the array backend.
+        sharedResults -- SharedResults to record the runs into.
+        jobs -- Queue of the indexes of the runs to do.
+        done -- Queue to put (run, base immune cells, error text or None) on when each run is done.
+        """
+        self.runTime = settings["iRunTime"]
+        self.debugTextEnabled = False
+        self.log = StdOutLogger
+        self.arrayBackend = arrayBackend
+        self.fastForward = True
+
+        run = jobs.get()
+        while run != None:
+            results = sharedResults.runResults(run)
+            try:
+                self.__simulateRun(run, output=False, results=results)
+                done.put((run, results.initCells, None))
+            except Exception:
+                done.put((run, 0, traceback.format_exc()))
+            run = jobs.get()
+
+    def __runDistributed(self):
+        """Does the runs as jobs of a job broker, for worker daemons to take. Every job has the options of the
+        config.ini file, so the workers need no copy of it. Runs are output in order as they become available.
+
+        Returns the number of runs done.
+        """
+        broker = JobBroker()
+        self.log.out("Waiting for workers on %s:%d" % broker.address)
+
+        options = Config.ConfigReader().readOptions()
+        ready = {}
+        keys = {}
+        jobs = {}
+        for n in xrange(self.numberOfRuns):
+            results = None
+            if self.resultCache != None:
+                keys[n] = ResultCache.runKey(self.engine, RandomStreams.SEED, n, self.runTime)
+                results = self.resultCache.load(keys[n])
+            if results != None:
+                ready[n] = results
+            else:
+                jobs[broker.submit((options, RandomStreams.SEED, n))] = n
+
+        run = 0
+        converged = False
+        try:
+            while run < self.numberOfRuns and not converged:
+                if not run in ready:
+                    job, results, error = broker.nextResult()
+                    n = jobs[job]
+                    if error != None:
+                        raise RuntimeError("Run %d failed in a worker:\n%s" % (n + 1, error))
+                    ready[n] = results
+                    if self.resultCache != None:
+                        self.resultCache.store(keys[n], results)
+                    continue
+
+                if Logger.BUFFERED:
+                    BufferedLogger.openRun(run + 1)
+
+                results = ready.pop(run)
+                self.__outputResults(run, results)
+                run += 1
+
+                if self.adaptiveRuns != None:
+                    self.adaptiveRuns.addRun(results.outputs())
+                    converged = self.adaptiveRuns.isConverged()
+        finally:
+            broker.close()
+
+        if converged:
+            # Keeps the run loop from carrying on after the distributed runs
+            self.numberOfRuns = run
+        return run
+
+    def simulateJob(self, settings, run, results=None):
+        """Simulates a run headlessly for a worker of a job broker or service, once the worker has been configured as
+        the job.
+
+        Keyword arguments:
+        settings -- Settings of the program.
+        run -- Index of the run.
+        results -- RunResults to record the run into, new ones by default.
+
+        Returns RunResults.
+        """
+        import SparseSystems
+        import MemmapSystems
+        self.runTime = settings["iRunTime"]
+        self.debugTextEnabled = False
+        self.log = StdOutLogger
+        self.arrayBackend = Kernels.ENABLED or SparseSystems.SparseEpithelialSystem.ENABLED or MemmapSystems.MemmapEpithelialSystem.ENABLED
+        if SparseSystems.SparseEpithelialSystem.ENABLED:
+            MemmapSystems.MemmapEpithelialSystem.ENABLED = False
+        if self.arrayBackend:
+            Systems.FocusSystem.ENABLED = False
+        self.fastForward = True
+        return self.__simulateRun(run, output=False, results=results)
+
+    def __runBatches(self):
+        """Does all the runs as replicates of the batch engine, BATCH_SIZE runs advancing together. The counters of every
+        timestep are kept, then output run by run once the batch has finished. Cached runs are left out of the batches.
+
+        Returns the number of runs done.
+        """
+        run = 0
+        while run < self.numberOfRuns:
+            runs = range(run, min(run + BatchEpithelialSystem.BATCH_SIZE, self.numberOfRuns))
+
+            if self.debugTextEnabled:
+                startTime = time.clock()
+                self.log.out("Start time: %s" % startTime)
+
+            if Profiler.isActive():
+                Profiler.beginRun(run + 1)
+
+            # Replicates draw from the same streams as the array backend would, so they share its cached results
+            batchResults = {}
+            if self.resultCache != None:
+                keys = dict((n, ResultCache.runKey(ARRAY_ENGINE, RandomStreams.SEED, n, self.runTime)) for n in runs)
+                for n in runs:
+                    results = self.resultCache.load(keys[n])
+                    if results != None:
+                        batchResults[n] = results
+            simulated = [n for n in runs if not n in batchResults]
+
+            if len(simulated) > 0:
+                for n, results in zip(simulated, self.__simulateBatch(simulated)):
+                    batchResults[n] = results
+                    if self.resultCache != None:
+                        self.resultCache.store(keys[n], results)
+
+            if Profiler.isActive():
+                Profiler.endRun()
+
+            converged = False
+            for n in runs:
+                if Logger.BUFFERED:
+                    BufferedLogger.openRun(n + 1)
+
+                self.__outputResults(n, batchResults[n])
+
+                if self.adaptiveRuns != None:
+                    self.adaptiveRuns.addRun(batchResults[n].outputs())
+                    converged = self.adaptiveRuns.isConverged()
+
+            run += len(runs)
+
+            if self.debugTextEnabled:
+                endTime = time.clock()
+                self.log.out("End time: %s" % endTime)
+                self.log.out("Elapsed time: %s" % (endTime - startTime))
+
+            if converged:
+                # Keeps the run loop from carrying on after the batches
+                self.numberOfRuns = run
+                break
+
+        return run
+
+    def __simulateBatch(self, runs):
+        """Simulates runs together as replicates of the batch engine.
+
+        Keyword arguments:
+        runs -- Indexes of the runs.
+
+        Returns list of RunResults, one per run.
+        """
+        eSys = BatchEpithelialSystem([RandomStreams.forRun(n) for n in runs])
+        immSys = BatchImmuneSystem(eSys)
+
+        eSys.initialise()
+        if(Systems.ImmuneSystem.ISENABLED):
+            immSys.initialise()
+
+        batchResults = [RunResults(self.runTime, immSys.INIT_CELLS) for n in runs]
+        for timesteps in xrange(self.runTime + 1):
+            eSys.update()
+            if(Systems.ImmuneSystem.ISENABLED):
+                immSys.update()
+
+            eSys.synchronise()
+            if(Systems.ImmuneSystem.ISENABLED):
+                immSys.synchronise()
+
+            for r, results in enumerate(batchResults):
+                results.eCounts[timesteps] = eSys.counts[r]
+                results.immCounts[timesteps] = immSys.counts[r]
+
+            # Stepping stops once every replicate is absorbed, see __simulateRun
+            infected = eSys.counts[:, Cells.EpithelialStates.CONTAINING:Cells.EpithelialStates.INFECTIOUS + 1].sum()
+            if timesteps < self.runTime and FastForward.isAbsorbed(infected):
+                for r, results in enumerate(batchResults):
+                    results.eCounts[timesteps + 1:], results.immCounts[timesteps + 1:] = FastForward.project(
+                        self.runTime - timesteps, eSys.counts[r], eSys.healthyAges(r), immSys.counts[r],
+                        immSys.cellAges(r, Cells.ImmuneStates.VIRGIN), immSys.cellAges(r, Cells.ImmuneStates.MATURE),
+                        immSys.recruitmentDelays(r), immSys.currentRecruitment[r], immSys.INIT_CELLS)
+                break
+
+        return batchResults
+
+    def __initRunOutput(self, run, results):
+        """Starts a new run on the graphs and the run summary.
+
+        Keyword arguments:
+        run -- Index of the run.
+        results -- RunResults of the run.
+        """
+        if self.summaryWriter != None:
+            self.summary = RunSummary(run)
 
-        # All runs finished: display results graph
         if Graph.SHOW:
+            self.graph.setTotalEpithelialCells(Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
+            self.graph.setBaseImmuneCells(results.initCells)
+
+            self.graph.initRun()
+            self.fociAreaGraph.initRun()
+
+    def __outputResults(self, run, results):
+        """Starts a new run on the graphs and passes the counters of every timestep of the finished run on to the graphs
+        and the log. The graphs read the series from the arrays of the results without copying them.
+
+        Keyword arguments:
+        run -- Index of the run.
+        results -- RunResults of the run.
+        """
+        self.__initRunOutput(run, results)
+
+        fociAreasMM2 = None
+        if Graph.SHOW:
+            eCounts = results.eCounts
+            immCounts = results.immCounts
+            time = xrange(self.runTime + 1)
+            self.graph.addRunData(time, eCounts[:, Cells.EpithelialStates.HEALTHY], eCounts[:, Cells.EpithelialStates.CONTAINING],
+                                  eCounts[:, Cells.EpithelialStates.EXPRESSING], eCounts[:, Cells.EpithelialStates.INFECTIOUS],
+                                  eCounts[:, Cells.EpithelialStates.NATURAL_DEATH] + eCounts[:, Cells.EpithelialStates.INFECTION_DEATH],
+                                  immCounts[:, Cells.ImmuneStates.VIRGIN] + immCounts[:, Cells.ImmuneStates.MATURE])
+
             if(Systems.FocusSystem.ENABLED):
-                q.put((fociAreaGraph.showGraph, ([True]), {}))
-            q.put((graph.showGraph, ([True]), {}))
-        running = False
+                fociAreasMM2 = self.fociAreaGraph.addAverageFociAreaSeries(results.fociAreas, time)
+
+        if self.debugTextEnabled:
+            for timesteps in xrange(0, self.runTime + 1, Logger.SAMPLE_EVERY):
+                if fociAreasMM2 is not None:
+                    self.avgFociAreaMM2 = fociAreasMM2[timesteps]
+                counters = results.counters(timesteps)
+                self.__logTimestep(run, timesteps, counters, counters)
+
+        if self.summary != None:
+            for timesteps in xrange(self.runTime + 1):
+                counters = results.counters(timesteps)
+                self.summary.update(timesteps, counters, counters, results.fociAreas[timesteps])
+
+        self.__finishRunOutput()
+
+    def __outputRun(self, run, results, start, stop):
+        """Passes the counters of timesteps of a run on to the graphs and the log.
+
+        Keyword arguments:
+        run -- Index of the run.
+        results -- RunResults of the run, recorded up to the stop timestep.
+        start -- First timestep to output.
+        stop -- Timestep to stop before.
+        """
+        for timesteps in xrange(start, stop):
+            counters = results.counters(timesteps)
+
+            if Graph.SHOW:
+                self.__addSimulationData(timesteps, counters, counters)
+
+                if(Systems.FocusSystem.ENABLED):
+                    self.avgFociAreaMM2 = self.fociAreaGraph.addAverageFociAreaData(results.fociAreas[timesteps], timesteps)
+
+            if self.debugTextEnabled and timesteps % Logger.SAMPLE_EVERY == 0:
+                self.__logTimestep(run, timesteps, counters, counters)
+
+            if self.summary != None:
+                self.summary.update(timesteps, counters, counters, results.fociAreas[timesteps])
+
+    def __finishRunOutput(self):
+        """Writes the summary of the run that has been output."""
+        if self.summary != None:
+            self.summaryWriter.write(self.summary)
+            self.summary = None
+
+    def __addSimulationData(self, timesteps, eSys, immSys):
+        """Adds the counters of the current timestep to the graph.
+
+        Keyword arguments:
+        timesteps -- Current timestep.
+        eSys -- EpithelialSystem, or anything with the same counters.
+        immSys -- ImmuneSystem, or anything with the same counters.
+        """
+        data = self.data
+        data.time             = timesteps
+        data.eCellsHealthy    = eSys.healthyCount
+        data.eCellsContaining = eSys.containingCount
+        data.eCellsExpressing = eSys.expressingCount
+        data.eCellsInfectious = eSys.infectiousCount
+        data.eCellsDead       = eSys.naturalDeathCount + eSys.infectionDeathCount
+        data.immCellsTotal    = immSys.virginCount + immSys.matureCount
+
+        self.graph.addSimulationData(data)
+
+    def __logTimestep(self, run, timesteps, eSys, immSys):
+        """Outputs the counters of the current timestep, as text lines or as one structured record depending on the log format."""
+
+        fields = OrderedDict()
+        fields["run"]        = run + 1
+        fields["time"]       = timesteps
+        fields["infected"]   = eSys.containingCount + eSys.expressingCount + eSys.infectiousCount
+        fields["healthy"]    = eSys.healthyCount
+        fields["containing"] = eSys.containingCount
+        fields["expressing"] = eSys.expressingCount
+        fields["infectious"] = eSys.infectiousCount
+        fields["dead"]       = eSys.naturalDeathCount + eSys.infectionDeathCount
+        fields["virgin"]     = immSys.virginCount
+        fields["mature"]     = immSys.matureCount
+        if Systems.FocusSystem.ENABLED:
+            fields["avgFociAreaMM2"] = self.avgFociAreaMM2
+
+        if Logger.FORMAT == TEXT_FORMAT:
+            lines = ['%d: %d' % (run + 1, timesteps)]
+            for key, label in TIMESTEP_TEXT_LABELS:
+                if fields.get(key) != None:
+                    lines.append("%s: %s" % (label, fields[key]))
+            self.log.out("\n".join(lines) + "\n\n")
+        else:
+            self.log.record(fields)
+
+def stopMainLoop():
+    """Ends the loop of the main thread once the messages queued before this one are handled."""
+    running[0] = False
+
+def runWorker(settings, arrayBackend, focusEnabled, sharedResults, jobs, done):
+    """Target of the worker processes of parallel runs, see MainProgram.work.
+
+    Keyword arguments:
+    focusEnabled -- Whether FocusSystem is enabled, as the program may have disabled it after configuration.
+    """
+    if Systems.ImmuneSystem.ISENABLED == None:
+        # Started as a new interpreter rather than forked, so nothing is configured yet
+        Config.ConfigReader().SetConfiguration()
+    Systems.FocusSystem.ENABLED = focusEnabled
+    MainProgram().work(settings, arrayBackend, sharedResults, jobs, done)
 
 # TODO: Sort out this messy startup definition
 if __name__ == "__main__":
@@ -186,18 +944,25 @@ if __name__ == "__main__":
     settings = config.SetConfiguration()
 
     if SimVis.ENABLED:
-        if SimVis.SNAPSHOT_ENABLED:
+        blockSize = 1
+        squareSize = SimVis.SQUARESIZE
+        if SimVis.OVERVIEW_ENABLED:
+            blockSize, width, height, squareSize = overviewLayout(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, SimVis.OVERVIEW_SIZE, SimVis.SQUARESIZE) # whole sim in blocks of sites
+        elif SimVis.SNAPSHOT_ENABLED:
             width = SimVis.SNAPSHOT_WIDTH if SimVis.SNAPSHOT_WIDTH <= Worldspace.GRID_WIDTH else Worldspace.GRID_WIDTH
-            height = SimVis.SNAPSHOT_HEIGHT if SimVis.SNAPSHOT_HEIGHT <= Worldspace.GRID_HEIGHT else Worldspace.GRID_HEIGHT
+            height = SimVis.SNAPSHOT_HEIGHT if SimVis.SNAPSHOT_HEIGHT <= Worldspace.GRID_HEIGHT else Worldspace.GRID_HEIGHT # snapshot
+        else:
+            width, height = Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT # full sim size
 
-            simVis = SimVis(width, height, SimVis.SQUARESIZE) # snapshot
+        if SimVis.SEPARATE_PROCESS:
+            simVis = LiveView(width, height, squareSize, blockSize)
         else:
-            simVis = SimVis(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, SimVis.SQUARESIZE) # full sim size
+            simVis = SimVis(width, height, squareSize, blockSize)
         simVis.setTimeMeasurement("hours")
         simVis.setTimeStepsInMeasurement(6.0)
 
     thread.start_new_thread(MainProgram().run, (settings,))
-    while running:
+    while running[0]:
         # now the main thread doesn't care what function it's executing.
         # previously it assumed it was sending the message to display().
         f, args, kwargs = q.get()
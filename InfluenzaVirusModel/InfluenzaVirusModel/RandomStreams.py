@@ -0,0 +1,57 @@
+import random
+import numpy as np
+
+# Index of each subsystem's stream in the streams of a run, see RandomStreams.forSubsystems
+EPITHELIAL_STREAM = 0
+IMMUNE_STREAM = 1
+
+class RandomStreams(object):
+    """Seeds the random numbers of each run.
+
+    With a seed configured, run n draws from streams seeded by (seed, n), so that any run can be repeated on its own,
+    whatever runs come before it. Without a seed, runs are seeded by the operating system and can't be repeated.
+    """
+
+    SEED = None
+
+    @staticmethod
+    def isSeeded():
+        """Returns true if a seed is configured."""
+        return RandomStreams.SEED != None and RandomStreams.SEED >= 0
+
+    @staticmethod
+    def forRun(run):
+        """Seeds the random module, which the object backend draws from, for a run.
+
+        Keyword arguments:
+        run -- Index of the run, from 0.
+
+        Returns numpy RandomState for the array backends to draw from in the run.
+        """
+        if not RandomStreams.isSeeded():
+            return np.random.RandomState()
+        random.seed((RandomStreams.SEED << 32) + run)
+        return np.random.RandomState([RandomStreams.SEED, run])
+
+    @staticmethod
+    def forSubsystems(seed, run):
+        """Gets a separate stream for each subsystem of a run of the array backend. Draws made by one subsystem then
+        never shift the draws of the other, so two configurations of a run see the same numbers wherever they make the
+        same draws.
+
+        Keyword arguments:
+        seed -- Seed of the runs.
+        run -- Index of the run, from 0.
+
+        Returns (epithelial numpy RandomState, immune numpy RandomState).
+        """
+        return (np.random.RandomState([seed, run, EPITHELIAL_STREAM]), np.random.RandomState([seed, run, IMMUNE_STREAM]))
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the RandomStreams class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        RandomStreams.SEED = settings["iSeed"]
@@ -0,0 +1,265 @@
+import json
+import os
+import numpy as np
+
+import SimUtils
+
+RECORDINGS_DIR_NAME = "recordings/"
+SIM_RUN_DIR_PREFIX = "run"
+MANIFEST_FILE_NAME = "manifest.json"
+CHUNK_FILE_PREFIX = "chunk_"
+CHUNK_FILE_EXTENSION = ".npz"
+EPITHELIAL_STACK_FILE_NAME = "epithelial.npy"
+IMMUNE_STACK_FILE_NAME = "immune.npy"
+TIMES_FILE_NAME = "times.npy"
+
+FORMAT_VERSION = 1
+
+class StateRecorder(object):
+    """Streams the epithelial state grid and immune occupancy grid of a run to disk.
+
+    Frames are grouped into chunks of CHUNK_FRAMES frames, each saved as one compressed .npz file. The first frame of a
+    chunk is stored whole, every following frame only stores the flat indices and new values of the sites that changed
+    since the previous frame. Only the chunk being filled is held in memory.
+    """
+
+    ENABLED = INTERVAL = CHUNK_FRAMES = None
+
+    def __init__(self, folder, width, height, interval=1, chunkFrames=32):
+        """Constructor for StateRecorder
+
+        Keyword arguments:
+        folder -- Folder to write the recording to. Any existing contents are removed.
+        width -- Width of the recorded grids.
+        height -- Height of the recorded grids.
+        interval -- Number of timesteps between recorded frames.
+        chunkFrames -- Number of frames stored per chunk file.
+        """
+        if folder[len(folder) - 1] != '/':
+            folder += '/'
+        SimUtils.initFolderPath(folderPath=folder, overwrite=True)
+
+        self.folder = folder
+        self.width = width
+        self.height = height
+        self.interval = interval if interval > 0 else 1
+        self.chunkFrames = chunkFrames if chunkFrames > 0 else 1
+
+        self.frameCount = 0
+        self.chunkCount = 0
+        self.previous = None
+        self.__resetChunk()
+
+    @staticmethod
+    def forRun(run, width, height):
+        """Creates a recorder for a numbered run using the configured interval and chunk size.
+
+        Keyword arguments:
+        run -- Number of the run being recorded.
+        width -- Width of the recorded grids.
+        height -- Height of the recorded grids.
+        """
+        root = SimUtils.getRootPath()
+        folder = (root + "/" if root != "" else "") + RECORDINGS_DIR_NAME + SIM_RUN_DIR_PREFIX + str(run)
+        return StateRecorder(folder, width, height, StateRecorder.INTERVAL, StateRecorder.CHUNK_FRAMES)
+
+    def shouldRecord(self, timesteps):
+        return timesteps % self.interval == 0
+
+    def record(self, timesteps, stateGrid, immuneGrid):
+        """Adds a frame to the recording.
+
+        Keyword arguments:
+        timesteps -- Timestep of the frame.
+        stateGrid -- (width, height) array of epithelial states.
+        immuneGrid -- (width, height) array of immune cell counts per site.
+        """
+        stateFlat = np.ascontiguousarray(stateGrid, dtype=np.uint8).ravel()
+        immuneFlat = np.ascontiguousarray(np.minimum(immuneGrid, 255), dtype=np.uint8).ravel()
+
+        self.times.append(timesteps)
+        if self.key == None:
+            self.key = (stateFlat.copy(), immuneFlat.copy())
+        else:
+            self.__addDelta(self.stateDeltas, self.previous[0], stateFlat)
+            self.__addDelta(self.immuneDeltas, self.previous[1], immuneFlat)
+
+        self.previous = (stateFlat.copy(), immuneFlat.copy())
+        self.frameCount += 1
+
+        if len(self.times) >= self.chunkFrames:
+            self.__writeChunk()
+
+    def close(self):
+        """Writes any partially filled chunk and the manifest."""
+        if len(self.times) > 0:
+            self.__writeChunk()
+        self.__writeManifest()
+
+    def __addDelta(self, deltas, previous, current):
+        changed = np.flatnonzero(previous != current).astype(np.uint32)
+        deltas.append((changed, current[changed]))
+
+    def __resetChunk(self):
+        self.times = []
+        self.key = None
+        self.stateDeltas = []
+        self.immuneDeltas = []
+
+    def __writeChunk(self):
+        stateIndices, stateValues, stateOffsets = StateRecorder.__packDeltas(self.stateDeltas)
+        immuneIndices, immuneValues, immuneOffsets = StateRecorder.__packDeltas(self.immuneDeltas)
+
+        path = self.folder + getChunkFileName(self.chunkCount)
+        np.savez_compressed(path,
+                            times=np.array(self.times, dtype=np.int32),
+                            stateKey=self.key[0], immuneKey=self.key[1],
+                            stateIndices=stateIndices, stateValues=stateValues, stateOffsets=stateOffsets,
+                            immuneIndices=immuneIndices, immuneValues=immuneValues, immuneOffsets=immuneOffsets)
+
+        self.chunkCount += 1
+        self.__resetChunk()
+        self.__writeManifest()
+
+    def __writeManifest(self):
+        manifest = {"version": FORMAT_VERSION,
+                    "width": self.width,
+                    "height": self.height,
+                    "interval": self.interval,
+                    "chunkFrames": self.chunkFrames,
+                    "frames": self.frameCount - len(self.times),
+                    "chunks": self.chunkCount}
+        with open(self.folder + MANIFEST_FILE_NAME, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    @staticmethod
+    def __packDeltas(deltas):
+        offsets = np.zeros(len(deltas) + 1, dtype=np.int64)
+        for i in xrange(len(deltas)):
+            offsets[i + 1] = offsets[i] + len(deltas[i][0])
+
+        if len(deltas) == 0:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8), offsets
+        return np.concatenate([d[0] for d in deltas]), np.concatenate([d[1] for d in deltas]), offsets
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the StateRecorder class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        StateRecorder.ENABLED      = settings["bIsEnabled"]
+        StateRecorder.INTERVAL     = settings["iInterval"]
+        StateRecorder.CHUNK_FRAMES = settings["iChunkFrames"]
+
+class StateReader(object):
+    """Reads back a recording written by StateRecorder."""
+
+    def __init__(self, folder):
+        """Constructor for StateReader
+
+        Keyword arguments:
+        folder -- Folder the recording was written to.
+        """
+        if folder[len(folder) - 1] != '/':
+            folder += '/'
+        self.folder = folder
+
+        with open(self.folder + MANIFEST_FILE_NAME, 'r') as f:
+            manifest = json.load(f)
+
+        self.width = manifest["width"]
+        self.height = manifest["height"]
+        self.interval = manifest["interval"]
+        self.chunkFrames = manifest["chunkFrames"]
+        self.frameCount = manifest["frames"]
+        self.chunkCount = manifest["chunks"]
+
+    def readChunk(self, chunk):
+        """Decodes every frame of a chunk.
+
+        Keyword arguments:
+        chunk -- Index of the chunk to read.
+
+        Returns list of (timesteps, stateGrid, immuneGrid) tuples, grids being (width, height) uint8 arrays.
+        """
+        frames = []
+        with np.load(self.folder + getChunkFileName(chunk)) as data:
+            times = data["times"]
+            state = data["stateKey"].copy()
+            immune = data["immuneKey"].copy()
+            frames.append((int(times[0]), self.__toGrid(state), self.__toGrid(immune)))
+
+            # Each access to an array of the archive decompresses it again, so they're read once
+            stateIndices, stateValues, stateOffsets = data["stateIndices"], data["stateValues"], data["stateOffsets"]
+            immuneIndices, immuneValues, immuneOffsets = data["immuneIndices"], data["immuneValues"], data["immuneOffsets"]
+            for i in xrange(1, len(times)):
+                StateReader.__applyDelta(state, stateIndices, stateValues, stateOffsets, i - 1)
+                StateReader.__applyDelta(immune, immuneIndices, immuneValues, immuneOffsets, i - 1)
+                frames.append((int(times[i]), self.__toGrid(state), self.__toGrid(immune)))
+        return frames
+
+    def frames(self):
+        """Generator over every recorded frame, decoding one chunk at a time.
+
+        Yields (timesteps, stateGrid, immuneGrid).
+        """
+        for chunk in xrange(self.chunkCount):
+            for frame in self.readChunk(chunk):
+                yield frame
+
+    def exportMemmap(self, folder=None):
+        """Decodes the recording into uncompressed .npy stacks and opens them memory mapped.
+
+        Keyword arguments:
+        folder -- Folder to write the stacks to, defaults to the recording folder.
+
+        Returns (times, stateStack, immuneStack), the stacks being read-only (frames, width, height) memmaps.
+        """
+        if folder == None:
+            folder = self.folder
+        elif folder[len(folder) - 1] != '/':
+            folder += '/'
+
+        shape = (self.frameCount, self.width, self.height)
+        stateStack = np.lib.format.open_memmap(folder + EPITHELIAL_STACK_FILE_NAME, mode='w+', dtype=np.uint8, shape=shape)
+        immuneStack = np.lib.format.open_memmap(folder + IMMUNE_STACK_FILE_NAME, mode='w+', dtype=np.uint8, shape=shape)
+        times = np.zeros(self.frameCount, dtype=np.int32)
+
+        for i, (timesteps, stateGrid, immuneGrid) in enumerate(self.frames()):
+            times[i] = timesteps
+            stateStack[i] = stateGrid
+            immuneStack[i] = immuneGrid
+
+        stateStack.flush()
+        immuneStack.flush()
+        del stateStack
+        del immuneStack
+        np.save(folder + TIMES_FILE_NAME, times)
+
+        return StateReader.openMemmap(folder)
+
+    @staticmethod
+    def openMemmap(folder):
+        """Opens stacks previously written by exportMemmap() without decoding them again.
+
+        Returns (times, stateStack, immuneStack).
+        """
+        if folder[len(folder) - 1] != '/':
+            folder += '/'
+        return (np.load(folder + TIMES_FILE_NAME),
+                np.load(folder + EPITHELIAL_STACK_FILE_NAME, mmap_mode='r'),
+                np.load(folder + IMMUNE_STACK_FILE_NAME, mmap_mode='r'))
+
+    def __toGrid(self, flat):
+        return flat.reshape(self.width, self.height).copy()
+
+    @staticmethod
+    def __applyDelta(flat, indices, values, offsets, frame):
+        start = offsets[frame]
+        end = offsets[frame + 1]
+        flat[indices[start:end]] = values[start:end]
+
+def getChunkFileName(chunk):
+    return CHUNK_FILE_PREFIX + "%05d" % chunk + CHUNK_FILE_EXTENSION
@@ -0,0 +1,189 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from Recorder import StateReader
+from SimulationVisualization import (sitePalette, loadTimeFont, overviewLayout, overviewColours, OVERVIEW_MODES, OVERVIEW_BLEND,
+                                     VIRGIN_CATEGORY, TIME_TEXT_PREFIX, IMAGE_NAME_PREFIX, CANVAS_TEXT_PADDING)
+from Logger import StdOutLogger as Log
+import SimUtils
+
+REPLAY_DIR_NAME = "replays/"
+IMAGE_FORMATS = ["png", "jpg", "bmp"]
+ANIMATION_FILE_NAME = "replay.gif"
+
+DEFAULT_SQUARE_SIZE = 4
+DEFAULT_TIME_MEASUREMENT = "hours"
+DEFAULT_TIMESTEPS_IN_MEASUREMENT = 6.0
+DEFAULT_FRAME_DURATION = 40
+
+class FrameRenderer(object):
+    """Renders recorded frames like SimVis draws them, without a window.
+
+    Frames can be cropped to a region of the grids, or drawn whole with blocks of sites drawn as one square as in SimVis
+    overviews. Recordings keep the number of immune cells at each site but not their states, so sites with immune cells
+    are drawn in the virgin immune cell colour.
+    """
+
+    def __init__(self, width, height, crop=None, squareSize=DEFAULT_SQUARE_SIZE, overviewSize=None, mode=OVERVIEW_BLEND,
+                 immune=True, timeMeasurement=DEFAULT_TIME_MEASUREMENT, timeStepsInMeasurement=DEFAULT_TIMESTEPS_IN_MEASUREMENT):
+        """Constructor for FrameRenderer
+
+        Keyword arguments:
+        width -- Width of the recorded grids.
+        height -- Height of the recorded grids.
+        crop -- (x, y, width, height) of the region of the grids to draw, the whole grids by default.
+        squareSize -- Size of a square in pixels.
+        overviewSize -- Most pixels along each side of the drawn region, see overviewLayout(). Blocks aren't used if None.
+        mode -- OVERVIEW_MAJORITY or OVERVIEW_BLEND, for blocks of sites.
+        immune -- Whether to draw immune cells over the epithelial cells.
+        timeMeasurement -- Unit of the time text.
+        timeStepsInMeasurement -- Timesteps per unit of the time text.
+        """
+        self.crop = crop if crop != None else (0, 0, width, height)
+        x, y, cropWidth, cropHeight = self.crop
+        if x < 0 or y < 0 or cropWidth <= 0 or cropHeight <= 0 or x + cropWidth > width or y + cropHeight > height:
+            raise ValueError("Crop %s is outside the %dx%d grids" % (self.crop, width, height))
+
+        self.blockSize = 1
+        self.squareSize = squareSize
+        self.blocksWide, self.blocksHigh = cropWidth, cropHeight
+        if overviewSize != None:
+            self.blockSize, self.blocksWide, self.blocksHigh, self.squareSize = overviewLayout(cropWidth, cropHeight, overviewSize, squareSize)
+
+        self.mode = mode
+        self.immune = immune
+        self.timeMeasurement = timeMeasurement
+        self.timeStepsInMeasurement = timeStepsInMeasurement
+        self.palette = sitePalette()
+        self.timeFont = None
+
+    def size(self):
+        """Gets the (width, height) of the rendered images in pixels."""
+        return (self.blocksWide * self.squareSize, self.blocksHigh * self.squareSize + CANVAS_TEXT_PADDING)
+
+    def render(self, timesteps, stateGrid, immuneGrid):
+        """Renders a frame.
+
+        Keyword arguments:
+        timesteps -- Timestep of the frame.
+        stateGrid -- (width, height) array of epithelial states.
+        immuneGrid -- (width, height) array of immune cell counts.
+
+        Returns RGB PIL Image.
+        """
+        x, y, width, height = self.crop
+        states = stateGrid[x:x + width, y:y + height]
+        immune = immuneGrid[x:x + width, y:y + height] if self.immune else np.zeros(states.shape, dtype=np.uint8)
+
+        if self.blockSize > 1:
+            colours = overviewColours(states, immune, np.zeros(states.shape, dtype=np.uint8), self.blockSize, self.palette, self.mode)
+        else:
+            colours = self.palette[states]
+            colours[immune > 0] = self.palette[VIRGIN_CATEGORY]
+
+        # Grids are indexed [x, y], images [y, x]
+        pixels = colours.transpose(1, 0, 2).repeat(self.squareSize, axis=0).repeat(self.squareSize, axis=1)
+        image = Image.new("RGB", self.size(), (255, 255, 255))
+        image.paste(Image.fromarray(np.ascontiguousarray(pixels), "RGB"), (0, 0))
+
+        if self.timeFont == None:
+            self.timeFont = loadTimeFont()
+        draw = ImageDraw.Draw(image)
+        timeText = TIME_TEXT_PREFIX + str(round(timesteps / self.timeStepsInMeasurement, 1)) + " " + self.timeMeasurement
+        w, h = draw.textsize(timeText, self.timeFont)
+        imageWidth, imageHeight = self.size()
+        draw.text(((imageWidth / 2) - (w / 2), imageHeight - (CANVAS_TEXT_PADDING / 2) - (h / 2)), timeText, (0, 0, 0), font=self.timeFont)
+        return image
+
+def getImageFileName(timesteps, format):
+    return IMAGE_NAME_PREFIX + "_%06d." % timesteps + format
+
+def renderChunk(args):
+    """Renders every frame of a chunk of a recording to image files. Target of the replay pool processes.
+
+    Keyword arguments:
+    args -- (recording folder, chunk index, FrameRenderer, output folder, image format).
+
+    Returns list of the (timesteps, path) of the images written.
+    """
+    recordingFolder, chunk, renderer, outputFolder, format = args
+    reader = StateReader(recordingFolder)
+
+    images = []
+    for timesteps, stateGrid, immuneGrid in reader.readChunk(chunk):
+        path = os.path.join(outputFolder, getImageFileName(timesteps, format))
+        renderer.render(timesteps, stateGrid, immuneGrid).save(path)
+        images.append((timesteps, path))
+    return images
+
+def replay(recordingFolder, outputFolder, renderer, format=IMAGE_FORMATS[0], workers=None, animation=False, frameDuration=DEFAULT_FRAME_DURATION):
+    """Renders every frame of a recording, a chunk per task of a process pool.
+
+    Keyword arguments:
+    recordingFolder -- Folder of the recording, see StateRecorder.
+    outputFolder -- Folder to write the images to. Any existing contents are removed.
+    renderer -- FrameRenderer to render the frames with.
+    format -- Image format, one of IMAGE_FORMATS.
+    workers -- Number of processes, the number of CPUs by default.
+    animation -- Also write the frames as one animated GIF.
+    frameDuration -- Milliseconds each frame of the animation is shown for.
+
+    Returns list of the paths of the images written, in frame order.
+    """
+    reader = StateReader(recordingFolder)
+    SimUtils.initFolderPath(folderPath=outputFolder, overwrite=True)
+
+    tasks = [(recordingFolder, chunk, renderer, outputFolder, format) for chunk in xrange(reader.chunkCount)]
+    if workers == 1 or len(tasks) <= 1:
+        chunks = [renderChunk(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            chunks = pool.map(renderChunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    paths = [path for images in chunks for timesteps, path in images]
+    if animation and len(paths) > 0:
+        # Quantised one at a time, so that only the quantised frames are held in memory
+        frames = [Image.open(path).convert("P", palette=Image.ADAPTIVE) for path in paths]
+        frames[0].save(os.path.join(outputFolder, ANIMATION_FILE_NAME), save_all=True, append_images=frames[1:], duration=frameDuration, loop=0)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the frames of a recorded run.")
+    parser.add_argument("recording", help="folder of the recording, e.g. recordings/run1")
+    parser.add_argument("--output", default=None, help="folder to write the images to, defaults to replays/<recording folder name>")
+    parser.add_argument("--format", choices=IMAGE_FORMATS, default=IMAGE_FORMATS[0], help="image format")
+    parser.add_argument("--gif", action="store_true", help="also write the frames as one animated GIF")
+    parser.add_argument("--frame-duration", type=int, default=DEFAULT_FRAME_DURATION, help="milliseconds per frame of the GIF")
+    parser.add_argument("--crop", type=int, nargs=4, default=None, metavar=("X", "Y", "WIDTH", "HEIGHT"), help="region of the grids to draw")
+    parser.add_argument("--square-size", type=int, default=DEFAULT_SQUARE_SIZE, help="size of a square in pixels")
+    parser.add_argument("--overview-size", type=int, default=None, help="draw blocks of sites as one square to fit this many pixels per side")
+    parser.add_argument("--mode", choices=OVERVIEW_MODES, default=OVERVIEW_BLEND, help="colour of a block of sites")
+    parser.add_argument("--no-immune", dest="immune", action="store_false", help="don't draw immune cells")
+    parser.add_argument("--time-measurement", default=DEFAULT_TIME_MEASUREMENT, help="unit of the time text")
+    parser.add_argument("--timesteps-in-measurement", type=float, default=DEFAULT_TIMESTEPS_IN_MEASUREMENT, help="timesteps per unit of the time text")
+    parser.add_argument("--workers", type=int, default=None, help="rendering processes, defaults to the number of CPUs")
+    args = parser.parse_args(argv)
+
+    output = args.output
+    if output == None:
+        root = SimUtils.getRootPath()
+        output = (root + "/" if root != "" else "") + REPLAY_DIR_NAME + os.path.basename(os.path.normpath(args.recording))
+
+    reader = StateReader(args.recording)
+    renderer = FrameRenderer(reader.width, reader.height, args.crop, args.square_size, args.overview_size, args.mode, args.immune,
+                             args.time_measurement, args.timesteps_in_measurement)
+    paths = replay(args.recording, output, renderer, args.format, args.workers, args.gif, args.frame_duration)
+    Log.out("%d frames written to %s" % (len(paths), output))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import zipfile
+import numpy as np
+
+import Worldspace
+import SimUtils
+from Cells import EpithelialCell, ImmuneCell
+from Results import RunResults
+
+CACHE_DIR_NAME = "cache/"
+RESULT_FILE_EXTENSION = ".npz"
+
+OBJECT_ENGINE = "object"
+ARRAY_ENGINE = "array"
+COMMON_RANDOM_ENGINE = "commonRandom" # Array backend drawing fixed rolls from subsystem streams, see PairedComparison
+SPARSE_ENGINE = "sparse" # Followed by the chunk size, which changes how ages are drawn, see SparseSystems
+OUT_OF_CORE_ENGINE = "outOfCore" # Chooses the initial infected cells differently, see MemmapSystems
+HYBRID_ENGINE = "hybrid" # Followed by the chunk size and front distance, which change when cells are drawn, see SparseSystems
+
+# Bump when the simulation changes in a way that changes results, so that stale results are no longer found
+FORMAT_VERSION = 1
+
+class ResultCache(object):
+    """On disk cache of the results of seeded runs.
+
+    Results are stored per run, in a file named by a hash of every configured constant of the model, the run time, the
+    seed and the index of the run, and the engine drawing the random numbers. A run with the same key gives the same
+    results, so they are loaded instead of simulating the run again. The files used least recently are removed once
+    the cache grows past MAX_SIZE_MB.
+    """
+
+    ENABLED = MAX_SIZE_MB = None
+
+    def __init__(self, folder=None, maxSize=None):
+        """Constructor for ResultCache
+
+        Keyword arguments:
+        folder -- Folder to keep the cache in, defaults to the cache folder.
+        maxSize -- Most bytes to keep, defaults to MAX_SIZE_MB.
+        """
+        if folder == None:
+            root = SimUtils.getRootPath()
+            folder = (root + "/" if root != "" else "") + CACHE_DIR_NAME
+        SimUtils.initFolderPath(folderPath=folder, overwrite=False)
+
+        self.folder = folder
+        self.maxSize = maxSize if maxSize != None else ResultCache.MAX_SIZE_MB * 1024 * 1024
+        self.hits = self.misses = 0
+
+    def load(self, key):
+        """Loads the results stored under a key, marking them as recently used.
+
+        Keyword arguments:
+        key -- Key from ResultCache.runKey().
+
+        Returns RunResults, or None if there are none.
+        """
+        path = self.__path(key)
+        try:
+            with np.load(path) as stored:
+                results = RunResults(int(stored["runTime"]), int(stored["initCells"]), stored["eCounts"], stored["immCounts"], stored["fociAreas"])
+            os.utime(path, None)
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results
+
+    def store(self, key, results):
+        """Stores the results of a run under a key, then evicts the least recently used results past the size limit.
+
+        Keyword arguments:
+        key -- Key from ResultCache.runKey().
+        results -- RunResults of the run.
+        """
+        # Written under a temporary name and renamed, so an interrupted write never leaves a partial file to be loaded
+        path = self.__path(key)
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, 'wb') as f:
+            np.savez(f, runTime=results.runTime, initCells=results.initCells, eCounts=results.eCounts,
+                     immCounts=results.immCounts, fociAreas=results.fociAreas)
+        os.rename(temporaryPath, path)
+        self.__evict()
+
+    def __evict(self):
+        files = []
+        for name in os.listdir(self.folder):
+            if name.endswith(RESULT_FILE_EXTENSION):
+                info = os.stat(os.path.join(self.folder, name))
+                files.append((info.st_mtime, info.st_size, name))
+
+        size = sum(fileSize for usedTime, fileSize, name in files)
+        for usedTime, fileSize, name in sorted(files):
+            if size <= self.maxSize:
+                break
+            os.remove(os.path.join(self.folder, name))
+            size -= fileSize
+
+    def __path(self, key):
+        return os.path.join(self.folder, key + RESULT_FILE_EXTENSION)
+
+    @staticmethod
+    def runKey(engine, seed, run, runTime):
+        """Gets the key of the results of a run of the current configuration.
+
+        Keyword arguments:
+        engine -- OBJECT_ENGINE, ARRAY_ENGINE, COMMON_RANDOM_ENGINE or SPARSE_ENGINE, the engines draw random numbers differently.
+        seed -- Seed of the runs.
+        run -- Index of the run.
+        runTime -- Last timestep of the run.
+
+        Returns str.
+        """
+        fields = modelConstants()
+        fields.update({"version": FORMAT_VERSION, "engine": engine, "seed": seed, "run": run, "runTime": runTime})
+        return hashlib.sha1(json.dumps(fields, sort_keys=True)).hexdigest()
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the ResultCache class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        ResultCache.ENABLED     = settings["bIsEnabled"]
+        ResultCache.MAX_SIZE_MB = settings["iMaxSizeMB"]
+
+def modelConstants():
+    """Gets every constant of the model that the configuration sets, with those the simulation fixes.
+
+    Returns dict of "Owner.NAME" to value.
+    """
+    import Systems # Systems imports Program, which imports this module
+    owners = [("Worldspace", Worldspace, ["ISTOROIDAL", "GRID_WIDTH", "GRID_HEIGHT"]),
+              ("EpithelialSystem", Systems.EpithelialSystem, ["INFECT_INIT", "REGEN_ENABLED", "RANDOM_AGE", "MAX_NEIGHBOURS"]),
+              ("ImmuneSystem", Systems.ImmuneSystem, ["BASE_IMM_CELL", "RECRUITMENT", "RECRUITMENT_DELAY", "ISENABLED", "FLOW_RATE"]),
+              ("FocusSystem", Systems.FocusSystem, ["ENABLED", "COLLISION_MERGE_PERCENTAGE"]),
+              ("EpithelialCell", EpithelialCell, ["CELL_LIFESPAN", "INFECT_RATE", "INFECT_LIFESPAN", "EXPRESS_DELAY", "INFECT_DELAY", "DIVISION_TIME"]),
+              ("ImmuneCell", ImmuneCell, ["IMM_LIFESPAN"])]
+
+    constants = {}
+    for ownerName, owner, names in owners:
+        for name in names:
+            constants[ownerName + "." + name] = getattr(owner, name)
+    return constants
@@ -0,0 +1,78 @@
+import numpy as np
+
+from Cells import EpithelialStates, ImmuneStates
+from Statistics import PEAK_INFECTED, INFECTION_DEATHS, FOCI_AREA
+
+EPITHELIAL_STATE_COUNT = 6
+IMMUNE_STATE_COUNT = 3
+
+class TimestepCounters(object):
+    """The counters of a run at one timestep, under the same names as the counters of the systems."""
+
+    def __init__(self, eCounts, immCounts):
+        """Constructor for TimestepCounters
+
+        Keyword arguments
+        eCounts -- Number of epithelial cells in each state, indexed by state.
+        immCounts -- Number of immune cells in each state, indexed by state.
+        """
+        self.healthyCount        = int(eCounts[EpithelialStates.HEALTHY])
+        self.containingCount     = int(eCounts[EpithelialStates.CONTAINING])
+        self.expressingCount     = int(eCounts[EpithelialStates.EXPRESSING])
+        self.infectiousCount     = int(eCounts[EpithelialStates.INFECTIOUS])
+        self.naturalDeathCount   = int(eCounts[EpithelialStates.NATURAL_DEATH])
+        self.infectionDeathCount = int(eCounts[EpithelialStates.INFECTION_DEATH])
+        self.virginCount         = int(immCounts[ImmuneStates.VIRGIN])
+        self.matureCount         = int(immCounts[ImmuneStates.MATURE])
+
+class RunResults(object):
+    """The counters of every timestep of a run, from which the graphs and log of the run can be produced."""
+
+    def __init__(self, runTime, initCells, eCounts=None, immCounts=None, fociAreas=None):
+        """Constructor for RunResults
+
+        Keyword arguments
+        runTime -- Last timestep of the run.
+        initCells -- Base number of immune cells of the run.
+        eCounts -- (runTime + 1, states) array of the epithelial counters, zeros to be recorded by default.
+        immCounts -- (runTime + 1, states) array of the immune counters, zeros to be recorded by default.
+        fociAreas -- Average focus area at each timestep, zeros to be recorded by default.
+        """
+        self.runTime = runTime
+        self.initCells = initCells
+        self.eCounts = eCounts if eCounts is not None else np.zeros((runTime + 1, EPITHELIAL_STATE_COUNT), dtype=np.int64)
+        self.immCounts = immCounts if immCounts is not None else np.zeros((runTime + 1, IMMUNE_STATE_COUNT), dtype=np.int64)
+        self.fociAreas = fociAreas if fociAreas is not None else np.zeros(runTime + 1)
+
+    def record(self, timesteps, eSys, immSys, fociArea=0.0):
+        """Records the counters of a timestep.
+
+        Keyword arguments:
+        timesteps -- The timestep.
+        eSys -- EpithelialSystem, or anything with the same counters.
+        immSys -- ImmuneSystem, or anything with the same counters.
+        fociArea -- Average focus area.
+        """
+        self.eCounts[timesteps] = (eSys.healthyCount, eSys.containingCount, eSys.expressingCount, eSys.infectiousCount,
+                                   eSys.infectionDeathCount, eSys.naturalDeathCount)
+        self.immCounts[timesteps, ImmuneStates.VIRGIN] = immSys.virginCount
+        self.immCounts[timesteps, ImmuneStates.MATURE] = immSys.matureCount
+        self.fociAreas[timesteps] = fociArea
+
+    def counters(self, timesteps):
+        """Gets the counters of a timestep.
+
+        Returns TimestepCounters.
+        """
+        return TimestepCounters(self.eCounts[timesteps], self.immCounts[timesteps])
+
+    def outputs(self):
+        """Gets the summary outputs of the run, see Statistics.OUTPUTS.
+
+        Returns dict of output name to value.
+        """
+        cells = float(self.eCounts[0].sum())
+        infected = self.eCounts[:, EpithelialStates.CONTAINING:EpithelialStates.INFECTIOUS + 1].sum(axis=1)
+        return {PEAK_INFECTED: infected.max() / cells,
+                INFECTION_DEATHS: self.eCounts[-1, EpithelialStates.INFECTION_DEATH] / cells,
+                FOCI_AREA: float(self.fociAreas[-1])}
@@ -0,0 +1,66 @@
+import ctypes
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+from Results import RunResults, EPITHELIAL_STATE_COUNT, IMMUNE_STATE_COUNT
+
+class SharedResults(object):
+    """The counters of every timestep of every run, in shared memory.
+
+    The arrays are allocated once by the parent process and passed to the worker processes when they start. Workers
+    record each run straight into its rows, so only the index of a finished run has to be sent back, and the parent
+    reads the rows in place. ENABLED and WORKERS configure the parallel runs of the program that use it.
+    """
+
+    ENABLED = WORKERS = None
+
+    def __init__(self, runs, runTime):
+        """Constructor for SharedResults
+
+        Keyword arguments:
+        runs -- Number of runs to hold.
+        runTime -- Last timestep of the runs.
+        """
+        self.runs = runs
+        self.runTime = runTime
+
+        steps = runTime + 1
+        self.eCountsBuffer   = RawArray(ctypes.c_int64, runs * steps * EPITHELIAL_STATE_COUNT)
+        self.immCountsBuffer = RawArray(ctypes.c_int64, runs * steps * IMMUNE_STATE_COUNT)
+        self.fociAreasBuffer = RawArray(ctypes.c_double, runs * steps)
+        self.__createViews()
+
+    def __createViews(self):
+        steps = self.runTime + 1
+        self.eCounts   = np.frombuffer(self.eCountsBuffer, dtype=np.int64).reshape(self.runs, steps, EPITHELIAL_STATE_COUNT)
+        self.immCounts = np.frombuffer(self.immCountsBuffer, dtype=np.int64).reshape(self.runs, steps, IMMUNE_STATE_COUNT)
+        self.fociAreas = np.frombuffer(self.fociAreasBuffer, dtype=np.float64).reshape(self.runs, steps)
+
+    def __getstate__(self):
+        # Pickling the views would copy the data, only the buffers are passed to a starting process
+        return (self.runs, self.runTime, self.eCountsBuffer, self.immCountsBuffer, self.fociAreasBuffer)
+
+    def __setstate__(self, state):
+        self.runs, self.runTime, self.eCountsBuffer, self.immCountsBuffer, self.fociAreasBuffer = state
+        self.__createViews()
+
+    def runResults(self, run, initCells=0):
+        """Gets the results of a run, backed by the run's rows of the shared arrays.
+
+        Keyword arguments:
+        run -- Index of the run.
+        initCells -- Base number of immune cells of the run.
+
+        Returns RunResults.
+        """
+        return RunResults(self.runTime, initCells, self.eCounts[run], self.immCounts[run], self.fociAreas[run])
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the SharedResults class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        SharedResults.ENABLED = settings["bIsEnabled"]
+        SharedResults.WORKERS = settings["iWorkers"]
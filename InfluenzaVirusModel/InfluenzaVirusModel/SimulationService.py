@@ -0,0 +1,418 @@
+import argparse
+import BaseHTTPServer
+import collections
+import json
+import multiprocessing
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+from Queue import Queue, Empty
+
+import Config
+import Program
+from JobBroker import configureJob
+from Results import RunResults, TimestepCounters
+from Logger import StdOutLogger as Log
+
+DEFAULT_HOST = "localhost"
+DEFAULT_PORT = 6020
+
+RUNS_PATH = "/runs"
+STATUS_PATH = "/status"
+STREAM_CONTENT_TYPE = "application/x-ndjson"
+
+# Events of a job, from the pool workers to the request waiting on it
+READY = "ready"
+STARTED = "started"
+TIMESTEP = "timestep"
+FINISHED = "finished"
+FAILED = "failed"
+
+# Options of a small run simulated by each pool worker before taking jobs, so that the first job doesn't wait for the
+# kernels to load
+WARM_UP_OPTIONS = [("World", "iGridWidth", "16"), ("World", "iGridHeight", "16"), ("General", "iRunTime", "2")]
+
+# Seconds between checks of the pool workers
+POLL_INTERVAL = 0.5
+
+class ReportedResults(RunResults):
+    """RunResults that report the counters of every few timesteps to the events queue of a WorkerPool as they are
+    recorded. Fast forwarded timesteps are filled in without being recorded, so aren't reported.
+    """
+
+    def __init__(self, runTime, worker, job, events, every):
+        """Constructor for ReportedResults
+
+        Keyword arguments:
+        runTime -- Last timestep of the run.
+        worker -- Index of the worker simulating the run.
+        job -- Id of the job of the run.
+        events -- Queue of the events of the jobs.
+        every -- Timesteps between reports.
+        """
+        RunResults.__init__(self, runTime, 0)
+        self.worker = worker
+        self.job = job
+        self.events = events
+        self.every = every
+
+    def record(self, timesteps, eSys, immSys, fociArea=0.0):
+        RunResults.record(self, timesteps, eSys, immSys, fociArea)
+        if timesteps % self.every == 0:
+            self.events.put((self.worker, self.job, TIMESTEP, (timesteps, self.eCounts[timesteps].tolist(), self.immCounts[timesteps].tolist())))
+
+class WorkerPool(object):
+    """Worker processes that have imported the program and simulated a small run before taking jobs, so a job starts
+    as soon as a worker is free. Each worker is configured as the job it is given, see JobBroker.configureJob. Workers
+    that exit are replaced, failing the job they had started, or queuing again the job they hadn't.
+
+    Jobs are given to idle workers one at a time through a queue of their own, as a worker that exits while waiting on a
+    shared queue would leave it locked.
+    """
+
+    def __init__(self, workers, options):
+        """Constructor for WorkerPool, which starts the workers.
+
+        Keyword arguments:
+        workers -- Number of worker processes.
+        options -- Every option of the configuration the workers warm up with, as (section, option, value).
+        """
+        self.options = options
+        self.events = multiprocessing.Queue()
+
+        self.lock = threading.Lock()
+        self.listeners = {}
+        self.pending = collections.deque()
+        self.running = {}
+        self.started = set()
+        self.idle = set()
+        self.nextJob = 0
+        self.closed = False
+
+        self.jobs = [None] * workers
+        self.processes = [None] * workers
+        for i in xrange(workers):
+            self.__startWorker(i)
+        self.dispatcher = threading.Thread(target=self.__dispatch)
+        self.dispatcher.daemon = True
+        self.dispatcher.start()
+
+    def submit(self, spec, every=1):
+        """Queues a job.
+
+        Keyword arguments:
+        spec -- (options, seed, run) of the run, see JobBroker.
+        every -- Timesteps between the reports of the counters of the run.
+
+        Returns (job id, Queue of the (event, payload) of the job).
+        """
+        events = Queue()
+        with self.lock:
+            job = self.nextJob
+            self.nextJob += 1
+            self.listeners[job] = events
+            self.pending.append((job, spec, every))
+            self.__assign()
+        return job, events
+
+    def forget(self, job):
+        """Stops passing on the events of a job, such as when nothing is waiting for them any more."""
+        with self.lock:
+            self.listeners.pop(job, None)
+
+    def status(self):
+        """Gets the number of workers, those idle, those simulating a run and the jobs waiting for a worker.
+
+        Returns dict.
+        """
+        with self.lock:
+            return {"workers": len(self.processes), "idle": len(self.idle), "running": len(self.running), "queued": len(self.pending)}
+
+    def close(self):
+        """Stops the workers once they have finished their jobs. Jobs still waiting for a worker are dropped."""
+        with self.lock:
+            self.closed = True
+            self.pending.clear()
+            for jobs in self.jobs:
+                jobs.put(None)
+        for process in self.processes:
+            process.join()
+        self.events.put(None)
+        self.dispatcher.join()
+
+    def __startWorker(self, index):
+        self.jobs[index] = multiprocessing.Queue()
+        self.processes[index] = multiprocessing.Process(target=runPoolWorker, args=(index, self.options, self.jobs[index], self.events))
+        self.processes[index].daemon = True
+        self.processes[index].start()
+
+    def __assign(self):
+        # Called holding the lock
+        while len(self.pending) > 0 and len(self.idle) > 0:
+            index = self.idle.pop()
+            task = self.pending.popleft()
+            self.running[index] = task
+            self.jobs[index].put(task)
+
+    def __dispatch(self):
+        checked = time.time()
+        while True:
+            try:
+                event = self.events.get(timeout=POLL_INTERVAL)
+            except Empty:
+                event = ()
+            if event == None:
+                return
+
+            if len(event) > 0:
+                index, job, kind, payload = event
+                with self.lock:
+                    if kind == STARTED:
+                        self.started.add(job)
+                    elif kind in (READY, FINISHED, FAILED):
+                        self.running.pop(index, None)
+                        self.started.discard(job)
+                        self.idle.add(index)
+                        self.__assign()
+                    listener = self.listeners.get(job)
+                if listener != None:
+                    listener.put((kind, payload))
+
+            if time.time() - checked >= POLL_INTERVAL:
+                self.__replaceExitedWorkers()
+                checked = time.time()
+
+    def __replaceExitedWorkers(self):
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or self.closed:
+                continue
+
+            Log.err("Pool worker %d exited with code %s, starting another" % (index, process.exitcode))
+            listener = None
+            with self.lock:
+                self.idle.discard(index)
+                task = self.running.pop(index, None)
+                if task != None and task[0] in self.started:
+                    self.started.discard(task[0])
+                    listener = self.listeners.get(task[0])
+                elif task != None:
+                    self.pending.appendleft(task)
+                self.__startWorker(index)
+            if listener != None:
+                listener.put((FAILED, "The worker simulating the run exited with code %s" % process.exitcode))
+
+def runPoolWorker(index, options, jobs, events):
+    """Target of the worker processes of a WorkerPool. Warms up, then simulates the jobs taken until a None job.
+
+    Keyword arguments:
+    index -- Index of the worker in the pool.
+    options -- Every option of the configuration, to warm up with.
+    jobs -- Queue of the (job id, spec, every) of the jobs given to this worker.
+    events -- Queue to put the (worker index, job id, event, payload) of the jobs on.
+    """
+    try:
+        spec = (list(options) + WARM_UP_OPTIONS, 0, 0)
+        Program.MainProgram().simulateJob(configureJob(spec), 0)
+    except Exception:
+        Log.err("Pool worker %d failed to warm up:\n%s" % (index, traceback.format_exc()))
+    events.put((index, None, READY, None))
+
+    task = jobs.get()
+    while task != None:
+        job, spec, every = task
+        events.put((index, job, STARTED, None))
+        try:
+            settings = configureJob(spec)
+            results = ReportedResults(settings["iRunTime"], index, job, events, every)
+            Program.MainProgram().simulateJob(settings, spec[2], results)
+            # Sent as plain RunResults, as the events queue can't be pickled
+            events.put((index, job, FINISHED, RunResults(results.runTime, results.initCells, results.eCounts, results.immCounts, results.fociAreas)))
+        except Exception:
+            events.put((index, job, FAILED, traceback.format_exc()))
+        task = jobs.get()
+
+def parseSpec(body, options, seed):
+    """Gets the job of a run from the JSON body of a request.
+
+    Keyword arguments:
+    body -- Decoded JSON object, {"options": {section: {option: value}}, "seed": int, "run": int, "every": int}. Every
+            field is optional.
+    options -- Every option of the configuration of the service, as (section, option, value).
+    seed -- Seed of runs that don't give one.
+
+    Returns ((options, seed, run), every). Raises ValueError if the body isn't a valid run.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("A run must be a JSON object")
+
+    known = set((section, option) for section, option, value in options)
+    overrides = []
+    sections = body.get("options", {})
+    if not isinstance(sections, dict) or not all(isinstance(values, dict) for values in sections.values()):
+        raise ValueError("options must map sections to objects of options")
+    for section, values in sections.items():
+        for option, value in values.items():
+            if not (section, option) in known:
+                raise ValueError("Unknown option %s.%s" % (section, option))
+            overrides.append((str(section), str(option), str(value)))
+
+    fields = []
+    for name, default, lowerBound in (("seed", seed, None), ("run", 0, 0), ("every", 1, 1)):
+        value = body.get(name, default)
+        if not isinstance(value, (int, long)) or isinstance(value, bool) or (lowerBound != None and value < lowerBound):
+            raise ValueError("%s must be an integer%s" % (name, " >= %d" % lowerBound if lowerBound != None else ""))
+        fields.append(value)
+    seed, run, every = fields
+
+    return (list(options) + overrides, seed, run), every
+
+class ServiceServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server handling each request in its own thread."""
+    daemon_threads = True
+
+class ServiceRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handles the requests of a SimulationService.
+
+    POST /runs with a run, see parseSpec(), streams the events of the run as lines of JSON: queued, started, the
+    counters of every few timesteps, then either finished with every counter of the run or failed. GET /status gets
+    the status of the worker pool.
+    """
+
+    def do_GET(self):
+        if self.path == STATUS_PATH:
+            self.__sendJson(200, self.server.service.pool.status())
+        else:
+            self.__sendJson(404, {"error": "Unknown path %s" % self.path})
+
+    def do_POST(self):
+        if self.path != RUNS_PATH:
+            self.__sendJson(404, {"error": "Unknown path %s" % self.path})
+            return
+
+        service = self.server.service
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.getheader("Content-Length", 0))))
+            spec, every = parseSpec(body, service.options, service.seed)
+        except ValueError as e:
+            self.__sendJson(400, {"error": str(e)})
+            return
+
+        job, events = service.pool.submit(spec, every)
+        self.send_response(200)
+        self.send_header("Content-Type", STREAM_CONTENT_TYPE)
+        self.end_headers()
+        try:
+            self.__sendEvent({"event": "queued", "job": job})
+            self.__streamEvents(events, every)
+        except socket.error:
+            # The client has gone, the run carries on without being streamed
+            pass
+        finally:
+            service.pool.forget(job)
+
+    def __streamEvents(self, events, every):
+        reported = -1
+        while True:
+            kind, payload = events.get()
+            if kind == STARTED:
+                self.__sendEvent({"event": STARTED})
+            elif kind == TIMESTEP:
+                timesteps, eCounts, immCounts = payload
+                self.__sendTimestep(timesteps, eCounts, immCounts)
+                reported = timesteps
+            elif kind == FINISHED:
+                results = payload
+                # Timesteps filled in by fast forwarding weren't reported during the run
+                for timesteps in xrange(reported + 1, results.runTime + 1):
+                    if timesteps % every == 0:
+                        self.__sendTimestep(timesteps, results.eCounts[timesteps], results.immCounts[timesteps])
+                self.__sendEvent({"event": FINISHED, "initCells": results.initCells,
+                                  "outputs": dict((name, float(value)) for name, value in results.outputs().items()),
+                                  "eCounts": results.eCounts.tolist(), "immCounts": results.immCounts.tolist(),
+                                  "fociAreas": results.fociAreas.tolist()})
+                return
+            elif kind == FAILED:
+                self.__sendEvent({"event": FAILED, "error": payload})
+                return
+
+    def __sendTimestep(self, timesteps, eCounts, immCounts):
+        self.__sendEvent({"event": TIMESTEP, "timesteps": timesteps, "counters": vars(TimestepCounters(eCounts, immCounts))})
+
+    def __sendEvent(self, event):
+        self.wfile.write(json.dumps(event) + "\n")
+
+    def __sendJson(self, code, content):
+        text = json.dumps(content)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, format, *args):
+        # Requests aren't logged, the events of the runs go to the clients
+        pass
+
+class SimulationService(object):
+    """Long lived HTTP service simulating single runs on a pool of warm worker processes, streaming the counters of each
+    run back as it goes. Runs are configured as the config.ini file the service started with, with the options given by
+    the request in place of its values.
+    """
+
+    def __init__(self, address=(DEFAULT_HOST, DEFAULT_PORT), workers=None, options=None):
+        """Constructor for SimulationService, which starts the worker pool and listens for requests.
+
+        Keyword arguments:
+        address -- (host, port) to listen on. Port 0 picks a free port.
+        workers -- Number of worker processes, the number of CPUs by default.
+        options -- Every option of the configuration of the runs as (section, option, value), those of the config.ini
+                   file by default.
+        """
+        self.options = options if options != None else Config.ConfigReader().readOptions()
+        self.seed = int(dict(((section, option), value) for section, option, value in self.options).get(("Random", "iSeed"), -1))
+
+        self.pool = WorkerPool(workers if workers != None else multiprocessing.cpu_count(), self.options)
+        self.server = ServiceServer(address, ServiceRequestHandler)
+        self.server.service = self
+        self.address = self.server.server_address
+        self.thread = None
+
+    def start(self):
+        """Serves requests from another thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serveForever(self):
+        """Serves requests until interrupted."""
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    def close(self):
+        """Stops serving and stops the worker pool."""
+        if self.thread != None:
+            self.server.shutdown()
+            self.thread.join()
+        self.server.server_close()
+        self.pool.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve single runs over HTTP from a pool of warm worker processes.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="host to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of CPUs")
+    args = parser.parse_args(argv)
+
+    service = SimulationService((args.host, args.port), args.workers)
+    Log.out("Serving runs on http://%s:%d%s" % (service.address[0], service.address[1], RUNS_PATH))
+    service.serveForever()
+    service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from Tkinter import Tk, Canvas, PhotoImage
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+import numpy as np
 
 from Cells import EpithelialCell, ImmuneCell, EpithelialStates, ImmuneStates
 from Worldspace import Worldsite, Vector2d
@@ -17,12 +18,43 @@ TEMP_IMAGE_EXTENSION = ".PGM"
 CANVAS_TEXT_PADDING = 40
 CANVAS_TEXT_SIZE = 14
 
+EPITHELIAL_STATE_COLOURS = {EpithelialStates.HEALTHY: "#FCFEF5",
+                            EpithelialStates.CONTAINING: "#F9D423",
+                            EpithelialStates.EXPRESSING: "#FC913A",
+                            EpithelialStates.INFECTIOUS: "#C21A01",
+                            EpithelialStates.NATURAL_DEATH: "#000000",
+                            EpithelialStates.INFECTION_DEATH: "#000000"}
+IMMUNE_STATE_COLOURS = {ImmuneStates.VIRGIN: "#C0D860",
+                        ImmuneStates.MATURE: "#789048"}
+
+# Overview colours of a block of sites
+OVERVIEW_MAJORITY = "majority" # Colour of the most common site colour
+OVERVIEW_BLEND = "blend" # Site colours blended by the fraction of sites showing them
+OVERVIEW_MODES = [OVERVIEW_MAJORITY, OVERVIEW_BLEND]
+
+# Site colours counted by overviewColours, after the epithelial states. Immune cells are drawn over the epithelial cell.
+VIRGIN_CATEGORY = len(EPITHELIAL_STATE_COLOURS)
+MATURE_CATEGORY = VIRGIN_CATEGORY + 1
+
+# Most sites counted at once by overviewColours, which bounds its temporary arrays on huge grids
+OVERVIEW_BAND_SITES = 1 << 22
+
 class SimVis(object):
     """Defines the visualisation aspects of the program. Draws and updates all visuals."""
 
     SNAPSHOT_ENABLED = ENABLED = DEBUG_ID_ENABLED = HIGHLIGHT_COLLISIONS = SQUARESIZE = SNAPSHOT_HEIGHT = SNAPSHOT_WIDTH = None
+    OVERVIEW_ENABLED = OVERVIEW_SIZE = OVERVIEW_MODE = SEPARATE_PROCESS = None
 
-    def __init__(self, width, height, squareSize):
+    def __init__(self, width, height, squareSize, blockSize=1):
+        """Constructor for SimVis
+
+        Keyword arguments:
+        width -- Width of the drawn world, in squares.
+        height -- Height of the drawn world, in squares.
+        squareSize -- Size of a square in pixels.
+        blockSize -- Sites along each side of the block of the grids drawn as one square, see overviewLayout(). Blocks
+                     are only drawn by drawGrids.
+        """
 
         self.simRootPath = ""
         self.setSimRootPath(SimUtils.getRootPath())
@@ -34,6 +66,7 @@ class SimVis(object):
 
         self.width = width
         self.height = height
+        self.blockSize = blockSize
 
         self.root = Tk()
         self.squareSize = squareSize
@@ -43,7 +76,7 @@ class SimVis(object):
         self.canvas = Canvas(self.root, width=self.CANVAS_WIDTH, height=self.CANVAS_HEIGHT, bg='white')
         self.canvas.pack()
 
-        self.timeFont = ImageFont.truetype("Arialbd.ttf", CANVAS_TEXT_SIZE)
+        self.timeFont = loadTimeFont()
         self.time = 0.0
         self.timeMeasurement = "timesteps"
         self.timeStepsInMeasurement = 1
@@ -54,6 +87,7 @@ class SimVis(object):
         self.root.geometry(str(self.CANVAS_WIDTH)+"x"+str(self.CANVAS_HEIGHT))
 
         self.world = None
+        self.overlaidCells = []
 
         self.white = (255, 255, 255)
         # PIL image can be saved as .png .jpg .gif or .bmp file (among others)
@@ -64,6 +98,9 @@ class SimVis(object):
         self.image = Image.new("RGB", (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), self.white)
         self.draw = ImageDraw.Draw(self.image)
 
+        self.overviewPalette = sitePalette()
+        self.epithelialPalette = self.overviewPalette[:VIRGIN_CATEGORY]
+
     def __updateSimRunFolder(self) :
         if self.simRun > 0 :
             self.simRunFolder = SIM_RUN_DIR_PREFIX + str(self.simRun) + "/"
@@ -87,6 +124,7 @@ class SimVis(object):
     def init(self, world, run=0) :
         self.canvas.delete("all")
         self.world = world
+        self.overlaidCells = []
         self.setSimRun(run)
 
     def display(self):
@@ -112,23 +150,8 @@ class SimVis(object):
         x = eCell.location.x
         y = eCell.location.y
 
-        color = None
-
-        if(eCell.State == EpithelialStates.HEALTHY) :
-            color = "#FCFEF5"
-
-        elif(eCell.State == EpithelialStates.CONTAINING):
-            color = "#F9D423"
-
-        elif(eCell.State == EpithelialStates.EXPRESSING):
-            color = "#FC913A"
-
-        elif(eCell.State == EpithelialStates.INFECTIOUS):
-            color = "#C21A01"
-
-        elif(eCell.State == EpithelialStates.NATURAL_DEATH or eCell.State == EpithelialStates.INFECTION_DEATH):
-            color = "#000000"
-        else:
+        color = EPITHELIAL_STATE_COLOURS.get(eCell.State)
+        if color == None:
              raise AttributeError('Illegal Epithelial Cell State')
 
         self.drawSquare(x, y, color)
@@ -141,36 +164,72 @@ class SimVis(object):
                 else:
                     self.__focusDebugDraw(x * self.squareSize, y * self.squareSize, eCell.focusId, "#000000")
             
-    def drawSimWorld(self, save, timesteps):
+    # Draw a site, immune cells are drawn over the epithelial cell with mature cells taking precedence
+    def drawSite(self, site):
+        immCells = site.getImmCells()
+        if len(immCells) > 0 :
+            for immCell in immCells :
+                if immCell.State == ImmuneStates.MATURE :
+                    self.drawImmCell(immCell)
+                    return
+            self.drawImmCell(immCell)
+            return
+
+        self.drawEpiCell(site.getECell())
+
+    def drawSimWorld(self, save, timesteps, changed=None):
+        """Draws the world and updates the canvas.
+
+        Keyword arguments:
+        save -- Save the frame to the run's image folder.
+        timesteps -- Current timestep, used for the time text.
+        changed -- Cells or sites that changed since the last frame. Only these are redrawn, if None the whole world is redrawn.
+        """
         if self.width == 0 and self.height == 0 :
             return
 
         #self.image = Image.new("RGB", (self.CANVAS_WIDTH, self.CANVAS_HEIGHT), self.white)
         #self.draw = ImageDraw.Draw(self.image)
 
-        for x in xrange(0, self.width) :
-            for y in xrange(0, self.height) :
-                site = self.world[x][y]
-
-                drawImmCell = False
-                immCells = site.getImmCells()
-                if len(immCells) > 0 :
-                    mature = False
-                    for immCell in immCells :
-                        if immCell.State == ImmuneStates.MATURE :
-                            self.drawImmCell(immCell)
-                            drawImmCell = True
-                            mature = True
-                            break
-                    if mature == False :
-                        self.drawImmCell(immCell)
-                        drawImmCell = True
-
-
-                if drawImmCell == False :
-                    eCell = site.getECell()
-                    self.drawEpiCell(eCell)
+        if changed == None :
+            for x in xrange(0, self.width) :
+                for y in xrange(0, self.height) :
+                    self.drawSite(self.world[x][y])
+        else :
+            self.__drawChanged(changed)
+            self.__drawChanged(self.overlaidCells)
+        del self.overlaidCells[:]
+
+        self.__finishFrame(save, timesteps)
+
+    def drawGrids(self, stateGrid, virginGrid, matureGrid, save, timesteps):
+        """Draws the world from state arrays instead of Worldsites, as used by the array backend and overviews, and updates
+        the canvas. With a block size above 1, each block of sites is drawn as one square, coloured by OVERVIEW_MODE.
+
+        Keyword arguments:
+        stateGrid -- (width, height) array of epithelial states.
+        virginGrid -- (width, height) array of virgin immune cell counts.
+        matureGrid -- (width, height) array of mature immune cell counts, drawn over virgin cells.
+        save -- Save the frame to the run's image folder.
+        timesteps -- Current timestep, used for the time text.
+        """
+        if self.width == 0 and self.height == 0 :
+            return
+
+        if self.blockSize > 1:
+            colours = overviewColours(stateGrid, virginGrid, matureGrid, self.blockSize, self.overviewPalette, SimVis.OVERVIEW_MODE)
+        else:
+            colours = self.epithelialPalette[stateGrid[:self.width, :self.height]]
+            colours[virginGrid[:self.width, :self.height] > 0] = self.overviewPalette[VIRGIN_CATEGORY]
+            colours[matureGrid[:self.width, :self.height] > 0] = self.overviewPalette[MATURE_CATEGORY]
+
+        # Grids are indexed [x, y], images [y, x]
+        pixels = colours.transpose(1, 0, 2).repeat(self.squareSize, axis=0).repeat(self.squareSize, axis=1)
+        self.image.paste(Image.fromarray(pixels, "RGB"), (0, 0))
 
+        self.__finishFrame(save, timesteps)
+
+    def __finishFrame(self, save, timesteps):
         self.time = round(timesteps / self.timeStepsInMeasurement, 1)
         self.__updateTimeText()
 
@@ -188,26 +247,27 @@ class SimVis(object):
         #del self.draw
         #del self.image
 
+    def __drawChanged(self, changed):
+        for cell in changed :
+            x = cell.location.x
+            y = cell.location.y
+            if x < self.width and y < self.height :
+                self.drawSite(self.world[x][y])
+
     def drawImmCell(self, immCell):
 
         x = immCell.location.x
         y = immCell.location.y
 
-        color = None
-
-        if(immCell.State == ImmuneStates.VIRGIN) :
-            color = "#C0D860"
-
-        elif(immCell.State == ImmuneStates.MATURE):
-            color = "#789048"
-
-        else:
+        color = IMMUNE_STATE_COLOURS.get(immCell.State)
+        if color == None:
             raise AttributeError('Illegal Immune Cell State')
 
         self.drawSquare(x, y, color)
 
     def drawCollision(self, cell):
         self.drawSquare(cell.location.x, cell.location.y, "#5078F0")
+        self.overlaidCells.append(cell) # redrawn with its real colour on the next frame
         if SimVis.DEBUG_ID_ENABLED:
             self.__focusDebugDraw(cell.location.x * self.squareSize, cell.location.y * self.squareSize, str(cell.focusId), "#000000")
 
@@ -256,9 +316,95 @@ class SimVis(object):
     @staticmethod
     def Configure(settings):
         SimVis.ENABLED              = settings["bIsEnabled"]
+        SimVis.OVERVIEW_ENABLED     = settings["bOverviewEnabled"]
+        SimVis.OVERVIEW_SIZE        = settings["iOverviewSize"]
+        SimVis.OVERVIEW_MODE        = settings["sOverviewMode"]
+        SimVis.SEPARATE_PROCESS     = settings["bSeparateProcess"]
         SimVis.SNAPSHOT_ENABLED     = settings["bSnapshotEnabled"]
         SimVis.SNAPSHOT_HEIGHT      = settings["iSnapshotHeight"]
         SimVis.SNAPSHOT_WIDTH       = settings["iSnapshotWidth"]
         SimVis.SQUARESIZE           = settings["iSquareSize"]
         SimVis.DEBUG_ID_ENABLED     = settings["bDebugFocusIdEnabled"]
         SimVis.HIGHLIGHT_COLLISIONS = settings["bHighlightCollisions"]
+
+def sitePalette():
+    """Gets the colours of sites, as counted by overviewColours.
+
+    Returns (MATURE_CATEGORY + 1, 3) uint8 numpy array of the RGB colour of each epithelial state, then virgin and mature
+    immune cells.
+    """
+    palette = np.zeros((MATURE_CATEGORY + 1, 3), dtype=np.uint8)
+    for state, colour in EPITHELIAL_STATE_COLOURS.items():
+        palette[state] = ImageColor.getrgb(colour)
+    palette[VIRGIN_CATEGORY] = ImageColor.getrgb(IMMUNE_STATE_COLOURS[ImmuneStates.VIRGIN])
+    palette[MATURE_CATEGORY] = ImageColor.getrgb(IMMUNE_STATE_COLOURS[ImmuneStates.MATURE])
+    return palette
+
+def loadTimeFont():
+    """Loads the font of the time text, falling back to the PIL default font where Arial isn't installed."""
+    try:
+        return ImageFont.truetype("Arialbd.ttf", CANVAS_TEXT_SIZE)
+    except IOError:
+        return ImageFont.load_default()
+
+def overviewLayout(width, height, size, squareSize):
+    """Gets how to draw a whole grid within a square of pixels, drawing blocks of sites as one square if the grid has
+    more sites along a side than there are pixels.
+
+    Keyword arguments:
+    width -- Width of the grid, in sites.
+    height -- Height of the grid, in sites.
+    size -- Most pixels along each side of the drawn grid.
+    squareSize -- Largest size of a square in pixels.
+
+    Returns (block size, width in blocks, height in blocks, square size).
+    """
+    blockSize = max(1, -(-max(width, height) // size))
+    blocksWide = -(-width // blockSize)
+    blocksHigh = -(-height // blockSize)
+    return blockSize, blocksWide, blocksHigh, max(1, min(squareSize, size // max(blocksWide, blocksHigh)))
+
+def overviewColours(stateGrid, virginGrid, matureGrid, blockSize, palette, mode):
+    """Colours each blockSize x blockSize block of sites of the grids as one pixel. The blocks at the far edges of a grid
+    whose size isn't a multiple of blockSize hold the sites left over.
+
+    The sites of each block are counted by colour with array reductions over bands of the grids, so that the time taken
+    is proportional to the number of sites, and the memory used to the number of blocks.
+
+    Keyword arguments:
+    stateGrid -- (width, height) array of epithelial states.
+    virginGrid -- (width, height) array of virgin immune cell counts.
+    matureGrid -- (width, height) array of mature immune cell counts, drawn over virgin cells.
+    blockSize -- Sites along each side of a block.
+    palette -- (MATURE_CATEGORY + 1, 3) uint8 array of the RGB colour of each epithelial state, then virgin and mature
+               immune cells.
+    mode -- OVERVIEW_MAJORITY or OVERVIEW_BLEND.
+
+    Returns (width in blocks, height in blocks, 3) uint8 array of RGB colours.
+    """
+    width, height = stateGrid.shape
+    blocksWide = -(-width // blockSize)
+    blocksHigh = -(-height // blockSize)
+    categoryCount = len(palette)
+
+    counts = np.zeros((blocksWide, blocksHigh, categoryCount), dtype=np.int64)
+    blockRows = max(1, OVERVIEW_BAND_SITES // (blockSize * blockSize * blocksHigh))
+    yBlocks = np.arange(height) // blockSize
+    for bx in xrange(0, blocksWide, blockRows):
+        x0 = bx * blockSize
+        x1 = min(width, (bx + blockRows) * blockSize)
+        bandBlocks = -(-(x1 - x0) // blockSize)
+
+        categories = np.array(stateGrid[x0:x1], dtype=np.int64)
+        categories[virginGrid[x0:x1] > 0] = VIRGIN_CATEGORY
+        categories[matureGrid[x0:x1] > 0] = MATURE_CATEGORY
+
+        # Each site is counted in the bin of its block and category
+        xBlocks = np.arange(x1 - x0) // blockSize
+        bins = (xBlocks[:, np.newaxis] * blocksHigh + yBlocks[np.newaxis, :]) * categoryCount + categories
+        counts[bx:bx + bandBlocks] = np.bincount(bins.ravel(), minlength=bandBlocks * blocksHigh * categoryCount).reshape(bandBlocks, blocksHigh, categoryCount)
+
+    if mode == OVERVIEW_MAJORITY:
+        return palette[counts.argmax(axis=2)]
+    blended = counts.dot(palette.astype(np.float64)) / counts.sum(axis=2)[:, :, np.newaxis]
+    return np.round(blended).astype(np.uint8)
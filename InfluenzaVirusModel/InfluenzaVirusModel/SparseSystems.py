@@ -0,0 +1,590 @@
+import numpy as np
+
+import Kernels
+import Systems
+import Worldspace
+from ArraySystems import ArrayImmuneSystem, EPITHELIAL_STATE_COUNT
+from Cells import EpithelialCell, ImmuneCell, EpithelialStates
+
+INITIAL_SLOT_CAPACITY = 16
+
+class SparseEpithelialSystem(Systems.EpithelialSystem):
+    """EpithelialSystem over a lattice of CHUNK_SIZE x CHUNK_SIZE chunks, of which only the chunks that infection has
+    reached are held in memory and stepped.
+
+    Until then a chunk is pristine. Its cells are healthy, with the ages of a template chunk shared by every chunk
+    shifted by a birth time offset drawn for the chunk, and they only age and die of old age. A pristine chunk needs no
+    storage, and the natural deaths of pristine cells are counted each step from a histogram of their ages. A chunk is
+    materialised, copy on write, into a slot of flat arrays laid out as in Kernels.sparseIndex once a neighbouring chunk
+    holds an infected cell, so it is in memory before infection can spread into it. Immune cells only encounter
+    infected cells, so they never touch a pristine chunk. With regeneration, dead cells roll to regrow every step, so
+    chunks are also materialised before the first natural death of their cells.
+
+    Memory and step time then follow the area infection has reached rather than GRID_WIDTH * GRID_HEIGHT, as long as
+    regeneration is disabled or the cells don't die of old age during the run. Cells in different chunks share the ages
+    of the template, so ages are less independent than on the other backends.
+    """
+
+    ENABLED = CHUNK_SIZE = None
+
+    def __init__(self, rng=None):
+        """Constructor for SparseEpithelialSystem
+
+        Keyword arguments
+        rng -- numpy RandomState to draw from, a new unseeded one by default.
+        """
+        Systems.EpithelialSystem.__init__(self, None)
+
+        self.rng = rng if rng != None else np.random.RandomState()
+        self.size = Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT
+        self.chunkSize = SparseEpithelialSystem.CHUNK_SIZE
+        self.chunkCells = self.chunkSize * self.chunkSize
+        self.chunksX = (Worldspace.GRID_WIDTH + self.chunkSize - 1) / self.chunkSize
+        self.chunksY = (Worldspace.GRID_HEIGHT + self.chunkSize - 1) / self.chunkSize
+
+        # Coordinates of each cell of a chunk within the chunk
+        self.localX = np.arange(self.chunkCells) / self.chunkSize
+        self.localY = np.arange(self.chunkCells) % self.chunkSize
+
+        self.slots        = np.full((self.chunksX, self.chunksY), Kernels.NO_SLOT, dtype=np.int32)
+        self.slotCount    = 0
+        self.slotX        = np.zeros(INITIAL_SLOT_CAPACITY, dtype=np.int32)
+        self.slotY        = np.zeros(INITIAL_SLOT_CAPACITY, dtype=np.int32)
+        self.slotInfected = np.zeros(INITIAL_SLOT_CAPACITY, dtype=np.uint8)
+        self.haloDone     = np.zeros(INITIAL_SLOT_CAPACITY, dtype=bool)
+
+        cells = INITIAL_SLOT_CAPACITY * self.chunkCells
+        self.state        = np.zeros(cells, dtype=np.uint8)
+        self.nextState    = np.zeros(cells, dtype=np.uint8)
+        self.age          = np.zeros(cells, dtype=np.int32)
+        self.delay        = np.zeros(cells, dtype=np.int32)
+        self.timeInfected = np.zeros(cells, dtype=np.int32)
+        self.canInfect    = np.zeros(cells, dtype=np.uint8)
+        self.focusId      = np.zeros(cells, dtype=np.int32)
+        self.counts       = np.zeros(EPITHELIAL_STATE_COUNT, dtype=np.int64)
+
+        # Number of updates done, pristine cells being their initial age plus this until they die
+        self.steps = 0
+
+    def initialise(self):
+        """Draws the template ages and birth time offsets, then infects randomly chosen cells for the initial infected
+        count, materialising their chunks."""
+
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        if SparseEpithelialSystem.RANDOM_AGE:
+            self.templateAges = self.rng.randint(0, lifespan + 1, self.chunkCells).astype(np.int32)
+            self.offsets = self.rng.randint(0, lifespan + 1, (self.chunksX, self.chunksY)).astype(np.int32)
+        else:
+            self.templateAges = np.zeros(self.chunkCells, dtype=np.int32)
+            self.offsets = np.zeros((self.chunksX, self.chunksY), dtype=np.int32)
+
+        self.pristineAges = self.__pristineAgeCounts()
+        if SparseEpithelialSystem.REGEN_ENABLED:
+            firstDeaths = self.__firstDeaths().ravel()
+            self.deathOrder = np.argsort(firstDeaths, kind='mergesort')
+            self.firstDeaths = firstDeaths[self.deathOrder]
+            self.nextDeath = 0
+
+        self._seedInfection()
+
+    def _seedInfection(self):
+        """Infects randomly chosen cells for the initial infected count, materialising their chunks."""
+
+        initialInfected = int(self.size * self.INFECT_INIT) if int(self.size * self.INFECT_INIT) > 1 else 1
+        self.initialInfected = initialInfected
+
+        # Sampled by rejection, as a permutation of every site would be as large as the grid
+        sites = set()
+        while len(sites) < initialInfected:
+            sites.update(self.rng.randint(0, self.size, initialInfected - len(sites)).tolist())
+        sites = np.array(sorted(sites), dtype=np.int64)
+        chunkX = sites / Worldspace.GRID_HEIGHT / self.chunkSize
+        chunkY = sites % Worldspace.GRID_HEIGHT / self.chunkSize
+        for x, y in sorted(set(zip(chunkX.tolist(), chunkY.tolist()))):
+            self._materialise(x, y)
+
+        slots = self.slots[chunkX, chunkY]
+        infected = (slots.astype(np.int64) * self.chunkCells + (sites / Worldspace.GRID_HEIGHT % self.chunkSize) * self.chunkSize +
+                    sites % Worldspace.GRID_HEIGHT % self.chunkSize)
+        self.state[infected] = EpithelialStates.CONTAINING
+        self.nextState[infected] = EpithelialStates.CONTAINING
+        self.focusId[infected] = np.arange(initialInfected, dtype=np.int32)
+        self.slotInfected[slots] = 1
+
+        self.counts[EpithelialStates.HEALTHY] = self.size - initialInfected
+        self.counts[EpithelialStates.CONTAINING] = initialInfected
+        self._updateCounters()
+
+    def update(self):
+        """Materialises the chunks infection or regeneration is about to reach, then runs the age, regeneration and
+        infection steps over every materialised cell."""
+
+        if SparseEpithelialSystem.REGEN_ENABLED:
+            while self.nextDeath < len(self.firstDeaths) and self.firstDeaths[self.nextDeath] <= self.steps + 1:
+                x, y = divmod(int(self.deathOrder[self.nextDeath]), self.chunksY)
+                if self.slots[x, y] == Kernels.NO_SLOT:
+                    self._materialise(x, y)
+                self.nextDeath += 1
+        self.__materialiseHalos()
+
+        dead = self.counts[EpithelialStates.INFECTION_DEATH] + self.counts[EpithelialStates.NATURAL_DEATH]
+        regenChance = 1.0
+        if dead != 0:
+            regenChance = float(self.counts[EpithelialStates.HEALTHY]) / dead * 1.0 / EpithelialCell.DIVISION_TIME
+        infectChance = float((1 / SparseEpithelialSystem.MAX_NEIGHBOURS) * (EpithelialCell.INFECT_RATE / Systems.ImmuneSystem.FLOW_RATE))
+
+        # Upper bound on the random numbers the kernel can consume this step, see ArrayEpithelialSystem.update
+        draws = Kernels.MAX_NEIGHBOURS * min(self.counts[EpithelialStates.INFECTIOUS], self.counts[EpithelialStates.HEALTHY])
+        if SparseEpithelialSystem.REGEN_ENABLED:
+            draws += dead
+        rand = self.rng.random_sample(draws)
+
+        Kernels.sparseEpithelialUpdate(self.state, self.nextState, self.age, self.delay, self.timeInfected, self.canInfect, self.focusId,
+                                       self.slots, self.slotX, self.slotY, self.slotCount, self.chunkSize,
+                                       Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL),
+                                       EpithelialCell.CELL_LIFESPAN, EpithelialCell.INFECT_LIFESPAN, EpithelialCell.EXPRESS_DELAY,
+                                       EpithelialCell.INFECT_DELAY, bool(SparseEpithelialSystem.REGEN_ENABLED), regenChance,
+                                       infectChance, rand, 0)
+
+    def synchronise(self):
+        """Sets the state of the materialised cells for next iteration, and counts the natural deaths of the pristine
+        cells. Updates the internal count of cell states."""
+
+        Kernels.sparseEpithelialSynchronise(self.state, self.nextState, self.counts, self.slotInfected, self.slotCount, self.chunkSize)
+        self.steps += 1
+
+        deaths = self.__pristineDeaths(self.steps)
+        self.counts[EpithelialStates.HEALTHY] -= deaths
+        self.counts[EpithelialStates.NATURAL_DEATH] += deaths
+        self._updateCounters()
+
+    def stateGrid(self):
+        """Gets the current state of every epithelial cell. The grid is built in full, so this only suits grids that
+        fit in memory, for drawing and recording.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) uint8 numpy array.
+        """
+        size = self.chunkSize
+        ages = (np.tile(self.templateAges.reshape(size, size), (self.chunksX, self.chunksY)) +
+                np.repeat(np.repeat(self.offsets, size, axis=0), size, axis=1)) % (EpithelialCell.CELL_LIFESPAN + 1)
+        grid = np.full(ages.shape, EpithelialStates.HEALTHY, dtype=np.uint8)
+        if self.steps > 0:
+            grid[ages + self.steps >= EpithelialCell.CELL_LIFESPAN] = EpithelialStates.NATURAL_DEATH
+
+        for k in xrange(self.slotCount):
+            x = self.slotX[k] * size
+            y = self.slotY[k] * size
+            grid[x:x + size, y:y + size] = self.state[k * self.chunkCells:(k + 1) * self.chunkCells].reshape(size, size)
+        return grid[:Worldspace.GRID_WIDTH, :Worldspace.GRID_HEIGHT]
+
+    def healthyAgeCounts(self):
+        """Gets the number of healthy epithelial cells of each age, without listing the pristine cells one by one.
+
+        Returns int numpy array indexed by age, of length CELL_LIFESPAN + 1.
+        """
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        counts = np.zeros(lifespan + 1, dtype=np.int64)
+        if self.steps == 0:
+            counts += self.pristineAges
+        elif self.steps < lifespan:
+            counts[self.steps:lifespan] += self.pristineAges[:lifespan - self.steps]
+
+        cells = self.slotCount * self.chunkCells
+        ages = self.age[:cells][self.state[:cells] == EpithelialStates.HEALTHY]
+        counts += np.bincount(np.clip(ages, 0, lifespan), minlength=lifespan + 1)
+        return counts
+
+    def materialisedChunks(self):
+        """Gets the number of chunks held in memory."""
+        return self.slotCount
+
+    def __chunkAges(self, x, y):
+        """Gets the initial ages of the cells of a chunk, with whether each cell is within the grid.
+
+        Keyword arguments
+        x, y -- Coordinates of the chunk.
+        """
+        ages = (self.templateAges + self.offsets[x, y]) % (EpithelialCell.CELL_LIFESPAN + 1)
+        valid = ((x * self.chunkSize + self.localX < Worldspace.GRID_WIDTH) &
+                 (y * self.chunkSize + self.localY < Worldspace.GRID_HEIGHT))
+        return ages, valid
+
+    def __edgeChunks(self):
+        """Gets the coordinates of the chunks that run past the edge of the grid."""
+        fullX = Worldspace.GRID_WIDTH / self.chunkSize
+        fullY = Worldspace.GRID_HEIGHT / self.chunkSize
+        return ([(x, y) for x in xrange(fullX, self.chunksX) for y in xrange(self.chunksY)] +
+                [(x, y) for x in xrange(fullX) for y in xrange(fullY, self.chunksY)])
+
+    def __pristineAgeCounts(self):
+        """Counts the cells of the whole grid by initial age, chunks within the grid grouped by birth time offset."""
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        template = np.bincount(self.templateAges, minlength=lifespan + 1).astype(np.int64)
+
+        fullX = Worldspace.GRID_WIDTH / self.chunkSize
+        fullY = Worldspace.GRID_HEIGHT / self.chunkSize
+        offsetCounts = np.bincount(self.offsets[:fullX, :fullY].ravel(), minlength=lifespan + 1)
+
+        counts = np.zeros(lifespan + 1, dtype=np.int64)
+        for offset in np.nonzero(offsetCounts)[0]:
+            counts += offsetCounts[offset] * np.roll(template, offset)
+        for x, y in self.__edgeChunks():
+            ages, valid = self.__chunkAges(x, y)
+            counts += np.bincount(ages[valid], minlength=lifespan + 1)
+        return counts
+
+    def __firstDeaths(self):
+        """Gets the update on which the oldest cell of each chunk would die of old age.
+
+        Returns (chunksX, chunksY) int numpy array.
+        """
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        values = np.unique(self.templateAges)
+
+        # The oldest cell is the largest template age that the offset doesn't wrap past the lifespan, if there is one
+        index = np.searchsorted(values, lifespan + 1 - self.offsets) - 1
+        oldest = np.where(index >= 0, values[np.maximum(index, 0)] + self.offsets, values[-1] + self.offsets - (lifespan + 1))
+        for x, y in self.__edgeChunks():
+            ages, valid = self.__chunkAges(x, y)
+            oldest[x, y] = ages[valid].max()
+        return np.maximum(lifespan - oldest, 1)
+
+    def __pristineDeaths(self, step):
+        """Gets the number of pristine cells dying of old age on an update. A cell of initial age a dies on update
+        CELL_LIFESPAN - a, or on the first update if it starts at the lifespan."""
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        deaths = self.pristineAges[lifespan - step] if step <= lifespan else 0
+        if step == 1:
+            deaths += self.pristineAges[lifespan]
+        return int(deaths)
+
+    def __materialiseHalos(self):
+        """Materialises every chunk next to a chunk holding infected cells."""
+        for k in np.nonzero(self.slotInfected[:self.slotCount] & ~self.haloDone[:self.slotCount])[0]:
+            self.haloDone[k] = True
+            for dx in xrange(-1, 2):
+                x = self.slotX[k] + dx
+                if x < 0 or x >= self.chunksX:
+                    if not Worldspace.ISTOROIDAL:
+                        continue
+                    x %= self.chunksX
+                for dy in xrange(-1, 2):
+                    y = self.slotY[k] + dy
+                    if y < 0 or y >= self.chunksY:
+                        if not Worldspace.ISTOROIDAL:
+                            continue
+                        y %= self.chunksY
+                    if self.slots[x, y] == Kernels.NO_SLOT:
+                        self._materialise(x, y)
+
+    def _materialise(self, x, y):
+        """Copies the pristine cells of a chunk into the next slot, in their state after the updates done so far.
+
+        Keyword arguments
+        x, y -- Coordinates of the chunk.
+        """
+        k = self.addSlot(x, y)
+        ages, valid = self.__chunkAges(x, y)
+        self.pristineAges -= np.bincount(ages[valid], minlength=EpithelialCell.CELL_LIFESPAN + 1)
+
+        # Cells past the edge of the grid are never stepped, and are left dead so that they don't count as healthy
+        dead = ~valid
+        if self.steps > 0:
+            dead |= ages + self.steps >= EpithelialCell.CELL_LIFESPAN
+
+        cells = slice(k * self.chunkCells, (k + 1) * self.chunkCells)
+        self.state[cells]        = np.where(dead, EpithelialStates.NATURAL_DEATH, EpithelialStates.HEALTHY)
+        self.nextState[cells]    = self.state[cells]
+        self.age[cells]          = np.where(dead, 0, ages + self.steps)
+        self.delay[cells]        = 0
+        self.timeInfected[cells] = 0
+        self.canInfect[cells]    = 1
+        self.focusId[cells]      = Kernels.NO_FOCUS
+
+    def addSlot(self, x, y):
+        """Gives a chunk the next slot, leaving its cells to be filled in.
+
+        Keyword arguments
+        x, y -- Coordinates of the chunk.
+
+        Returns the slot.
+        """
+        if self.slotCount == len(self.slotX):
+            self.__grow()
+
+        k = self.slotCount
+        self.slotCount += 1
+        self.slots[x, y] = k
+        self.slotX[k] = x
+        self.slotY[k] = y
+        self.slotInfected[k] = 0
+        self.haloDone[k] = False
+        return k
+
+    def __grow(self):
+        """Doubles the number of slots."""
+        capacity = 2 * len(self.slotX)
+        for name in ["slotX", "slotY", "slotInfected", "haloDone"]:
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.slotCount] = array[:self.slotCount]
+            setattr(self, name, grown)
+
+        cells = self.slotCount * self.chunkCells
+        for name in ["state", "nextState", "age", "delay", "timeInfected", "canInfect", "focusId"]:
+            array = getattr(self, name)
+            grown = np.zeros(capacity * self.chunkCells, dtype=array.dtype)
+            grown[:cells] = array[:cells]
+            setattr(self, name, grown)
+
+    def _updateCounters(self):
+        self.healthyCount        = int(self.counts[EpithelialStates.HEALTHY])
+        self.containingCount     = int(self.counts[EpithelialStates.CONTAINING])
+        self.expressingCount     = int(self.counts[EpithelialStates.EXPRESSING])
+        self.infectiousCount     = int(self.counts[EpithelialStates.INFECTIOUS])
+        self.naturalDeathCount   = int(self.counts[EpithelialStates.NATURAL_DEATH])
+        self.infectionDeathCount = int(self.counts[EpithelialStates.INFECTION_DEATH])
+        self.avgFociArea         = float(self.infectionDeathCount) / self.initialInfected
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the SparseEpithelialSystem class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        SparseEpithelialSystem.ENABLED    = settings["bIsEnabled"]
+        SparseEpithelialSystem.CHUNK_SIZE = settings["iChunkSize"]
+
+class HybridEpithelialSystem(SparseEpithelialSystem):
+    """SparseEpithelialSystem whose chunks far from infection are held as one aggregate of cells rather than as pristine
+    chunks, so that they regenerate without being materialised.
+
+    Far from infection, cells only age, die of old age and regenerate, each independently of its neighbours. The cells of
+    the chunks that aren't materialised are then interchangeable, and are held as the number of healthy cells of each
+    age and the number of dead cells. The aggregate is stepped as a whole: healthy cells age, those reaching the lifespan
+    die, and a binomial draw of the dead cells regenerate with the regeneration chance of the step. Its counters follow
+    the same distribution as on the other backends, though not draw for draw.
+
+    Chunks within FRONT_DISTANCE sites of a chunk holding infected cells are materialised before infection can reach
+    them, their cells being drawn uniformly from the aggregate, so ages are as independent as on the other backends.
+    Immune cells only encounter infected cells, so chunks aren't materialised for them.
+    """
+
+    ENABLED = FRONT_DISTANCE = None
+
+    def __init__(self, rng=None):
+        """Constructor for HybridEpithelialSystem
+
+        Keyword arguments
+        rng -- numpy RandomState to draw from, a new unseeded one by default.
+        """
+        SparseEpithelialSystem.__init__(self, rng)
+
+        # Chunks materialised on each side of a chunk holding infected cells, covering FRONT_DISTANCE sites from any of its cells
+        self.radius = max(1, -(-HybridEpithelialSystem.FRONT_DISTANCE // self.chunkSize))
+
+        self.aggregateAges = np.zeros(EpithelialCell.CELL_LIFESPAN + 1, dtype=np.int64)
+        self.aggregateDead = 0
+        self.regenChance = 1.0
+
+    def initialise(self):
+        """Draws the ages of the aggregate, then infects randomly chosen cells for the initial infected count,
+        materialising their chunks."""
+
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        if HybridEpithelialSystem.RANDOM_AGE:
+            self.aggregateAges = self.rng.multinomial(self.size, [1.0 / (lifespan + 1)] * (lifespan + 1)).astype(np.int64)
+        else:
+            self.aggregateAges[0] = self.size
+
+        self._seedInfection()
+
+    def update(self):
+        """Materialises the chunks about to come within FRONT_DISTANCE of infection, then runs the age, regeneration and
+        infection steps over every materialised cell. The aggregate is stepped on synchronise."""
+
+        self.__materialiseFront()
+
+        dead = self.counts[EpithelialStates.INFECTION_DEATH] + self.counts[EpithelialStates.NATURAL_DEATH]
+        self.regenChance = 1.0
+        if dead != 0:
+            self.regenChance = float(self.counts[EpithelialStates.HEALTHY]) / dead * 1.0 / EpithelialCell.DIVISION_TIME
+        infectChance = float((1 / HybridEpithelialSystem.MAX_NEIGHBOURS) * (EpithelialCell.INFECT_RATE / Systems.ImmuneSystem.FLOW_RATE))
+
+        # Upper bound on the random numbers the kernel can consume this step, only materialised dead cells rolling to regrow
+        draws = Kernels.MAX_NEIGHBOURS * min(self.counts[EpithelialStates.INFECTIOUS], self.counts[EpithelialStates.HEALTHY])
+        if HybridEpithelialSystem.REGEN_ENABLED:
+            draws += dead - self.aggregateDead
+        rand = self.rng.random_sample(draws)
+
+        Kernels.sparseEpithelialUpdate(self.state, self.nextState, self.age, self.delay, self.timeInfected, self.canInfect, self.focusId,
+                                       self.slots, self.slotX, self.slotY, self.slotCount, self.chunkSize,
+                                       Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL),
+                                       EpithelialCell.CELL_LIFESPAN, EpithelialCell.INFECT_LIFESPAN, EpithelialCell.EXPRESS_DELAY,
+                                       EpithelialCell.INFECT_DELAY, bool(HybridEpithelialSystem.REGEN_ENABLED), self.regenChance,
+                                       infectChance, rand, 0)
+
+    def synchronise(self):
+        """Sets the state of the materialised cells for next iteration, and steps the aggregate. Updates the internal
+        count of cell states."""
+
+        Kernels.sparseEpithelialSynchronise(self.state, self.nextState, self.counts, self.slotInfected, self.slotCount, self.chunkSize)
+        self.steps += 1
+        self.__stepAggregate()
+        self._updateCounters()
+
+    def stateGrid(self):
+        """Gets the current state of every epithelial cell. The cells of the aggregate are drawn dead at randomly chosen
+        sites of the chunks that aren't materialised, healthy at the others. The grid is built in full, so this only
+        suits grids that fit in memory, for drawing and recording.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) uint8 numpy array.
+        """
+        size = self.chunkSize
+        grid = np.full((self.chunksX * size, self.chunksY * size), EpithelialStates.HEALTHY, dtype=np.uint8)
+        for k in xrange(self.slotCount):
+            x = self.slotX[k] * size
+            y = self.slotY[k] * size
+            grid[x:x + size, y:y + size] = self.state[k * self.chunkCells:(k + 1) * self.chunkCells].reshape(size, size)
+        grid = np.ascontiguousarray(grid[:Worldspace.GRID_WIDTH, :Worldspace.GRID_HEIGHT])
+
+        aggregated = np.repeat(np.repeat(self.slots == Kernels.NO_SLOT, size, axis=0), size, axis=1)
+        sites = np.flatnonzero(aggregated[:Worldspace.GRID_WIDTH, :Worldspace.GRID_HEIGHT])
+        # Drawn from a stream of its own, so that drawing the grid doesn't change the run
+        dead = np.random.RandomState(self.steps).permutation(len(sites))[:self.aggregateDead]
+        grid.ravel()[sites[dead]] = EpithelialStates.NATURAL_DEATH
+        return grid
+
+    def healthyAgeCounts(self):
+        """Gets the number of healthy epithelial cells of each age, without listing the cells of the aggregate one by one.
+
+        Returns int numpy array indexed by age, of length CELL_LIFESPAN + 1.
+        """
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        cells = self.slotCount * self.chunkCells
+        ages = self.age[:cells][self.state[:cells] == EpithelialStates.HEALTHY]
+        return self.aggregateAges + np.bincount(np.clip(ages, 0, lifespan), minlength=lifespan + 1)
+
+    def aggregateCells(self):
+        """Gets the number of cells held in the aggregate."""
+        return int(self.aggregateAges.sum()) + self.aggregateDead
+
+    def __stepAggregate(self):
+        """Ages the healthy cells of the aggregate, those reaching the lifespan dying, and regenerates its dead cells."""
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        ages = self.aggregateAges
+
+        deaths = int(ages[lifespan - 1:].sum())
+        births = 0
+        if HybridEpithelialSystem.REGEN_ENABLED and self.aggregateDead > 0:
+            births = int(self.rng.binomial(self.aggregateDead, min(self.regenChance, 1.0)))
+
+        ages[1:lifespan] = ages[:lifespan - 1].copy()
+        ages[lifespan] = 0
+        ages[0] = births
+        self.aggregateDead += deaths - births
+        self.counts[EpithelialStates.HEALTHY] += births - deaths
+        self.counts[EpithelialStates.NATURAL_DEATH] += deaths - births
+
+    def __materialiseFront(self):
+        """Materialises every chunk within radius chunks of a chunk holding infected cells."""
+        for k in np.nonzero(self.slotInfected[:self.slotCount] & ~self.haloDone[:self.slotCount])[0]:
+            self.haloDone[k] = True
+            for dx in xrange(-self.radius, self.radius + 1):
+                x = self.slotX[k] + dx
+                if x < 0 or x >= self.chunksX:
+                    if not Worldspace.ISTOROIDAL:
+                        continue
+                    x %= self.chunksX
+                for dy in xrange(-self.radius, self.radius + 1):
+                    y = self.slotY[k] + dy
+                    if y < 0 or y >= self.chunksY:
+                        if not Worldspace.ISTOROIDAL:
+                            continue
+                        y %= self.chunksY
+                    if self.slots[x, y] == Kernels.NO_SLOT:
+                        self._materialise(x, y)
+
+    def _materialise(self, x, y):
+        """Fills the next slot with cells drawn from the aggregate for a chunk.
+
+        Keyword arguments
+        x, y -- Coordinates of the chunk.
+        """
+        k = self.addSlot(x, y)
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        valid = ((x * self.chunkSize + self.localX < Worldspace.GRID_WIDTH) &
+                 (y * self.chunkSize + self.localY < Worldspace.GRID_HEIGHT))
+        categories = self.__drawAggregate(int(np.count_nonzero(valid)))
+
+        # Cells past the edge of the grid are never stepped, and are left dead so that they don't count as healthy
+        state = np.full(self.chunkCells, EpithelialStates.NATURAL_DEATH, dtype=np.uint8)
+        age = np.zeros(self.chunkCells, dtype=np.int32)
+        state[valid] = np.where(categories <= lifespan, EpithelialStates.HEALTHY, EpithelialStates.NATURAL_DEATH)
+        age[valid] = np.where(categories <= lifespan, categories, 0)
+
+        cells = slice(k * self.chunkCells, (k + 1) * self.chunkCells)
+        self.state[cells]        = state
+        self.nextState[cells]    = state
+        self.age[cells]          = age
+        self.delay[cells]        = 0
+        self.timeInfected[cells] = 0
+        self.canInfect[cells]    = 1
+        self.focusId[cells]      = Kernels.NO_FOCUS
+
+    def __drawAggregate(self, n):
+        """Removes cells drawn uniformly without replacement from the aggregate.
+
+        Keyword arguments
+        n -- Number of cells.
+
+        Returns int numpy array of the age of each cell drawn, CELL_LIFESPAN + 1 for dead cells, in random order.
+        """
+        lifespan = EpithelialCell.CELL_LIFESPAN
+        totals = np.append(self.aggregateAges, self.aggregateDead)
+        total = int(totals.sum())
+        if 2 * n > total:
+            picks = self.rng.permutation(total)[:n]
+        else:
+            # Sampled by rejection, as a permutation of the aggregate would be as large as the grid
+            chosen = set()
+            while len(chosen) < n:
+                chosen.update(self.rng.randint(0, total, n - len(chosen)).tolist())
+            picks = np.array(list(chosen), dtype=np.int64)
+            self.rng.shuffle(picks)
+
+        categories = np.searchsorted(np.cumsum(totals), picks, side='right')
+        removed = np.bincount(categories, minlength=lifespan + 2)
+        self.aggregateAges -= removed[:lifespan + 1]
+        self.aggregateDead -= int(removed[lifespan + 1])
+        return categories
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the HybridEpithelialSystem class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        HybridEpithelialSystem.ENABLED        = settings["bHybridEnabled"]
+        HybridEpithelialSystem.FRONT_DISTANCE = settings["iFrontDistance"]
+
+class SparseImmuneSystem(ArrayImmuneSystem):
+    """ArrayImmuneSystem over the lattice of a SparseEpithelialSystem. Immune cells are few and move over the whole
+    grid, so they are held as with the array backend."""
+
+    def updateCells(self, rand):
+        """Runs the age, movement and encounter steps of every immune cell.
+
+        Keyword arguments:
+        rand -- A random number per immune cell.
+
+        Returns the number of encounters.
+        """
+        randIndex, encounters = Kernels.sparseImmuneUpdate(self.x, self.y, self.age, self.state, self.nextState, self.count, self.counts,
+                                                           self.eSys.state, self.eSys.nextState, self.eSys.age, self.eSys.delay,
+                                                           self.eSys.slots, self.eSys.chunkSize, Worldspace.GRID_WIDTH,
+                                                           Worldspace.GRID_HEIGHT, bool(Worldspace.ISTOROIDAL),
+                                                           ImmuneCell.IMM_LIFESPAN, rand, 0)
+        return encounters
@@ -0,0 +1,138 @@
+import math
+from collections import OrderedDict
+
+# Per run outputs the adaptive run count can be driven by
+PEAK_INFECTED = "peakInfected"      # Largest fraction of epithelial cells infected at once
+INFECTION_DEATHS = "infectionDeaths" # Fraction of epithelial cells dead of infection at the end of the run
+FOCI_AREA = "fociArea"              # Average focus area in cells at the end of the run, requires FocusSystem
+OUTPUTS = [PEAK_INFECTED, INFECTION_DEATHS, FOCI_AREA]
+
+class RunningStatistics(object):
+    """Streaming mean and variance of a series of values, updated one value at a time with Welford's algorithm."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        """Adds a value to the series.
+
+        Keyword arguments:
+        value -- The value to add, or a numpy array of values to track element by element.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        """Gets the sample variance of the series, 0 for fewer than two values."""
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def confidenceHalfWidth(self, confidence):
+        """Gets the half width of the confidence interval on the mean, using Student's t distribution.
+
+        Keyword arguments:
+        confidence -- Confidence level of the interval, between 0 and 1.
+
+        Returns float, infinite for fewer than two values.
+        """
+        if self.count < 2:
+            return float("inf")
+        return studentT(confidence, self.count - 1) * (self.variance() / self.count) ** 0.5
+
+class AdaptiveRuns(object):
+    """Decides when enough runs have been done, from the confidence intervals on the mean of chosen run outputs.
+
+    Runs continue until, for every output, the confidence interval is narrower than TARGET_WIDTH times the size of its
+    mean, or MAX_RUNS runs have been done. At least MIN_RUNS runs are always done.
+    """
+
+    ENABLED = MIN_RUNS = MAX_RUNS = TARGET_WIDTH = CONFIDENCE = OUTPUTS = None
+
+    def __init__(self, outputs=None):
+        """Constructor for AdaptiveRuns
+
+        Keyword arguments:
+        outputs -- Names of the outputs to track, the configured OUTPUTS by default.
+        """
+        if outputs == None:
+            outputs = AdaptiveRuns.OUTPUTS
+        self.statistics = OrderedDict((name, RunningStatistics()) for name in outputs)
+        self.runs = 0
+
+    def addRun(self, outputs):
+        """Adds the outputs of a finished run.
+
+        Keyword arguments:
+        outputs -- dict of output name to value, holding at least the tracked outputs.
+        """
+        self.runs += 1
+        for name, statistics in self.statistics.items():
+            statistics.add(float(outputs[name]))
+
+    def isConverged(self):
+        """Checks whether every tracked output's confidence interval has reached the target width.
+
+        Returns bool.
+        """
+        if self.runs < AdaptiveRuns.MIN_RUNS:
+            return False
+        for statistics in self.statistics.values():
+            width = 2 * statistics.confidenceHalfWidth(AdaptiveRuns.CONFIDENCE)
+            if width > AdaptiveRuns.TARGET_WIDTH * abs(statistics.mean):
+                return False
+        return True
+
+    def summary(self):
+        """Gets a line per tracked output with its mean and confidence interval.
+
+        Returns list of str.
+        """
+        lines = []
+        for name, statistics in self.statistics.items():
+            halfWidth = statistics.confidenceHalfWidth(AdaptiveRuns.CONFIDENCE)
+            lines.append("%s: %.6g +/- %.6g (%g%% confidence, %d runs)" % (name, statistics.mean, halfWidth, AdaptiveRuns.CONFIDENCE * 100, statistics.count))
+        return lines
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the AdaptiveRuns class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        AdaptiveRuns.ENABLED      = settings["bIsEnabled"]
+        AdaptiveRuns.MIN_RUNS     = settings["iMinRuns"]
+        AdaptiveRuns.MAX_RUNS     = settings["iMaxRuns"]
+        AdaptiveRuns.TARGET_WIDTH = settings["fTargetWidth"]
+        AdaptiveRuns.CONFIDENCE   = settings["fConfidence"]
+        AdaptiveRuns.OUTPUTS      = settings["sOutputs"]
+
+def normalQuantile(p):
+    """Gets the quantile of the standard normal distribution at probability p, found by bisection on math.erf."""
+    low, high = -10.0, 10.0
+    for i in xrange(100):
+        middle = (low + high) / 2
+        if 0.5 * (1 + math.erf(middle / math.sqrt(2))) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+def studentT(confidence, degrees):
+    """Gets the two sided critical value of Student's t distribution.
+
+    Uses the Cornish-Fisher expansion about the normal quantile, accurate to about 1% from 3 degrees of freedom on.
+
+    Keyword arguments:
+    confidence -- Confidence level, between 0 and 1.
+    degrees -- Degrees of freedom.
+    """
+    z = normalQuantile(0.5 + confidence / 2)
+    n = float(degrees)
+    return (z + (z**3 + z) / (4 * n) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * n**2) +
+            (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * n**3))
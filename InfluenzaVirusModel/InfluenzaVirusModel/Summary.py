@@ -0,0 +1,122 @@
+import json
+import os
+from collections import OrderedDict
+
+import SimUtils
+from Logger import LOG_DIR_NAME, JSON_FORMAT, CSV_FORMAT
+
+SUMMARY_FILE_NAME = "summary"
+FORMATS = [CSV_FORMAT, JSON_FORMAT]
+
+class RunSummary(object):
+    """Scalar outputs of a run, updated from the counters of each timestep at constant cost, so that sweeps don't need
+    the time series of the run to be kept.
+
+    Infection deaths are totalled from the rises of the infection death count between timesteps, which counts every
+    death when regeneration is disabled. With regeneration, deaths in the same timestep as regrowth of dead cells go
+    uncounted.
+    """
+
+    ENABLED = FORMAT = None
+
+    def __init__(self, run):
+        """Constructor for RunSummary
+
+        Keyword arguments:
+        run -- Index of the run.
+        """
+        self.run = run
+        self.peakInfected = 0
+        self.peakInfectedTime = 0
+        self.infectionDeaths = 0
+        self.extinctionTime = None
+        self.maxImmune = 0
+        self.finalFociArea = 0.0
+
+        self.previousInfectionDeathCount = 0
+
+    def update(self, timesteps, eSys, immSys, fociArea=0.0):
+        """Updates the outputs with the counters of the next timestep.
+
+        Keyword arguments:
+        timesteps -- The timestep.
+        eSys -- EpithelialSystem, or anything with the same counters.
+        immSys -- ImmuneSystem, or anything with the same counters.
+        fociArea -- Average focus area.
+        """
+        infected = eSys.containingCount + eSys.expressingCount + eSys.infectiousCount
+        if infected > self.peakInfected:
+            self.peakInfected = infected
+            self.peakInfectedTime = timesteps
+        if infected == 0 and self.extinctionTime == None:
+            self.extinctionTime = timesteps
+
+        if eSys.infectionDeathCount > self.previousInfectionDeathCount:
+            self.infectionDeaths += eSys.infectionDeathCount - self.previousInfectionDeathCount
+        self.previousInfectionDeathCount = eSys.infectionDeathCount
+
+        self.maxImmune = max(self.maxImmune, immSys.virginCount + immSys.matureCount)
+        self.finalFociArea = fociArea
+
+    def record(self):
+        """Gets the outputs as a record, the extinction time being None if the infection never died out.
+
+        Returns OrderedDict of output name to value.
+        """
+        fields = OrderedDict()
+        fields["run"]              = self.run + 1
+        fields["peakInfected"]     = self.peakInfected
+        fields["peakInfectedTime"] = self.peakInfectedTime
+        fields["infectionDeaths"]  = self.infectionDeaths
+        fields["extinctionTime"]   = self.extinctionTime
+        fields["maxImmune"]        = self.maxImmune
+        fields["finalFociArea"]    = self.finalFociArea
+        return fields
+
+    @staticmethod
+    def Configure(settings):
+        """Static method. Should only be called once on startup. Sets the static const values of the RunSummary class.
+
+        Keyword arguments:
+        settings -- ConfigSettings instance that contains values read from the config.ini file.
+        """
+        RunSummary.ENABLED = settings["bIsEnabled"]
+        RunSummary.FORMAT  = settings["sFormat"]
+
+class SummaryWriter(object):
+    """Writes the record of each run's RunSummary as a line of one summary file in the logs folder."""
+
+    def __init__(self, folder=None, format=None):
+        """Constructor for SummaryWriter. Any previous summary file is replaced.
+
+        Keyword arguments:
+        folder -- Folder to write the summary file to, defaults to the logs folder.
+        format -- CSV_FORMAT or JSON_FORMAT, defaults to RunSummary.FORMAT.
+        """
+        if folder == None:
+            root = SimUtils.getRootPath()
+            folder = (root + "/" if root != "" else "") + LOG_DIR_NAME
+        SimUtils.initFolderPath(folderPath=folder, overwrite=False)
+
+        self.format = format if format != None else RunSummary.FORMAT
+        self.file = open(os.path.join(folder, SUMMARY_FILE_NAME + "." + self.format), 'w')
+        self.headerWritten = False
+
+    def write(self, summary):
+        """Writes the record of a finished run.
+
+        Keyword arguments:
+        summary -- RunSummary of the run.
+        """
+        fields = summary.record()
+        if self.format == JSON_FORMAT:
+            self.file.write(json.dumps(fields) + "\n")
+        else:
+            if not self.headerWritten:
+                self.file.write(",".join(fields.keys()) + "\n")
+                self.headerWritten = True
+            self.file.write(",".join(["" if value == None else str(value) for value in fields.values()]) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
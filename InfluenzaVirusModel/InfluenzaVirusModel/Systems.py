@@ -1,10 +1,14 @@
 from abc import ABCMeta, abstractmethod
+import numpy as np
 from Program import MainProgram, RNG
 from Cells import EpithelialCell, ImmuneCell, EpithelialStates, ImmuneStates
 from Worldspace import Vector2d
 import Worldspace
 from Logger import StdOutLogger as Log
 
+# Sites along each side of a bucket of the focus system's spatial hash
+FOCUS_BUCKET_SIZE = 16
+
 class ISystem(object):
     """Interface for concrete systems to inherit from"""
 
@@ -53,6 +57,7 @@ class EpithelialSystem(ISystem):
         self.healthyCount        = 0.0
         self.avgFociArea         = 0.0
         self.initialInfected     = 0.0
+        self.changedCells        = []
         if FocusSystem.ENABLED:
             self.fSys            = FocusSystem(world)
 
@@ -212,9 +217,14 @@ class EpithelialSystem(ISystem):
                     self.__updateAttemptInfect(cell)
 
     def synchronise(self):
-        """Sets the state of the epithelial cells for next iteration. Updates the internal count of immune cell states."""
+        """Sets the state of the epithelial cells for next iteration. Updates the internal count of immune cell states.
+
+        The cells that changed state are stored in changedCells until the next call.
+        """
+        changedCells = self.changedCells = []
         for cell in self.cells:
             if cell.State != cell.nextState:
+                changedCells.append(cell)
                 if cell.State == EpithelialStates.HEALTHY:
                     self.healthyCount -= 1
                 elif cell.State == EpithelialStates.NATURAL_DEATH:
@@ -256,6 +266,21 @@ class EpithelialSystem(ISystem):
         if FocusSystem.ENABLED:
             self.fSys.update()
 
+    def stateGrid(self):
+        """Gets the current state of every epithelial cell.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) uint8 numpy array.
+        """
+        states = np.fromiter((cell.State for cell in self.cells), dtype=np.uint8, count=len(self.cells))
+        return states.reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def healthyAges(self):
+        """Gets the ages of the healthy epithelial cells.
+
+        Returns int numpy array.
+        """
+        return np.array([cell.age for cell in self.cells if cell.State == EpithelialStates.HEALTHY], dtype=np.int64)
+
     @staticmethod
     def setNextState(cell, state):
         """Sets the state of an epithelial cell to a specific state. The state transition affects variable.
@@ -316,6 +341,7 @@ class ImmuneSystem(ISystem):
         self.matureCount        = 0
         self.recruitmentTimes   = []
         self.currentRecruitment = 0.0
+        self.changedSites       = set()
 
         ImmuneSystem.INIT_CELLS = int((Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT) * ImmuneSystem.BASE_IMM_CELL) if int((Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT) * ImmuneSystem.BASE_IMM_CELL) > 1 else 1
 
@@ -365,6 +391,7 @@ class ImmuneSystem(ISystem):
 
         site = self.world[cell.location.x][cell.location.y]
         site.getImmCells().remove(cell)
+        self.changedSites.add(site)
 
         x = 0
         y = 0
@@ -405,6 +432,7 @@ class ImmuneSystem(ISystem):
 
         site = self.world[cell.location.x][cell.location.y]
         site.getImmCells().append(cell)
+        self.changedSites.add(site)
 
         return site
 
@@ -449,6 +477,7 @@ class ImmuneSystem(ISystem):
                     ImmuneSystem.setNextState(cell, ImmuneStates.MATURE)
                     self.matureCount += 1
                     self.world[x][y].getImmCells().append(cell)
+                    self.changedSites.add(self.world[x][y])
                     self.cells.append(cell)
 
     def __updateMaintenance(self):
@@ -462,14 +491,19 @@ class ImmuneSystem(ISystem):
 
             cell = ImmuneCell(Vector2d(x, y))
             self.world[x][y].getImmCells().append(cell)
+            self.changedSites.add(self.world[x][y])
             self.cells.append(cell)
 
             self.virginCount += 1
 
     def update(self):
-        """Updates the immune cells, changing their states and moving them around."""
+        """Updates the immune cells, changing their states and moving them around.
+
+        The sites whose immune cells changed are collected in changedSites until the next update.
+        """
 
         site = None 
+        self.changedSites = set()
 
         #Update phase
         for cell in self.cells:
@@ -497,10 +531,43 @@ class ImmuneSystem(ISystem):
             if self.cells[i].nextState == ImmuneStates.DEAD:
                 site = self.world[self.cells[i].location.x][self.cells[i].location.y]
                 site.getImmCells().remove(self.cells[i])
+                self.changedSites.add(site)
                 del self.cells[i]
             else:
+                if self.cells[i].State != self.cells[i].nextState:
+                    self.changedSites.add(self.world[self.cells[i].location.x][self.cells[i].location.y])
                 self.cells[i].State = self.cells[i].nextState
                 
+    def occupancyGrid(self, state=None):
+        """Gets the number of immune cells at every site.
+
+        Keyword arguments:
+        state -- Only count cells in this ImmuneState, all cells by default.
+
+        Returns (GRID_WIDTH, GRID_HEIGHT) int numpy array.
+        """
+        cells = self.cells if state == None else [cell for cell in self.cells if cell.State == state]
+        sites = np.fromiter((cell.location.x * Worldspace.GRID_HEIGHT + cell.location.y for cell in cells), dtype=np.int64, count=len(cells))
+        counts = np.bincount(sites, minlength=Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
+        return counts.reshape(Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT)
+
+    def cellAges(self, state):
+        """Gets the ages of the immune cells in a state.
+
+        Keyword arguments:
+        state -- ImmuneState of the cells.
+
+        Returns int numpy array.
+        """
+        return np.array([cell.age for cell in self.cells if cell.State == state], dtype=np.int64)
+
+    def recruitmentDelays(self):
+        """Gets the number of timesteps until each pending encounter is recruited.
+
+        Returns int numpy array.
+        """
+        return np.array([max(ImmuneSystem.RECRUITMENT_DELAY - time, 1) for time in self.recruitmentTimes], dtype=np.int64)
+
     @staticmethod
     def setNextState(cell, state):
         """Sets up the next state of an immune cell for the next iteration."""
@@ -539,6 +606,13 @@ class FocusSystem():
         self.world = world
         self.mergeDetected = []
 
+        # Running totals over the enabled foci, so that their average area needs no scan of every focus
+        self.enabledCellCount = 0
+        self.enabledFociWithCells = 0
+
+        # Spatial hash of the foci's bounding boxes, bucket (column, row) to set of focus ids
+        self.buckets = {}
+
     def addNewFocus(self, origin):
         """Add new focus to the focus system at a particular cell.
 
@@ -549,6 +623,7 @@ class FocusSystem():
         focus = Worldspace.Focus(origin, self.nextId)
         self.foci.update({self.nextId: focus})
         self.nextId += 1
+        self.__hashBounds(focus)
         
     def addCellToFocus(self, cell):
         """Adds cell to a focus, determined by the cell's focus id.
@@ -559,6 +634,13 @@ class FocusSystem():
         focus = self.foci.get(cell.focusId)
         focus.perimeter.append(cell)
         focus.cellCount += 1
+        if focus.extendBounds(cell.location):
+            self.__hashBounds(focus)
+
+        if focus.isEnabled:
+            self.enabledCellCount += 1
+            if focus.cellCount == 1:
+                self.enabledFociWithCells += 1
 
     def removeCellFromFocus(self, cell):
         """Remove cell from focus and adds any new uncovered perimeter cells in.
@@ -567,13 +649,28 @@ class FocusSystem():
         cell -- Epithelial cell to remove from a focus.
         """
         focus = self.foci.get(cell.focusId)
-        for x in xrange(focus.perimeter-1, -1, -1):
+        for x in xrange(len(focus.perimeter)-1, -1, -1):
             if focus.perimeter[x] == cell:
                 del focus.perimeter[x]
                 break
         focus.cellCount -= 1
 
-        self.__discoverNewPerimeterCellsByLocation(cell.location)
+        if focus.isEnabled:
+            self.enabledCellCount -= 1
+            if focus.cellCount == 0:
+                self.enabledFociWithCells -= 1
+
+        self.__discoverNewPerimeterCellsByLocation(cell.location, focus)
+
+    def averageFociArea(self):
+        """Gets the average cell count of the enabled foci that have cells, kept up to date as cells are added and
+        removed and foci merge.
+
+        Returns float, 0 if there are no such foci.
+        """
+        if self.enabledFociWithCells == 0:
+            return 0.0
+        return float(self.enabledCellCount) / self.enabledFociWithCells
         
     def update(self):
         """Updates the focus system. Calls private updating methods."""
@@ -591,9 +688,64 @@ class FocusSystem():
         """
         neighbours = Worldspace.getMooreNeighbours(self.world, location, EpithelialStates.INFECTION_DEATH)
         for neighbour in neighbours:
-            if neighbour.focusId != focus.Id:
+            if neighbour.focusId != focus.id:
                 if not (neighbour in focus.perimeter):
                     focus.perimeter.append(neighbour)
+                    if focus.extendBounds(neighbour.location):
+                        self.__hashBounds(focus)
+
+    def __bucketRange(self, start, extent, size):
+        """Gets the buckets along one axis that an interval covers, see Worldspace.Focus.bounds().
+
+        Keyword arguments
+        start, extent -- The interval, which may start before the grid or run past its end.
+        size -- Size of the world along the axis.
+        """
+        lastBucket = (size - 1) / FOCUS_BUCKET_SIZE
+        if not Worldspace.ISTOROIDAL:
+            return xrange(max(start, 0) / FOCUS_BUCKET_SIZE, min(start + extent, size - 1) / FOCUS_BUCKET_SIZE + 1)
+        if extent >= size - 1:
+            return xrange(lastBucket + 1)
+
+        start %= size
+        end = start + extent
+        if end < size:
+            return xrange(start / FOCUS_BUCKET_SIZE, end / FOCUS_BUCKET_SIZE + 1)
+        return range(start / FOCUS_BUCKET_SIZE, lastBucket + 1) + range((end - size) / FOCUS_BUCKET_SIZE + 1)
+
+    def __hashBounds(self, focus):
+        """Adds a focus to the buckets its bounding box covers. Boxes only grow, so it is never taken out of a bucket.
+
+        Keyword arguments
+        focus -- Focus instance whose box is new or has grown.
+        """
+        x, width, y, height = focus.bounds()
+        for column in self.__bucketRange(x, width, Worldspace.GRID_WIDTH):
+            for row in self.__bucketRange(y, height, Worldspace.GRID_HEIGHT):
+                self.buckets.setdefault((column, row), set()).add(focus.id)
+
+    def __touchingBounds(self, focus):
+        """Broad phase of the collision detection. Gets the bounding boxes of the other foci that overlap or are next
+        to the box of a focus, which are the only foci that can have cells next to its perimeter.
+
+        Keyword arguments
+        focus -- Focus instance to get the touching boxes of.
+
+        Returns list of tuple (x, width, y, height).
+        """
+        x, width, y, height = focus.bounds()
+        candidates = set()
+        for column in self.__bucketRange(x - 1, width + 2, Worldspace.GRID_WIDTH):
+            for row in self.__bucketRange(y - 1, height + 2, Worldspace.GRID_HEIGHT):
+                candidates.update(self.buckets.get((column, row), ()))
+        candidates.discard(focus.id)
+
+        touching = []
+        for id in candidates:
+            otherX, otherWidth, otherY, otherHeight = bounds = self.foci[id].bounds()
+            if Worldspace.intervalsTouch(x, width, otherX, otherWidth, Worldspace.GRID_WIDTH) and Worldspace.intervalsTouch(y, height, otherY, otherHeight, Worldspace.GRID_HEIGHT):
+                touching.append(bounds)
+        return touching
 
 
     def __updatePerimeterCells(self):
@@ -609,13 +761,32 @@ class FocusSystem():
                     del focus.perimeter[i]
 
     def __updateCollisions(self):
-        """This is a private method, and should only be called from the public update() method. Discovers collisions and determines merges."""
+        """This is a private method, and should only be called from the public update() method. Discovers collisions and determines merges.
+
+        A dead neighbour of another focus lies in that focus' bounding box, so only the perimeter cells next to a
+        touching box are searched. With regeneration, a perimeter cell can regrow and be infected from another focus
+        while staying in the perimeter, so cells that are no longer of the focus are searched wherever they are.
+        """
 
         for focus in self.foci.values():
             if focus.isEnabled:
+                touching = self.__touchingBounds(focus)
+                if len(touching) == 0 and not EpithelialSystem.REGEN_ENABLED:
+                    continue
+
                 collisions = {}
                 for i in xrange(len(focus.perimeter)):
                     perimeterCell = focus.perimeter[i]
+                    location = perimeterCell.location
+                    nearTouching = perimeterCell.focusId != focus.id
+                    if not nearTouching:
+                        for x, width, y, height in touching:
+                            if Worldspace.intervalNear(x, width, location.x, Worldspace.GRID_WIDTH) and Worldspace.intervalNear(y, height, location.y, Worldspace.GRID_HEIGHT):
+                                nearTouching = True
+                                break
+                        if not nearTouching:
+                            continue
+
                     perimeterNeighbours = Worldspace.getMooreNeighbours(self.world, perimeterCell.location, EpithelialStates.INFECTION_DEATH)
                     for neighbour in perimeterNeighbours:
                         if neighbour.focusId != perimeterCell.focusId:
@@ -633,9 +804,13 @@ class FocusSystem():
                     if collisionCount > (len(focus.perimeter) * (FocusSystem.COLLISION_MERGE_PERCENTAGE / 100.0) if len(focus.perimeter) * (FocusSystem.COLLISION_MERGE_PERCENTAGE / 100.0) > 1 else 1):
                     
                         focus.isEnabled = False
+                        self.enabledCellCount -= focus.cellCount
+                        if focus.cellCount > 0:
+                            self.enabledFociWithCells -= 1
                         if FocusSystem.DEBUG_TEXT_ENABLED:
                             Log.out("Merge detected on Focus #%s" % focus.id)
                         self.mergeDetected.append(focus)
+                        break
                     
     # TODO: Remove this in final version.
     def __debugPrint(self):
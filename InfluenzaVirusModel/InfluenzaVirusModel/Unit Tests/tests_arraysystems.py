@@ -0,0 +1,130 @@
+import unittest
+import numpy as np
+
+import ArraySystems
+import Kernels
+import Systems
+import Cells
+import Worldspace
+from Cells import EpithelialStates, ImmuneStates
+
+class ArraySystemsTest(unittest.TestCase):
+    def setUp(self):
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 20
+        Worldspace.GRID_HEIGHT = 15
+
+        Cells.EpithelialCell.CELL_LIFESPAN = 2280
+        Cells.EpithelialCell.INFECT_RATE = 2.0
+        Cells.EpithelialCell.INFECT_LIFESPAN = 144
+        Cells.EpithelialCell.EXPRESS_DELAY = 24
+        Cells.EpithelialCell.INFECT_DELAY = 12
+        Cells.EpithelialCell.DIVISION_TIME = 72
+        Cells.ImmuneCell.IMM_LIFESPAN = 1008
+
+        Systems.EpithelialSystem.INFECT_INIT = 0.05
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Systems.ImmuneSystem.BASE_IMM_CELL = 0.02
+        Systems.ImmuneSystem.RECRUITMENT = 0.25
+        Systems.ImmuneSystem.RECRUITMENT_DELAY = 7
+        Systems.FocusSystem.ENABLED = False
+
+    def createSystems(self, seed=0):
+        eSys = ArraySystems.ArrayEpithelialSystem(np.random.RandomState(seed))
+        immSys = ArraySystems.ArrayImmuneSystem(eSys)
+        eSys.initialise()
+        immSys.initialise()
+        return eSys, immSys
+
+    def infectFrom(self, x, y, toroidal):
+        width = Worldspace.GRID_WIDTH
+        height = Worldspace.GRID_HEIGHT
+        size = width * height
+        state = np.full(size, EpithelialStates.HEALTHY, dtype=np.uint8)
+        state[x * height + y] = EpithelialStates.INFECTIOUS
+        nextState = state.copy()
+        focusId = np.full(size, Kernels.NO_FOCUS, dtype=np.int32)
+        focusId[x * height + y] = 3
+
+        # Rolls of 0.999 always infect
+        Kernels.epithelialUpdate(state, nextState, np.zeros(size, dtype=np.int32), np.zeros(size, dtype=np.int32),
+                                 np.zeros(size, dtype=np.int32), np.ones(size, dtype=np.uint8), focusId, width, height, toroidal,
+                                 0, size, 2280, 144, 24, 12, False, 1.0, 0.1, np.full(8, 0.999), 0, False)
+        return (nextState == EpithelialStates.CONTAINING).reshape(width, height), focusId.reshape(width, height)
+
+    def test_infectNeighboursToroidal(self):
+        infected, focusId = self.infectFrom(0, Worldspace.GRID_HEIGHT - 1, True)
+        self.assertEquals(infected.sum(), 8)
+        for x, y in [(Worldspace.GRID_WIDTH - 1, 0), (0, 0), (1, 0), (Worldspace.GRID_WIDTH - 1, Worldspace.GRID_HEIGHT - 2)]:
+            self.assertTrue(infected[x, y])
+            self.assertEquals(focusId[x, y], 3)
+
+    def test_infectNeighboursBounded(self):
+        infected, focusId = self.infectFrom(0, Worldspace.GRID_HEIGHT - 1, False)
+        self.assertEquals(infected.sum(), 3)
+
+    def test_fixedRollsReadOwnSlot(self):
+        width = Worldspace.GRID_WIDTH
+        height = Worldspace.GRID_HEIGHT
+        size = width * height
+        i = 5 * height + 5
+        state = np.full(size, EpithelialStates.HEALTHY, dtype=np.uint8)
+        state[i] = EpithelialStates.INFECTIOUS
+        nextState = state.copy()
+
+        # Only the roll of the cell's (+1, -1) neighbour slot infects
+        rand = np.zeros(size * Kernels.ROLLS_PER_CELL)
+        rand[i * Kernels.ROLLS_PER_CELL + 2 * 3 + 0] = 0.999
+        Kernels.epithelialUpdate(state, nextState, np.zeros(size, dtype=np.int32), np.zeros(size, dtype=np.int32),
+                                 np.zeros(size, dtype=np.int32), np.ones(size, dtype=np.uint8), np.zeros(size, dtype=np.int32),
+                                 width, height, True, 0, size, 2280, 144, 24, 12, False, 1.0, 0.1, rand, 0, True)
+        infected = (nextState == EpithelialStates.CONTAINING).reshape(width, height)
+        self.assertEquals(infected.sum(), 1)
+        self.assertTrue(infected[6, 4])
+
+    def test_immuneMovementWraps(self):
+        x = np.zeros(1, dtype=np.int32)
+        y = np.zeros(1, dtype=np.int32)
+        state = np.full(1, ImmuneStates.VIRGIN, dtype=np.uint8)
+        counts = np.array([1, 0, 0], dtype=np.int64)
+        eState = np.full(Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT, EpithelialStates.HEALTHY, dtype=np.uint8)
+
+        # A roll of 0.0 moves by (-1, -1)
+        Kernels.immuneUpdate(x, y, np.zeros(1, dtype=np.int32), state, state.copy(), 1, counts, eState, eState.copy(),
+                             np.zeros(len(eState), dtype=np.int32), np.zeros(len(eState), dtype=np.int32),
+                             Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT, True, 1008, np.zeros(1), 0)
+        self.assertEquals((x[0], y[0]), (Worldspace.GRID_WIDTH - 1, Worldspace.GRID_HEIGHT - 1))
+
+    def test_countersMatchState(self):
+        eSys, immSys = self.createSystems()
+        maxInfectious = 0
+        for timesteps in xrange(200):
+            eSys.update()
+            immSys.update()
+            eSys.synchronise()
+            immSys.synchronise()
+
+            self.assertTrue(np.array_equal(np.bincount(eSys.state, minlength=ArraySystems.EPITHELIAL_STATE_COUNT), eSys.counts))
+            self.assertEquals(eSys.healthyCount + eSys.containingCount + eSys.expressingCount + eSys.infectiousCount +
+                              eSys.naturalDeathCount + eSys.infectionDeathCount, Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
+            self.assertEquals(immSys.count, immSys.virginCount + immSys.matureCount)
+            self.assertEquals(immSys.occupancyGrid().sum(), immSys.count)
+            self.assertEquals(immSys.occupancyGrid(ImmuneStates.MATURE).sum(), immSys.matureCount)
+            maxInfectious = max(maxInfectious, eSys.infectiousCount)
+
+        self.assertTrue(maxInfectious > 0)
+
+    def test_seededRunsRepeat(self):
+        runs = []
+        for i in xrange(2):
+            eSys, immSys = self.createSystems(7)
+            for timesteps in xrange(50):
+                eSys.update()
+                immSys.update()
+                eSys.synchronise()
+                immSys.synchronise()
+            runs.append((eSys.stateGrid().copy(), immSys.occupancyGrid()))
+
+        self.assertTrue(np.array_equal(runs[0][0], runs[1][0]))
+        self.assertTrue(np.array_equal(runs[0][1], runs[1][1]))
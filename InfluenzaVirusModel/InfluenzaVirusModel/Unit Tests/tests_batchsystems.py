@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+
+import ArraySystems
+import BatchSystems
+import Results
+import Systems
+import Cells
+import Worldspace
+from Cells import ImmuneStates
+
+class BatchSystemsTest(unittest.TestCase):
+    def setUp(self):
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 20
+        Worldspace.GRID_HEIGHT = 15
+
+        Cells.EpithelialCell.CELL_LIFESPAN = 2280
+        Cells.EpithelialCell.INFECT_RATE = 2.0
+        Cells.EpithelialCell.INFECT_LIFESPAN = 144
+        Cells.EpithelialCell.EXPRESS_DELAY = 24
+        Cells.EpithelialCell.INFECT_DELAY = 12
+        Cells.EpithelialCell.DIVISION_TIME = 72
+        Cells.ImmuneCell.IMM_LIFESPAN = 1008
+
+        Systems.EpithelialSystem.INFECT_INIT = 0.05
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Systems.ImmuneSystem.BASE_IMM_CELL = 0.02
+        Systems.ImmuneSystem.RECRUITMENT = 0.25
+        Systems.ImmuneSystem.RECRUITMENT_DELAY = 7
+        Systems.FocusSystem.ENABLED = False
+
+    def step(self, eSys, immSys):
+        eSys.update()
+        immSys.update()
+        eSys.synchronise()
+        immSys.synchronise()
+
+    def test_replicatesMatchSingleRuns(self):
+        seeds = [3, 11, 42]
+        eSys = BatchSystems.BatchEpithelialSystem([np.random.RandomState(seed) for seed in seeds])
+        immSys = BatchSystems.BatchImmuneSystem(eSys)
+        eSys.initialise()
+        immSys.initialise()
+        for timesteps in xrange(150):
+            self.step(eSys, immSys)
+
+        for r, seed in enumerate(seeds):
+            single = ArraySystems.ArrayEpithelialSystem(np.random.RandomState(seed))
+            singleImm = ArraySystems.ArrayImmuneSystem(single)
+            single.initialise()
+            singleImm.initialise()
+            for timesteps in xrange(150):
+                self.step(single, singleImm)
+
+            self.assertTrue(np.array_equal(eSys.stateGrid(r), single.stateGrid()))
+            self.assertTrue(np.array_equal(immSys.occupancyGrid(r), singleImm.occupancyGrid()))
+            self.assertTrue(np.array_equal(eSys.counts[r], single.counts))
+
+    def test_countersMatchState(self):
+        eSys = BatchSystems.BatchEpithelialSystem([np.random.RandomState(seed) for seed in xrange(4)])
+        immSys = BatchSystems.BatchImmuneSystem(eSys)
+        eSys.initialise()
+        immSys.initialise()
+        for timesteps in xrange(100):
+            self.step(eSys, immSys)
+
+            for r in xrange(eSys.replicates):
+                self.assertTrue(np.array_equal(np.bincount(eSys.state[r], minlength=BatchSystems.EPITHELIAL_STATE_COUNT), eSys.counts[r]))
+                self.assertEquals(immSys.count[r], immSys.counts[r, ImmuneStates.VIRGIN] + immSys.counts[r, ImmuneStates.MATURE])
+                self.assertEquals(immSys.occupancyGrid(r, ImmuneStates.MATURE).sum(), immSys.counts[r, ImmuneStates.MATURE])
+
+        counters = Results.TimestepCounters(eSys.counts[0], immSys.counts[0])
+        self.assertEquals(counters.healthyCount + counters.containingCount + counters.expressingCount + counters.infectiousCount +
+                          counters.naturalDeathCount + counters.infectionDeathCount, Worldspace.GRID_WIDTH * Worldspace.GRID_HEIGHT)
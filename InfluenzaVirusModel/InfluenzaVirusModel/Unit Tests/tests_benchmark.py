@@ -0,0 +1,35 @@
+import unittest
+import Benchmark
+
+class BenchmarkTest(unittest.TestCase):
+    def createResults(self, stepsPerSecond, meanTime):
+        return {"cases": [{"name": "case",
+                           "stepsPerSecond": stepsPerSecond,
+                           "phases": {Benchmark.EPITHELIAL_UPDATE: {"calls": 1, "totalTime": meanTime, "meanTime": meanTime}}}]}
+
+    def test_buildMatrix(self):
+        cases = Benchmark.buildMatrix()
+        self.assertEquals(len(cases), len(Benchmark.GRID_SIZES) * len(Benchmark.INFECTION_DENSITIES) * len(Benchmark.IMMUNE_DENSITIES))
+        names = [case["name"] for case in cases]
+        self.assertEquals(len(set(names)), len(names))
+
+    def test_compareResults(self):
+        baseline = self.createResults(100.0, 0.01)
+
+        self.assertEquals(Benchmark.compareResults(self.createResults(95.0, 0.0105), baseline, 0.1), [])
+        self.assertEquals(len(Benchmark.compareResults(self.createResults(80.0, 0.01), baseline, 0.1)), 1)
+        self.assertEquals(len(Benchmark.compareResults(self.createResults(100.0, 0.02), baseline, 0.1)), 1)
+
+        # cases missing from the baseline are not compared
+        self.assertEquals(Benchmark.compareResults(self.createResults(1.0, 1.0), {"cases": []}, 0.1), [])
+
+    def test_runCase(self):
+        case = {"name": "test", "gridWidth": 10, "gridHeight": 10, "infectInit": 0.05, "baseImmCell": 0.01}
+        result = Benchmark.runCase(case, steps=3)
+
+        self.assertEquals(result["steps"], 3)
+        self.assertTrue(result["stepsPerSecond"] > 0)
+        for name in [Benchmark.EPITHELIAL_UPDATE, Benchmark.IMMUNE_UPDATE, Benchmark.EPITHELIAL_SYNCHRONISE,
+                     Benchmark.IMMUNE_SYNCHRONISE, Benchmark.FOCUS_UPDATE, Benchmark.GRAPH_ADD]:
+            self.assertEquals(result["phases"][name]["calls"], 3)
+        self.assertEquals(result["phases"][Benchmark.MOORE_NEIGHBOURS]["calls"], 100)
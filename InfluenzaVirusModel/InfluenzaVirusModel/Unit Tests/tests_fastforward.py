@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+
+import ArraySystems
+import Systems
+import Cells
+import Worldspace
+from Cells import EpithelialStates, ImmuneStates
+from FastForward import FastForward
+
+class FastForwardTest(unittest.TestCase):
+    def setUp(self):
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 30
+        Worldspace.GRID_HEIGHT = 20
+
+        Cells.EpithelialCell.CELL_LIFESPAN = 300
+        Cells.EpithelialCell.INFECT_RATE = 1.0
+        Cells.EpithelialCell.INFECT_LIFESPAN = 30
+        Cells.EpithelialCell.EXPRESS_DELAY = 4
+        Cells.EpithelialCell.INFECT_DELAY = 3
+        Cells.EpithelialCell.DIVISION_TIME = 72
+        Cells.ImmuneCell.IMM_LIFESPAN = 100
+
+        Systems.EpithelialSystem.INFECT_INIT = 0.01
+        Systems.EpithelialSystem.REGEN_ENABLED = False
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Systems.ImmuneSystem.ISENABLED = True
+        Systems.ImmuneSystem.BASE_IMM_CELL = 0.2
+        Systems.ImmuneSystem.RECRUITMENT = 0.25
+        Systems.ImmuneSystem.RECRUITMENT_DELAY = 40
+        Systems.FocusSystem.ENABLED = False
+
+        FastForward.ENABLED = True
+
+    def step(self, eSys, immSys):
+        eSys.update()
+        immSys.update()
+        eSys.synchronise()
+        immSys.synchronise()
+
+    def test_absorbedOnlyWithoutRegeneration(self):
+        self.assertTrue(FastForward.isAbsorbed(0))
+        self.assertFalse(FastForward.isAbsorbed(1))
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        self.assertFalse(FastForward.isAbsorbed(0))
+
+    def test_projectionMatchesStepping(self):
+        for seed in xrange(3):
+            eSys = ArraySystems.ArrayEpithelialSystem(np.random.RandomState(seed))
+            immSys = ArraySystems.ArrayImmuneSystem(eSys)
+            eSys.initialise()
+            immSys.initialise()
+            while not FastForward.isAbsorbed(eSys.containingCount + eSys.expressingCount + eSys.infectiousCount):
+                self.step(eSys, immSys)
+
+            # Long enough for cells of both systems to die of old age and pending encounters to be recruited
+            eCounts, immCounts = FastForward.projectSystems(eSys, immSys, 350)
+            for k in xrange(350):
+                self.step(eSys, immSys)
+                self.assertTrue(np.array_equal(eCounts[k], eSys.counts))
+                self.assertEquals(immCounts[k, ImmuneStates.VIRGIN], immSys.virginCount)
+                self.assertEquals(immCounts[k, ImmuneStates.MATURE], immSys.matureCount)
+            self.assertEquals(eSys.healthyCount, 0)
+
+    def test_projectWithoutImmuneSystem(self):
+        Systems.ImmuneSystem.ISENABLED = False
+        eCounts, immCounts = FastForward.project(3, [2, 0, 0, 0, 1, 1], [297, 299], [5, 0, 0], [], [], [], 0.0, 5)
+        self.assertEquals(eCounts[:, EpithelialStates.HEALTHY].tolist(), [1, 1, 0])
+        self.assertEquals(eCounts[:, EpithelialStates.NATURAL_DEATH].tolist(), [2, 2, 3])
+        self.assertEquals(immCounts[:, ImmuneStates.VIRGIN].tolist(), [5, 5, 5])
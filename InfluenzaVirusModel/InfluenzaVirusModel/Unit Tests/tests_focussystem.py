@@ -0,0 +1,101 @@
+import unittest
+
+import Systems
+import Worldspace
+from Cells import EpithelialCell, EpithelialStates
+from Worldspace import Worldsite, Vector2d
+
+class FocusSystemTest(unittest.TestCase):
+    def setUp(self):
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 12
+        Worldspace.GRID_HEIGHT = 10
+        Systems.FocusSystem.COLLISION_MERGE_PERCENTAGE = 10
+        Systems.FocusSystem.DEBUG_TEXT_ENABLED = False
+
+        self.world = []
+        for x in xrange(Worldspace.GRID_WIDTH):
+            self.world.append([])
+            for y in xrange(Worldspace.GRID_HEIGHT):
+                self.world[x].append(Worldsite(Vector2d(x, y)))
+                self.world[x][y].eCell = EpithelialCell(Vector2d(x, y))
+        self.fSys = Systems.FocusSystem(self.world)
+
+    def kill(self, x, y, focusId):
+        cell = self.world[x][y].eCell
+        cell.State = EpithelialStates.INFECTION_DEATH
+        cell.focusId = focusId
+        self.fSys.addCellToFocus(cell)
+        return cell
+
+    def scannedAverage(self):
+        areas = [focus.cellCount for focus in self.fSys.foci.values() if focus.isEnabled and focus.cellCount != 0]
+        return float(sum(areas)) / len(areas) if len(areas) > 0 else 0.0
+
+    def test_averageFollowsCells(self):
+        for x in xrange(3):
+            self.fSys.addNewFocus(self.world[x * 4][0].eCell)
+        self.assertEquals(self.fSys.averageFociArea(), 0.0)
+
+        self.kill(0, 0, 0)
+        self.kill(0, 1, 0)
+        cell = self.kill(4, 0, 1)
+        self.assertEquals(self.fSys.averageFociArea(), 1.5)
+        self.assertEquals(self.fSys.averageFociArea(), self.scannedAverage())
+
+        self.fSys.removeCellFromFocus(cell)
+        self.assertEquals(self.fSys.foci[1].cellCount, 0)
+        self.assertEquals(self.fSys.averageFociArea(), 2.0)
+        self.assertEquals(self.fSys.averageFociArea(), self.scannedAverage())
+
+    def test_mergedFociLeaveAverage(self):
+        self.fSys.addNewFocus(self.world[2][2].eCell)
+        self.fSys.addNewFocus(self.world[3][2].eCell)
+        self.fSys.addNewFocus(self.world[8][8].eCell)
+        for y in xrange(2):
+            self.kill(2, 2 + y, 0)
+            self.kill(3, 2 + y, 1)
+        for y in xrange(3):
+            self.kill(8, 8 - y, 2)
+
+        self.fSys.update()
+        self.assertFalse(self.fSys.foci[0].isEnabled)
+        self.assertFalse(self.fSys.foci[1].isEnabled)
+        self.assertEquals(len(self.fSys.mergeDetected), 2)
+        self.assertEquals(self.fSys.averageFociArea(), 3.0)
+        self.assertEquals(self.fSys.averageFociArea(), self.scannedAverage())
+
+        # Cells added to a merged focus no longer count
+        self.kill(2, 4, 0)
+        self.assertEquals(self.fSys.averageFociArea(), 3.0)
+
+    def test_boundsWrapRoundEdge(self):
+        self.fSys.addNewFocus(self.world[11][0].eCell)
+        self.kill(11, 0, 0)
+        self.kill(0, 9, 0)
+        self.kill(1, 0, 0)
+        self.assertEquals(self.fSys.foci[0].bounds(), (11, 2, 9, 1))
+
+    def test_intervalsTouch(self):
+        self.assertTrue(Worldspace.intervalsTouch(10, 1, 0, 0, 12))
+        self.assertFalse(Worldspace.intervalsTouch(9, 1, 0, 0, 12))
+        self.assertTrue(Worldspace.intervalsTouch(0, 0, 9, 2, 12))
+        self.assertTrue(Worldspace.intervalNear(11, 0, 0, 12))
+
+        Worldspace.ISTOROIDAL = False
+        self.assertFalse(Worldspace.intervalsTouch(10, 1, 0, 0, 12))
+        self.assertTrue(Worldspace.intervalsTouch(2, 1, 4, 3, 12))
+        self.assertFalse(Worldspace.intervalNear(11, 0, 0, 12))
+
+    def test_collisionAcrossEdge(self):
+        self.fSys.addNewFocus(self.world[11][4].eCell)
+        self.fSys.addNewFocus(self.world[0][4].eCell)
+        self.fSys.addNewFocus(self.world[5][4].eCell)
+        for y in xrange(2):
+            self.kill(11, 4 + y, 0)
+            self.kill(0, 4 + y, 1)
+            self.kill(5, 4 + y, 2)
+
+        self.fSys.update()
+        self.assertEquals([focus.id for focus in self.fSys.mergeDetected], [0, 1])
+        self.assertTrue(self.fSys.foci[2].isEnabled)
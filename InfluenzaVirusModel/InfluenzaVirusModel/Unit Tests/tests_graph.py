@@ -1,6 +1,10 @@
+import os
+import shutil
+import tempfile
 import unittest
-from Graph import Graph, OverallSimulationDataGraph, SimulationData
+from Graph import Graph, OverallSimulationDataGraph, SimulationData, GraphRenderer, downsampleIndices
 import random
+import numpy as np
 
 class GraphTest(unittest.TestCase):
     def test_data_init(self):
@@ -106,6 +110,23 @@ class GraphTest(unittest.TestCase):
         self.assertEquals(graphVis.infectedResultsList[0][0], 8)
 
 
+    def test_graph_addRunData(self):
+        graphVis = OverallSimulationDataGraph(100, 10)
+        graphVis.initRun()
+        healthy = np.array([90, 80, 70])
+        containing = np.array([5, 10, 10])
+        immCells = np.array([10, 12, 14])
+        graphVis.addRunData(xrange(3), healthy, containing, containing, containing, healthy, immCells)
+
+        self.assertEquals(graphVis.time, [0, 1, 2])
+        self.assertIs(graphVis.healthyResultsList[0], healthy)
+        self.assertIs(graphVis.immCellsResultsList[0], immCells)
+        self.assertEquals(list(graphVis.infectedResultsList[0]), [15, 30, 30])
+        self.assertEquals(graphVis.getStandardDeviationValues(graphVis.healthyResultsList), [[90, 80, 70], [90, 80, 70]])
+
+        with self.assertRaises(AttributeError):
+            OverallSimulationDataGraph().addRunData(xrange(3), healthy, containing, containing, containing, healthy, immCells)
+
     def test_graph_addDataTo(self):
         graphVis = OverallSimulationDataGraph()
         self.assertIsNotNone(graphVis)
@@ -275,3 +296,66 @@ class GraphTest(unittest.TestCase):
 
         graphVis.showGraph(True)
 
+    def test_downsampleKeepsExtremes(self):
+        rng = np.random.RandomState(0)
+        upper = rng.random_sample(10007)
+        lower = upper - rng.random_sample(10007)
+        indices = downsampleIndices(lower, upper, 300)
+
+        self.assertTrue(len(indices) <= 2 * 300 + 2)
+        self.assertEquals((indices[0], indices[-1]), (0, 10006))
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        bucketSize = -(-10007 // 300)
+        for start in xrange(0, 10007, bucketSize):
+            bucket = indices[(indices >= start) & (indices < start + bucketSize)]
+            self.assertEquals(upper[bucket].max(), upper[start:start + bucketSize].max())
+            self.assertEquals(lower[bucket].min(), lower[start:start + bucketSize].min())
+
+        self.assertTrue(np.array_equal(downsampleIndices(lower[:500], upper[:500], 300), np.arange(500)))
+
+    def test_downsampleForAxes(self):
+        import matplotlib.pyplot as plt
+        graphVis = OverallSimulationDataGraph()
+        time = range(5000)
+        lower = [float(t % 97) for t in time]
+        upper = [value + 1.0 for value in lower]
+        ax = plt.subplot()
+
+        downsample = Graph.DOWNSAMPLE
+        try:
+            Graph.DOWNSAMPLE = False
+            self.assertEquals(graphVis.downsampleForAxes(ax, time, lower, upper), (time, lower, upper))
+            Graph.DOWNSAMPLE = True
+            sampledTime, sampledLower, sampledUpper = graphVis.downsampleForAxes(ax, time, lower, upper)
+        finally:
+            Graph.DOWNSAMPLE = downsample
+            plt.close("all")
+
+        self.assertTrue(len(sampledTime) < len(time))
+        self.assertEquals(len(sampledLower), len(sampledTime))
+        self.assertEquals(max(sampledUpper), 97.0)
+        self.assertEquals([upper[t] for t in sampledTime], sampledUpper)
+
+    def test_rendererSavesInBackground(self):
+        folder = tempfile.mkdtemp()
+        format = Graph.FORMAT
+        try:
+            Graph.FORMAT = "svg"
+            renderer = GraphRenderer()
+            for runs in [1, 3]:
+                graphVis = OverallSimulationDataGraph(100, 10)
+                graphVis.folderName = folder + "/"
+                graphVis.graphFileName = "graph%d" % runs
+                for run in xrange(runs):
+                    graphVis.initRun()
+                    graphVis.addRunData(range(50), np.full(50, 90 - run), np.full(50, 3), np.full(50, 2), np.full(50, 5), np.zeros(50), np.full(50, 20))
+                renderer.render(graphVis, True)
+                graphVis.time = None
+            renderer.close()
+        finally:
+            Graph.FORMAT = format
+
+        try:
+            self.assertEquals(sorted(os.listdir(folder)), ["graph1.svg", "graph3.svg"])
+        finally:
+            shutil.rmtree(folder)
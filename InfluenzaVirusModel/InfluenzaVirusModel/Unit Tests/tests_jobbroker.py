@@ -0,0 +1,89 @@
+import multiprocessing
+import unittest
+import numpy as np
+from multiprocessing.connection import Client
+
+import Config
+from JobBroker import JobBroker, JobWorker, packResults, unpackResults, TAKE, DONE, JOB, WAIT, STOP, WAIT_INTERVAL
+from Results import RunResults
+
+AUTHKEY = "test"
+
+def runWorker(address):
+    JobWorker(address, AUTHKEY).run(reconnect=False)
+
+class JobBrokerTest(unittest.TestCase):
+    def setUp(self):
+        self.broker = JobBroker(("localhost", 0), AUTHKEY, leaseTime=1)
+        self.options = Config.ConfigReader().defaultOptions() + [("World", "iGridWidth", "30"), ("World", "iGridHeight", "20"),
+                                                                 ("General", "iRunTime", "60"), ("EpithelialSystem", "fInfectInit", "0.05")]
+        self.workers = []
+
+    def tearDown(self):
+        self.broker.close()
+        for worker in self.workers:
+            worker.join(30)
+
+    def startWorkers(self, count):
+        for i in xrange(count):
+            worker = multiprocessing.Process(target=runWorker, args=(self.broker.address,))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def collect(self, jobs):
+        results = {}
+        while len(results) < jobs:
+            result = self.broker.nextResult(timeout=60)
+            self.assertNotEquals(result, None)
+            job, runResults, error = result
+            self.assertEquals(error, None)
+            self.assertFalse(job in results)
+            results[job] = runResults
+        return results
+
+    def test_packedResultsRoundTrip(self):
+        results = RunResults(10, 7, np.arange(66).reshape(11, 6), np.arange(33).reshape(11, 3), np.zeros((11, 1)))
+        unpacked = unpackResults(packResults(results))
+        self.assertEquals((unpacked.runTime, unpacked.initCells), (10, 7))
+        self.assertTrue(np.array_equal(unpacked.eCounts, results.eCounts))
+        self.assertTrue(np.array_equal(unpacked.immCounts, results.immCounts))
+
+    def test_workersDoSeededRuns(self):
+        specs = [(self.options, 11, 0), (self.options, 11, 1), (self.options, 11, 0)]
+        jobs = [self.broker.submit(spec) for spec in specs]
+        self.startWorkers(2)
+        results = self.collect(len(jobs))
+
+        self.assertEquals(results[jobs[0]].eCounts.shape[0], 61)
+        self.assertTrue(np.array_equal(results[jobs[0]].eCounts, results[jobs[2]].eCounts))
+        self.assertFalse(np.array_equal(results[jobs[0]].eCounts, results[jobs[1]].eCounts))
+
+    def test_lostJobsQueuedAgain(self):
+        expired = self.broker.submit((self.options, 5, 0))
+        lost = self.broker.submit((self.options, 5, 1))
+
+        # One worker keeps its connection but stops renewing its lease, another drops its connection with a job in hand
+        silent = Client(self.broker.address, authkey=AUTHKEY)
+        silent.send((TAKE,))
+        self.assertEquals(silent.recv()[:2], (JOB, expired))
+
+        dropped = Client(self.broker.address, authkey=AUTHKEY)
+        dropped.send((TAKE,))
+        self.assertEquals(dropped.recv()[:2], (JOB, lost))
+        dropped.close()
+
+        self.startWorkers(2)
+        results = self.collect(2)
+        self.assertEquals(sorted(results.keys()), [expired, lost])
+        self.assertEquals(self.broker.leasedJobs(), [])
+
+        # The results of the first worker to finish a job are kept
+        silent.send((DONE, expired, packResults(RunResults(0, 0, np.zeros((1, 6)), np.zeros((1, 3)), np.zeros((1, 1)))), None))
+        silent.send((TAKE,))
+        self.assertEquals(silent.recv(), (WAIT, WAIT_INTERVAL))
+        self.assertEquals(self.broker.nextResult(timeout=0.1), None)
+        self.broker.close()
+        silent.send((TAKE,))
+        self.assertEquals(silent.recv(), (STOP,))
+        silent.close()
@@ -0,0 +1,56 @@
+import multiprocessing
+import unittest
+import numpy as np
+
+from LiveView import SharedFrames, NO_IMMUNE_CELL, VIRGIN_IMMUNE_CELL, MATURE_IMMUNE_CELL, SEQUENCE
+
+def readFrame(frames, results):
+    results.put(frames.read())
+
+class SharedFramesTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.states = rng.randint(0, 6, (12, 9)).astype(np.uint8)
+        self.virgin = rng.randint(0, 2, (12, 9))
+        self.mature = rng.randint(0, 2, (12, 9))
+
+    def test_readLatestFrameOnce(self):
+        frames = SharedFrames(10, 8)
+        self.assertEquals(frames.read(), None)
+        self.assertTrue(frames.isCaughtUp())
+
+        frames.publish(1, 5, np.zeros((12, 9), dtype=np.uint8), self.virgin, self.mature)
+        frames.publish(2, 6, self.states, self.virgin, self.mature)
+        self.assertFalse(frames.isCaughtUp())
+
+        run, timesteps, states, immune = frames.read()
+        self.assertEquals((run, timesteps), (2, 6))
+        self.assertTrue(np.array_equal(states, self.states[:10, :8]))
+        self.assertTrue(np.array_equal(immune[self.mature[:10, :8] > 0], np.full(np.count_nonzero(self.mature[:10, :8]), MATURE_IMMUNE_CELL)))
+        self.assertTrue(np.all(immune[(self.mature[:10, :8] == 0) & (self.virgin[:10, :8] > 0)] == VIRGIN_IMMUNE_CELL))
+        self.assertTrue(np.all(immune[(self.mature[:10, :8] == 0) & (self.virgin[:10, :8] == 0)] == NO_IMMUNE_CELL))
+
+        self.assertTrue(frames.isCaughtUp())
+        self.assertEquals(frames.read(), None)
+
+    def test_frameBeingWrittenIsNotRead(self):
+        frames = SharedFrames(12, 9)
+        frames.publish(1, 0, self.states, self.virgin, self.mature)
+        slot = frames.latestSlot.value
+        frames.header[slot, SEQUENCE] += 1
+        self.assertEquals(frames.read(), None)
+        self.assertFalse(frames.isCaughtUp())
+
+    def test_readFromOtherProcess(self):
+        frames = SharedFrames(12, 9)
+        frames.publish(3, 72, self.states, self.virgin, self.mature)
+
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=readFrame, args=(frames, results))
+        process.start()
+        run, timesteps, states, immune = results.get(timeout=30)
+        process.join()
+
+        self.assertEquals((run, timesteps), (3, 72))
+        self.assertTrue(np.array_equal(states, self.states))
+        self.assertTrue(frames.isCaughtUp())
@@ -0,0 +1,59 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from collections import OrderedDict
+import Logger
+from Logger import BufferedLogger
+
+class BufferedLoggerTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.format = Logger.Logger.FORMAT
+        self.perRunFiles = Logger.Logger.PER_RUN_FILES
+
+    def tearDown(self):
+        BufferedLogger.stop()
+        Logger.Logger.FORMAT = self.format
+        Logger.Logger.PER_RUN_FILES = self.perRunFiles
+        shutil.rmtree(self.folder)
+
+    def createRecord(self, time):
+        fields = OrderedDict()
+        fields["time"] = time
+        fields["healthy"] = 10 - time
+        return fields
+
+    def test_jsonRecordsPerRun(self):
+        Logger.Logger.FORMAT = Logger.JSON_FORMAT
+        Logger.Logger.PER_RUN_FILES = True
+
+        BufferedLogger.start(self.folder)
+        for run in [1, 2]:
+            BufferedLogger.openRun(run)
+            BufferedLogger.out("run %d" % run)
+            for time in xrange(3):
+                BufferedLogger.record(self.createRecord(time))
+        BufferedLogger.stop()
+
+        with open(os.path.join(self.folder, "run2.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEquals(len(records), 3)
+        self.assertEquals(records[2]["time"], 2)
+        self.assertEquals(records[2]["healthy"], 8)
+
+        with open(os.path.join(self.folder, "run1.log")) as f:
+            self.assertEquals(f.read(), "run 1\n")
+
+    def test_csvRecords(self):
+        Logger.Logger.FORMAT = Logger.CSV_FORMAT
+        Logger.Logger.PER_RUN_FILES = False
+
+        BufferedLogger.start(self.folder)
+        BufferedLogger.record(self.createRecord(0))
+        BufferedLogger.record(self.createRecord(1))
+        BufferedLogger.flush()
+
+        with open(os.path.join(self.folder, "simulation.csv")) as f:
+            self.assertEquals(f.read(), "time,healthy\n0,10\n1,9\n")
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import ArraySystems
+import MemmapSystems
+import Systems
+import Cells
+import Worldspace
+
+class MemmapSystemsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 45
+        Worldspace.GRID_HEIGHT = 38
+
+        Cells.EpithelialCell.CELL_LIFESPAN = 300
+        Cells.EpithelialCell.INFECT_RATE = 2.0
+        Cells.EpithelialCell.INFECT_LIFESPAN = 40
+        Cells.EpithelialCell.EXPRESS_DELAY = 6
+        Cells.EpithelialCell.INFECT_DELAY = 4
+        Cells.EpithelialCell.DIVISION_TIME = 72
+
+        Systems.EpithelialSystem.INFECT_INIT = 0.005
+        Systems.EpithelialSystem.REGEN_ENABLED = False
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Systems.ImmuneSystem.FLOW_RATE = 1.0
+
+        MemmapSystems.MemmapEpithelialSystem.BAND_ROWS = 4
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def createSystems(self):
+        """Creates an out of core system and an array system holding a copy of its cells and random state."""
+        eSys = MemmapSystems.MemmapEpithelialSystem(os.path.join(self.folder, "run1"), np.random.RandomState(3))
+        eSys.initialise()
+
+        arraySys = ArraySystems.ArrayEpithelialSystem(np.random.RandomState(3))
+        arraySys.initialise()
+        for name, dtype in MemmapSystems.ARRAYS:
+            getattr(arraySys, name)[:] = getattr(eSys, name)
+        arraySys.counts[:] = eSys.counts
+        arraySys.synchronise()
+        arraySys.rng.set_state(eSys.rng.get_state())
+        return eSys, arraySys
+
+    def test_bandsMatchArraySystem(self):
+        for toroidal, regen in [(True, False), (False, False), (True, True), (False, True)]:
+            Worldspace.ISTOROIDAL = toroidal
+            Systems.EpithelialSystem.REGEN_ENABLED = regen
+            eSys, arraySys = self.createSystems()
+
+            for k in xrange(150):
+                for system in [eSys, arraySys]:
+                    system.update()
+                    system.synchronise()
+                self.assertTrue(np.array_equal(eSys.counts, arraySys.counts))
+                self.assertTrue(np.array_equal(eSys.stateGrid(), arraySys.stateGrid()))
+            self.assertTrue(eSys.infectionDeathCount > 0)
+            self.assertTrue(np.array_equal(eSys.age, arraySys.age))
+            self.assertEquals(eSys.rng.random_sample(), arraySys.rng.random_sample())
+
+    def test_checkpointLayout(self):
+        eSys, arraySys = self.createSystems()
+        for k in xrange(20):
+            eSys.update()
+            eSys.synchronise()
+        eSys.checkpoint()
+
+        layout, arrays = MemmapSystems.openLayout(eSys.folder)
+        self.assertEquals((layout["width"], layout["height"], layout["steps"]), (45, 38, 20))
+        self.assertEquals(layout["counts"], eSys.counts.tolist())
+        self.assertTrue(np.array_equal(arrays["state"], eSys.stateGrid()))
+        self.assertTrue(np.array_equal(arrays["age"].ravel(), eSys.age))
+        self.assertEquals(eSys.healthyAgeCounts().sum(), eSys.healthyCount)
@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+
+import ArraySystems
+import Systems
+import Cells
+import Worldspace
+from Results import RunResults
+from RandomStreams import RandomStreams
+from PairedComparison import PairedComparison
+
+class PairedComparisonTest(unittest.TestCase):
+    def setUp(self):
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 20
+        Worldspace.GRID_HEIGHT = 15
+
+        Cells.EpithelialCell.CELL_LIFESPAN = 2280
+        Cells.EpithelialCell.INFECT_RATE = 2.0
+        Cells.EpithelialCell.INFECT_LIFESPAN = 144
+        Cells.EpithelialCell.EXPRESS_DELAY = 24
+        Cells.EpithelialCell.INFECT_DELAY = 12
+        Cells.EpithelialCell.DIVISION_TIME = 72
+        Cells.ImmuneCell.IMM_LIFESPAN = 1008
+
+        Systems.EpithelialSystem.INFECT_INIT = 0.05
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Systems.ImmuneSystem.BASE_IMM_CELL = 0.02
+        Systems.ImmuneSystem.RECRUITMENT = 0.25
+        Systems.ImmuneSystem.RECRUITMENT_DELAY = 7
+        Systems.FocusSystem.ENABLED = False
+
+        PairedComparison.CONFIDENCE = 0.95
+
+    def simulate(self, seed, run, timesteps):
+        streams = RandomStreams.forSubsystems(seed, run)
+        eSys = ArraySystems.ArrayEpithelialSystem(streams[0], fixedRolls=True)
+        immSys = ArraySystems.ArrayImmuneSystem(eSys, streams[1])
+        eSys.initialise()
+        immSys.initialise()
+        initialState = eSys.stateGrid().copy()
+        initialAges = eSys.age.copy()
+
+        results = RunResults(timesteps - 1, immSys.INIT_CELLS)
+        for t in xrange(timesteps):
+            eSys.update()
+            immSys.update()
+            eSys.synchronise()
+            immSys.synchronise()
+            results.record(t, eSys, immSys)
+        return results, initialState, initialAges
+
+    def test_pairsShareEpithelialDraws(self):
+        resultsA, stateA, agesA = self.simulate(5, 2, 60)
+        Systems.ImmuneSystem.RECRUITMENT = 2.0
+        resultsB, stateB, agesB = self.simulate(5, 2, 60)
+
+        self.assertTrue(np.array_equal(stateA, stateB))
+        self.assertTrue(np.array_equal(agesA, agesB))
+        self.assertFalse(np.array_equal(resultsA.immCounts, resultsB.immCounts))
+
+    def test_identicalConfigurationsHaveNoDifference(self):
+        comparison = PairedComparison()
+        for run in xrange(3):
+            comparison.addPair(self.simulate(1, run, 40)[0], self.simulate(1, run, 40)[0])
+
+        self.assertEquals(comparison.pairs, 3)
+        for mean, halfWidth in comparison.differences().values():
+            self.assertEquals(mean.shape, (40,))
+            self.assertFalse(mean.any())
+            self.assertFalse(halfWidth.any())
+
+    def test_differences(self):
+        comparison = PairedComparison()
+        for shift in [2, 4]:
+            resultsA = RunResults(3, 1)
+            resultsB = RunResults(3, 1)
+            resultsA.eCounts[:, Cells.EpithelialStates.HEALTHY] = 10
+            resultsB.eCounts[:, Cells.EpithelialStates.HEALTHY] = 10 + shift
+            comparison.addPair(resultsA, resultsB)
+
+        mean, halfWidth = comparison.differences()["healthy"]
+        self.assertTrue(np.allclose(mean, 3.0))
+        self.assertTrue(np.all(halfWidth > 1.0))
+        self.assertFalse(comparison.differences()["infected"][0].any())
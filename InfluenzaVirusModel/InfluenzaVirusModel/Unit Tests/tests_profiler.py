@@ -0,0 +1,33 @@
+import unittest
+from Profiler import Profiler
+
+class Counter(object):
+    def increment(self, value):
+        return value + 1
+
+class ProfilerTest(unittest.TestCase):
+    def tearDown(self):
+        Profiler.restore()
+        Profiler.phases.clear()
+
+    def test_instrument(self):
+        original = Counter.__dict__["increment"]
+        Profiler.instrument(Counter, "increment", "Counter.increment")
+        self.assertNotEqual(Counter.__dict__["increment"], original)
+
+        counter = Counter()
+        self.assertEquals(counter.increment(1), 2)
+        self.assertEquals(counter.increment(2), 3)
+        self.assertEquals(Profiler.phases["Counter.increment"][0], 2)
+        self.assertTrue(Profiler.phases["Counter.increment"][1] >= 0.0)
+
+        Profiler.restore()
+        self.assertEquals(Counter.__dict__["increment"], original)
+        self.assertEquals(Profiler.instrumented, [])
+
+    def test_instrumentSimulation(self):
+        Profiler.instrumentSimulation()
+        names = ["_EpithelialSystem__updateAge", "_ImmuneSystem__updateMovement", "_FocusSystem__updateCollisions", "drawSimWorld"]
+        instrumented = [attrName for owner, attrName, original in Profiler.instrumented]
+        for name in names:
+            self.assertTrue(name in instrumented)
@@ -0,0 +1,57 @@
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from Recorder import StateRecorder, StateReader
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def createFrames(self, count, width, height):
+        rng = np.random.RandomState(0)
+        state = np.zeros((width, height), dtype=np.uint8)
+        immune = np.zeros((width, height), dtype=np.uint8)
+        frames = []
+        for i in xrange(count):
+            state[rng.randint(width), rng.randint(height)] = rng.randint(6)
+            immune[:] = 0
+            immune[rng.randint(width), rng.randint(height)] = 1
+            frames.append((i * 6, state.copy(), immune.copy()))
+        return frames
+
+    def test_roundTrip(self):
+        frames = self.createFrames(11, 7, 5)
+        recorder = StateRecorder(self.folder, 7, 5, interval=6, chunkFrames=4)
+        for timesteps, state, immune in frames:
+            recorder.record(timesteps, state, immune)
+        recorder.close()
+
+        reader = StateReader(self.folder)
+        self.assertEquals(reader.frameCount, 11)
+        self.assertEquals(reader.chunkCount, 3)
+
+        read = list(reader.frames())
+        self.assertEquals(len(read), len(frames))
+        for (timesteps, state, immune), (readTime, readState, readImmune) in zip(frames, read):
+            self.assertEquals(timesteps, readTime)
+            self.assertTrue(np.array_equal(state, readState))
+            self.assertTrue(np.array_equal(immune, readImmune))
+
+    def test_exportMemmap(self):
+        frames = self.createFrames(5, 4, 3)
+        recorder = StateRecorder(self.folder, 4, 3, chunkFrames=2)
+        for timesteps, state, immune in frames:
+            recorder.record(timesteps, state, immune)
+        recorder.close()
+
+        times, stateStack, immuneStack = StateReader(self.folder).exportMemmap()
+        self.assertTrue(isinstance(stateStack, np.memmap))
+        self.assertEquals(stateStack.shape, (5, 4, 3))
+        for i in xrange(len(frames)):
+            self.assertEquals(times[i], frames[i][0])
+            self.assertTrue(np.array_equal(stateStack[i], frames[i][1]))
+            self.assertTrue(np.array_equal(immuneStack[i], frames[i][2]))
@@ -0,0 +1,59 @@
+import os
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+
+from Recorder import StateRecorder
+from Replay import FrameRenderer, replay, ANIMATION_FILE_NAME
+from SimulationVisualization import sitePalette, VIRGIN_CATEGORY, CANVAS_TEXT_PADDING
+from Cells import EpithelialStates
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.recordingFolder = os.path.join(self.folder, "run1")
+        self.outputFolder = os.path.join(self.folder, "replay")
+
+        recorder = StateRecorder(self.recordingFolder, 12, 8, interval=6, chunkFrames=4)
+        state = np.zeros((12, 8), dtype=np.uint8)
+        immune = np.zeros((12, 8), dtype=np.uint8)
+        for i in xrange(10):
+            state[i, 2] = EpithelialStates.INFECTIOUS
+            immune[:] = 0
+            immune[11 - i, 5] = 1
+            recorder.record(i * 6, state, immune)
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_framesRenderedInOrder(self):
+        renderer = FrameRenderer(12, 8, squareSize=3)
+        paths = replay(self.recordingFolder, self.outputFolder, renderer, workers=2, animation=True)
+        self.assertEquals(len(paths), 10)
+        self.assertEquals(paths, sorted(paths))
+        self.assertTrue(os.path.exists(os.path.join(self.outputFolder, ANIMATION_FILE_NAME)))
+
+        palette = sitePalette()
+        image = Image.open(paths[3]).convert("RGB")
+        self.assertEquals(image.size, (36, 24 + CANVAS_TEXT_PADDING))
+        self.assertEquals(image.getpixel((3 * 3 + 1, 2 * 3 + 1)), tuple(palette[EpithelialStates.INFECTIOUS]))
+        self.assertEquals(image.getpixel((4 * 3 + 1, 2 * 3 + 1)), tuple(palette[EpithelialStates.HEALTHY]))
+        self.assertEquals(image.getpixel((8 * 3 + 1, 5 * 3 + 1)), tuple(palette[VIRGIN_CATEGORY]))
+
+    def test_cropAndOverview(self):
+        cropped = FrameRenderer(12, 8, crop=(2, 1, 5, 4), squareSize=2, immune=False)
+        self.assertEquals(cropped.size(), (10, 8 + CANVAS_TEXT_PADDING))
+        states = np.zeros((12, 8), dtype=np.uint8)
+        states[2, 1] = EpithelialStates.NATURAL_DEATH
+        image = cropped.render(0, states, np.ones((12, 8), dtype=np.uint8))
+        self.assertEquals(image.getpixel((0, 0)), tuple(sitePalette()[EpithelialStates.NATURAL_DEATH]))
+        self.assertEquals(image.getpixel((2, 0)), tuple(sitePalette()[EpithelialStates.HEALTHY]))
+
+        overview = FrameRenderer(12, 8, squareSize=4, overviewSize=6)
+        self.assertEquals((overview.blockSize, overview.size()), (2, (6, 4 + CANVAS_TEXT_PADDING)))
+        self.assertEquals(overview.render(0, states, states).size, overview.size())
+
+        self.assertRaises(ValueError, FrameRenderer, 12, 8, (10, 0, 5, 4))
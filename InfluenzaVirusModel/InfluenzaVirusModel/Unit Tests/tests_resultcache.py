@@ -0,0 +1,66 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+import Cells
+import Worldspace
+from Results import RunResults
+from ResultCache import ResultCache, OBJECT_ENGINE, ARRAY_ENGINE
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        Worldspace.GRID_WIDTH = 20
+        Cells.ImmuneCell.IMM_LIFESPAN = 1008
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def createResults(self, fill):
+        results = RunResults(10, 3)
+        results.eCounts[:] = fill
+        results.immCounts[:] = fill
+        results.fociAreas[:] = fill / 2.0
+        return results
+
+    def test_keyCoversConfigurationAndRun(self):
+        key = ResultCache.runKey(OBJECT_ENGINE, 1, 0, 10)
+        self.assertEquals(key, ResultCache.runKey(OBJECT_ENGINE, 1, 0, 10))
+        self.assertNotEqual(key, ResultCache.runKey(ARRAY_ENGINE, 1, 0, 10))
+        self.assertNotEqual(key, ResultCache.runKey(OBJECT_ENGINE, 2, 0, 10))
+        self.assertNotEqual(key, ResultCache.runKey(OBJECT_ENGINE, 1, 1, 10))
+
+        Cells.ImmuneCell.IMM_LIFESPAN = 1009
+        self.assertNotEqual(key, ResultCache.runKey(OBJECT_ENGINE, 1, 0, 10))
+
+    def test_storeAndLoad(self):
+        cache = ResultCache(self.folder, 1024 * 1024)
+        self.assertEquals(cache.load("missing"), None)
+
+        cache.store("key", self.createResults(7))
+        results = cache.load("key")
+        self.assertEquals((results.runTime, results.initCells), (10, 3))
+        self.assertTrue(np.array_equal(results.eCounts, self.createResults(7).eCounts))
+        self.assertTrue(np.array_equal(results.fociAreas, self.createResults(7).fociAreas))
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+    def test_evictsLeastRecentlyUsed(self):
+        cache = ResultCache(self.folder, 1024 * 1024)
+        cache.store("a", self.createResults(1))
+        size = os.path.getsize(os.path.join(self.folder, "a.npz"))
+        cache.maxSize = 2 * size
+
+        # File times can be as coarse as a second
+        past = time.time() - 100
+        os.utime(os.path.join(self.folder, "a.npz"), (past, past))
+        cache.store("b", self.createResults(2))
+        os.utime(os.path.join(self.folder, "b.npz"), (past - 10, past - 10))
+        cache.load("a")
+
+        cache.store("c", self.createResults(3))
+        self.assertNotEqual(cache.load("a"), None)
+        self.assertEquals(cache.load("b"), None)
+        self.assertNotEqual(cache.load("c"), None)
@@ -0,0 +1,41 @@
+import unittest
+import multiprocessing
+import numpy as np
+
+from SharedResults import SharedResults
+
+def fillRun(sharedResults, run, value):
+    results = sharedResults.runResults(run)
+    results.eCounts[:] = value
+    results.immCounts[:] = value
+    results.fociAreas[:] = value / 2.0
+
+class SharedResultsTest(unittest.TestCase):
+    def test_runResultsAreViews(self):
+        sharedResults = SharedResults(3, 4)
+        results = sharedResults.runResults(1, 7)
+        results.eCounts[2, 0] = 5
+        results.fociAreas[3] = 1.5
+
+        self.assertEquals(results.initCells, 7)
+        self.assertEquals(results.eCounts.shape, (5, 6))
+        self.assertEquals(sharedResults.eCounts[1, 2, 0], 5)
+        self.assertEquals(sharedResults.fociAreas[1, 3], 1.5)
+        self.assertFalse(sharedResults.eCounts[0].any())
+
+    def test_stateSharesBuffers(self):
+        sharedResults = SharedResults(2, 3)
+        restored = SharedResults.__new__(SharedResults)
+        restored.__setstate__(sharedResults.__getstate__())
+        restored.runResults(1).immCounts[0, 1] = 9
+        self.assertEquals(sharedResults.immCounts[1, 0, 1], 9)
+
+    def test_workerWritesAreSeen(self):
+        sharedResults = SharedResults(2, 10)
+        process = multiprocessing.Process(target=fillRun, args=(sharedResults, 1, 4))
+        process.start()
+        process.join()
+
+        self.assertTrue(np.all(sharedResults.eCounts[1] == 4))
+        self.assertTrue(np.all(sharedResults.fociAreas[1] == 2.0))
+        self.assertFalse(sharedResults.eCounts[0].any())
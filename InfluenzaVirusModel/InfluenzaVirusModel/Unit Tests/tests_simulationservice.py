@@ -0,0 +1,59 @@
+import json
+import time
+import unittest
+import urllib2
+
+import Config
+from SimulationService import SimulationService, parseSpec, RUNS_PATH, STATUS_PATH
+
+class SimulationServiceTest(unittest.TestCase):
+    def setUp(self):
+        options = Config.ConfigReader().defaultOptions() + [("World", "iGridWidth", "30"), ("World", "iGridHeight", "20"),
+                                                            ("General", "iRunTime", "40"), ("EpithelialSystem", "fInfectInit", "0.05")]
+        self.service = SimulationService(("localhost", 0), workers=1, options=options)
+        self.service.start()
+        self.url = "http://%s:%d" % self.service.address
+
+    def tearDown(self):
+        self.service.close()
+
+    def post(self, body):
+        response = urllib2.urlopen(self.url + RUNS_PATH, json.dumps(body), timeout=60)
+        return [json.loads(line) for line in response]
+
+    def test_runStreamsCounters(self):
+        spec = {"options": {"ImmuneSystem": {"fBaseImmCell": 0.01}}, "seed": 3, "run": 1}
+        events = self.post(spec)
+        self.assertEquals([event["event"] for event in events[:2]], ["queued", "started"])
+        self.assertEquals(events[-1]["event"], "finished")
+
+        timesteps = events[2:-1]
+        self.assertEquals([event["timesteps"] for event in timesteps], range(41))
+        healthy = [row[0] for row in events[-1]["eCounts"]]
+        self.assertEquals([event["counters"]["healthyCount"] for event in timesteps], healthy)
+        self.assertEquals(events[-1]["eCounts"], self.post(spec)[-1]["eCounts"])
+
+        every = self.post(dict(spec, every=10))
+        self.assertEquals([event["timesteps"] for event in every[2:-1]], [0, 10, 20, 30, 40])
+
+    def test_badRunsRefused(self):
+        for body in [{"options": {"World": {"iGridDepth": 3}}}, {"run": -1}, {"every": "often"}, [1]]:
+            try:
+                self.post(body)
+                self.fail("%s was accepted" % body)
+            except urllib2.HTTPError as e:
+                self.assertEquals(e.code, 400)
+        self.assertRaises(ValueError, parseSpec, {"options": {"World": 3}}, [], 0)
+
+        status = json.load(urllib2.urlopen(self.url + STATUS_PATH, timeout=60))
+        self.assertEquals((status["workers"], status["running"], status["queued"]), (1, 0, 0))
+
+    def test_exitedWorkerReplaced(self):
+        while self.service.pool.status()["idle"] == 0:
+            time.sleep(0.05)
+        process = self.service.pool.processes[0]
+        process.terminate()
+        process.join()
+        events = self.post({"seed": 1})
+        self.assertEquals(events[-1]["event"], "finished")
+        self.assertTrue(self.service.pool.processes[0].is_alive())
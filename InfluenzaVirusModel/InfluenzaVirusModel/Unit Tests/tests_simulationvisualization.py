@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+
+from SimulationVisualization import overviewColours, overviewLayout, OVERVIEW_MAJORITY, OVERVIEW_BLEND, MATURE_CATEGORY
+from Cells import EpithelialStates
+
+class OverviewTest(unittest.TestCase):
+    def setUp(self):
+        self.palette = np.zeros((MATURE_CATEGORY + 1, 3), dtype=np.uint8)
+        self.palette[:, 0] = np.arange(MATURE_CATEGORY + 1) * 30
+
+    def test_layoutFitsSize(self):
+        self.assertEquals(overviewLayout(440, 280, 800, 4), (1, 440, 280, 1))
+        self.assertEquals(overviewLayout(100, 60, 800, 4), (1, 100, 60, 4))
+        self.assertEquals(overviewLayout(20000, 5000, 800, 4), (25, 800, 200, 1))
+        self.assertEquals(overviewLayout(1001, 10, 500, 4), (3, 334, 4, 1))
+
+    def test_blocksMatchSiteByBlock(self):
+        rng = np.random.RandomState(0)
+        width, height, blockSize = 23, 17, 4
+        states = rng.randint(0, 6, (width, height)).astype(np.uint8)
+        virgin = (rng.random_sample((width, height)) < 0.1).astype(np.int64)
+        mature = (rng.random_sample((width, height)) < 0.05).astype(np.int64)
+
+        categories = states.astype(np.int64)
+        categories[virgin > 0] = MATURE_CATEGORY - 1
+        categories[mature > 0] = MATURE_CATEGORY
+
+        majority = overviewColours(states, virgin, mature, blockSize, self.palette, OVERVIEW_MAJORITY)
+        blend = overviewColours(states, virgin, mature, blockSize, self.palette, OVERVIEW_BLEND)
+        self.assertEquals(majority.shape, (6, 5, 3))
+        self.assertEquals(blend.shape, (6, 5, 3))
+
+        for bx in xrange(6):
+            for by in xrange(5):
+                block = categories[bx * blockSize:(bx + 1) * blockSize, by * blockSize:(by + 1) * blockSize].ravel()
+                counts = np.bincount(block, minlength=MATURE_CATEGORY + 1)
+                self.assertTrue(np.array_equal(majority[bx, by], self.palette[counts.argmax()]))
+                self.assertEquals(blend[bx, by, 0], np.round(self.palette[block, 0].mean()))
+
+    def test_bandsCoverGrid(self):
+        import SimulationVisualization
+        states = np.full((50, 30), EpithelialStates.HEALTHY, dtype=np.uint8)
+        states[49, 28:] = EpithelialStates.INFECTIOUS
+        empty = np.zeros((50, 30), dtype=np.int64)
+
+        bandSites = SimulationVisualization.OVERVIEW_BAND_SITES
+        SimulationVisualization.OVERVIEW_BAND_SITES = 1
+        try:
+            colours = overviewColours(states, empty, empty, 7, self.palette, OVERVIEW_MAJORITY)
+        finally:
+            SimulationVisualization.OVERVIEW_BAND_SITES = bandSites
+        self.assertEquals(colours.shape, (8, 5, 3))
+        self.assertEquals(colours[7, 4, 0], self.palette[EpithelialStates.INFECTIOUS, 0])
+        self.assertEquals(colours[0, 0, 0], self.palette[EpithelialStates.HEALTHY, 0])
@@ -0,0 +1,181 @@
+import unittest
+import numpy as np
+
+import SparseSystems
+import ArraySystems
+import Kernels
+import Systems
+import Cells
+import Worldspace
+from Cells import EpithelialStates
+from FastForward import FastForward
+
+class SparseSystemsTest(unittest.TestCase):
+    def setUp(self):
+        Worldspace.ISTOROIDAL = True
+        Worldspace.GRID_WIDTH = 45
+        Worldspace.GRID_HEIGHT = 38
+
+        Cells.EpithelialCell.CELL_LIFESPAN = 300
+        Cells.EpithelialCell.INFECT_RATE = 2.0
+        Cells.EpithelialCell.INFECT_LIFESPAN = 40
+        Cells.EpithelialCell.EXPRESS_DELAY = 6
+        Cells.EpithelialCell.INFECT_DELAY = 4
+        Cells.EpithelialCell.DIVISION_TIME = 72
+        Cells.ImmuneCell.IMM_LIFESPAN = 200
+
+        Systems.EpithelialSystem.INFECT_INIT = 0.002
+        Systems.EpithelialSystem.REGEN_ENABLED = False
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Systems.ImmuneSystem.ISENABLED = True
+        Systems.ImmuneSystem.BASE_IMM_CELL = 0.02
+        Systems.ImmuneSystem.RECRUITMENT = 0.25
+        Systems.ImmuneSystem.RECRUITMENT_DELAY = 7
+        Systems.ImmuneSystem.INIT_CELLS = 34
+        Systems.FocusSystem.ENABLED = False
+
+        SparseSystems.SparseEpithelialSystem.CHUNK_SIZE = 8
+        SparseSystems.HybridEpithelialSystem.FRONT_DISTANCE = 8
+        FastForward.ENABLED = True
+
+    def createSystems(self, seed=0):
+        eSys = SparseSystems.SparseEpithelialSystem(np.random.RandomState(seed))
+        immSys = SparseSystems.SparseImmuneSystem(eSys)
+        eSys.initialise()
+        immSys.initialise()
+        return eSys, immSys
+
+    def step(self, eSys, immSys):
+        eSys.update()
+        immSys.update()
+        eSys.synchronise()
+        immSys.synchronise()
+
+    def assertCountsMatchGrid(self, eSys):
+        grid = eSys.stateGrid()
+        self.assertEquals(grid.shape, (Worldspace.GRID_WIDTH, Worldspace.GRID_HEIGHT))
+        self.assertTrue(np.array_equal(np.bincount(grid.ravel(), minlength=6), eSys.counts))
+        self.assertEquals(eSys.healthyAgeCounts().sum(), eSys.healthyCount)
+
+    def test_countsMatchGrid(self):
+        for toroidal in [True, False]:
+            Worldspace.ISTOROIDAL = toroidal
+            eSys, immSys = self.createSystems()
+            self.assertCountsMatchGrid(eSys)
+            for k in xrange(120):
+                self.step(eSys, immSys)
+                self.assertCountsMatchGrid(eSys)
+            self.assertTrue(eSys.infectionDeathCount > 0)
+
+    def test_pristineChunksStayImplicit(self):
+        Worldspace.GRID_WIDTH = Worldspace.GRID_HEIGHT = 800
+        Systems.EpithelialSystem.INFECT_INIT = 1.0 / (800 * 800)
+        Systems.ImmuneSystem.ISENABLED = False
+        eSys = SparseSystems.SparseEpithelialSystem(np.random.RandomState(1))
+        eSys.initialise()
+        self.assertEquals(eSys.materialisedChunks(), 1)
+
+        for k in xrange(10):
+            eSys.update()
+            eSys.synchronise()
+        self.assertEquals(eSys.materialisedChunks(), 9)
+        self.assertTrue(eSys.naturalDeathCount > 0)
+        self.assertEquals(eSys.counts.sum(), 800 * 800)
+
+    def test_regenerationMaterialisesBeforeNaturalDeath(self):
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        Systems.EpithelialSystem.RANDOM_AGE = False
+        eSys, immSys = self.createSystems()
+        for k in xrange(5):
+            self.step(eSys, immSys)
+        self.assertTrue(eSys.materialisedChunks() < 30)
+
+        # With random ages, some cell of every chunk is close to old age
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        eSys, immSys = self.createSystems()
+        for k in xrange(40):
+            self.step(eSys, immSys)
+            self.assertCountsMatchGrid(eSys)
+        self.assertEquals(eSys.materialisedChunks(), 30)
+
+    def test_projectionMatchesStepping(self):
+        eSys, immSys = self.createSystems(3)
+        while not FastForward.isAbsorbed(eSys.containingCount + eSys.expressingCount + eSys.infectiousCount):
+            self.step(eSys, immSys)
+
+        eCounts, immCounts = FastForward.projectSystems(eSys, immSys, 320)
+        for k in xrange(320):
+            self.step(eSys, immSys)
+            self.assertTrue(np.array_equal(eCounts[k], eSys.counts))
+        self.assertEquals(eSys.healthyCount, 0)
+
+    def createHybridSystems(self, seed=0):
+        eSys = SparseSystems.HybridEpithelialSystem(np.random.RandomState(seed))
+        immSys = SparseSystems.SparseImmuneSystem(eSys)
+        eSys.initialise()
+        immSys.initialise()
+        return eSys, immSys
+
+    def test_hybridCountsMatchGrid(self):
+        Cells.EpithelialCell.CELL_LIFESPAN = 90
+        infectionDeaths = 0
+        for toroidal, regen in [(True, True), (False, True), (True, False)]:
+            Worldspace.ISTOROIDAL = toroidal
+            Systems.EpithelialSystem.REGEN_ENABLED = regen
+            eSys, immSys = self.createHybridSystems()
+            self.assertCountsMatchGrid(eSys)
+            for k in xrange(120):
+                self.step(eSys, immSys)
+                self.assertCountsMatchGrid(eSys)
+                materialised = np.repeat(np.repeat(eSys.slots != Kernels.NO_SLOT, 8, axis=0), 8, axis=1)[:45, :38]
+                self.assertEquals(eSys.aggregateCells() + np.count_nonzero(materialised), 45 * 38)
+                infectionDeaths += eSys.infectionDeathCount
+        self.assertTrue(infectionDeaths > 0)
+
+    def test_hybridMatchesArrayBackend(self):
+        # With every cell born at once and no infection spreading, the aggregate steps as the cells would one by one
+        Systems.EpithelialSystem.RANDOM_AGE = False
+        Cells.EpithelialCell.CELL_LIFESPAN = 30
+        Cells.EpithelialCell.INFECT_RATE = 0.0
+        Systems.ImmuneSystem.ISENABLED = False
+        hybrid = SparseSystems.HybridEpithelialSystem(np.random.RandomState(0))
+        dense = ArraySystems.ArrayEpithelialSystem(np.random.RandomState(0))
+        for eSys in [hybrid, dense]:
+            eSys.initialise()
+        for k in xrange(70):
+            for eSys in [hybrid, dense]:
+                eSys.update()
+                eSys.synchronise()
+            self.assertTrue(np.array_equal(hybrid.counts, dense.counts))
+
+        # With regeneration, the counters agree in distribution
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        Systems.EpithelialSystem.RANDOM_AGE = True
+        Cells.EpithelialCell.DIVISION_TIME = 10
+        Worldspace.GRID_WIDTH = Worldspace.GRID_HEIGHT = 80
+        healthy = {}
+        for name, system in [("hybrid", SparseSystems.HybridEpithelialSystem), ("dense", ArraySystems.ArrayEpithelialSystem)]:
+            healthy[name] = []
+            for seed in xrange(4):
+                eSys = system(np.random.RandomState(seed))
+                eSys.initialise()
+                for k in xrange(100):
+                    eSys.update()
+                    eSys.synchronise()
+                healthy[name].append(eSys.healthyCount)
+        self.assertTrue(abs(np.mean(healthy["hybrid"]) - np.mean(healthy["dense"])) < 0.02 * 80 * 80)
+
+    def test_farTissueStaysAggregated(self):
+        Worldspace.GRID_WIDTH = Worldspace.GRID_HEIGHT = 800
+        Systems.EpithelialSystem.INFECT_INIT = 1.0 / (800 * 800)
+        Systems.EpithelialSystem.REGEN_ENABLED = True
+        Systems.ImmuneSystem.ISENABLED = False
+        eSys = SparseSystems.HybridEpithelialSystem(np.random.RandomState(1))
+        eSys.initialise()
+        for k in xrange(10):
+            eSys.update()
+            eSys.synchronise()
+        self.assertEquals(eSys.materialisedChunks(), 9)
+        self.assertTrue(eSys.naturalDeathCount > 0 and eSys.healthyCount + eSys.naturalDeathCount > 800 * 800 - 9 * 64)
+        self.assertEquals(eSys.counts.sum(), 800 * 800)
+        self.assertEquals(eSys.healthyAgeCounts().sum(), eSys.healthyCount)
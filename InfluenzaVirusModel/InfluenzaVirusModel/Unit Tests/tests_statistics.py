@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+
+from Statistics import RunningStatistics, AdaptiveRuns, studentT, PEAK_INFECTED
+
+class StatisticsTest(unittest.TestCase):
+    def setUp(self):
+        AdaptiveRuns.MIN_RUNS = 3
+        AdaptiveRuns.TARGET_WIDTH = 0.1
+        AdaptiveRuns.CONFIDENCE = 0.95
+
+    def test_runningStatisticsMatchNumpy(self):
+        values = np.random.RandomState(0).normal(5.0, 2.0, 500)
+        statistics = RunningStatistics()
+        for value in values:
+            statistics.add(value)
+
+        self.assertEquals(statistics.count, 500)
+        self.assertAlmostEqual(statistics.mean, values.mean())
+        self.assertAlmostEqual(statistics.variance(), values.var(ddof=1))
+
+    def test_studentT(self):
+        self.assertAlmostEqual(studentT(0.95, 4), 2.776, places=1)
+        self.assertAlmostEqual(studentT(0.95, 29), 2.045, places=2)
+        self.assertAlmostEqual(studentT(0.99, 1000), 2.576, places=2)
+
+    def test_convergence(self):
+        adaptiveRuns = AdaptiveRuns([PEAK_INFECTED])
+        adaptiveRuns.addRun({PEAK_INFECTED: 1.0})
+        adaptiveRuns.addRun({PEAK_INFECTED: 1.0})
+        self.assertFalse(adaptiveRuns.isConverged())
+
+        adaptiveRuns.addRun({PEAK_INFECTED: 1.0})
+        self.assertTrue(adaptiveRuns.isConverged())
+
+        adaptiveRuns.addRun({PEAK_INFECTED: 2.0})
+        self.assertFalse(adaptiveRuns.isConverged())
@@ -0,0 +1,62 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from Cells import EpithelialStates, ImmuneStates
+from Results import TimestepCounters, EPITHELIAL_STATE_COUNT, IMMUNE_STATE_COUNT
+from Summary import RunSummary, SummaryWriter, SUMMARY_FILE_NAME
+from Logger import CSV_FORMAT, JSON_FORMAT
+
+class SummaryTest(unittest.TestCase):
+    def counters(self, infectious, infectionDeaths, virgin):
+        eCounts = [0] * EPITHELIAL_STATE_COUNT
+        eCounts[EpithelialStates.INFECTIOUS] = infectious
+        eCounts[EpithelialStates.INFECTION_DEATH] = infectionDeaths
+        immCounts = [0] * IMMUNE_STATE_COUNT
+        immCounts[ImmuneStates.VIRGIN] = virgin
+        return TimestepCounters(eCounts, immCounts)
+
+    def createSummary(self):
+        summary = RunSummary(2)
+        for timesteps, (infectious, infectionDeaths, virgin) in enumerate([(1, 0, 5), (4, 1, 9), (2, 3, 7), (0, 2, 8), (0, 4, 3)]):
+            counters = self.counters(infectious, infectionDeaths, virgin)
+            summary.update(timesteps, counters, counters, timesteps * 0.5)
+        return summary
+
+    def test_update(self):
+        fields = self.createSummary().record()
+        self.assertEquals(fields["run"], 3)
+        self.assertEquals((fields["peakInfected"], fields["peakInfectedTime"]), (4, 1))
+        self.assertEquals(fields["infectionDeaths"], 5)
+        self.assertEquals(fields["extinctionTime"], 3)
+        self.assertEquals(fields["maxImmune"], 9)
+        self.assertEquals(fields["finalFociArea"], 2.0)
+
+    def test_neverExtinct(self):
+        summary = RunSummary(0)
+        counters = self.counters(1, 0, 0)
+        summary.update(0, counters, counters)
+        self.assertEquals(summary.record()["extinctionTime"], None)
+
+    def test_writer(self):
+        folder = tempfile.mkdtemp()
+        try:
+            writer = SummaryWriter(folder, CSV_FORMAT)
+            writer.write(self.createSummary())
+            writer.write(RunSummary(3))
+            writer.close()
+            with open(os.path.join(folder, SUMMARY_FILE_NAME + ".csv")) as f:
+                lines = f.read().splitlines()
+            self.assertEquals(lines[0], ",".join(RunSummary(0).record().keys()))
+            self.assertEquals(lines[1], "3,4,1,5,3,9,2.0")
+            self.assertEquals(lines[2], "4,0,0,0,,0,0.0")
+
+            writer = SummaryWriter(folder, JSON_FORMAT)
+            writer.write(self.createSummary())
+            writer.close()
+            with open(os.path.join(folder, SUMMARY_FILE_NAME + ".jsonl")) as f:
+                self.assertEquals(json.loads(f.readline())["infectionDeaths"], 5)
+        finally:
+            shutil.rmtree(folder)
@@ -79,6 +79,82 @@ class Focus:
         self.isEnabled = True
         self.id        = id
 
+        # Bounding box of the sites the focus has covered, as offsets from the origin. It only grows, so it stays a
+        # bound of the focus when cells are removed.
+        self.minDx = self.maxDx = 0
+        self.minDy = self.maxDy = 0
+
+    def extendBounds(self, location):
+        """Grows the bounding box of the focus to cover a site. In a toroidal world the offset of the site is taken the
+        short way round, so that a focus across the edge of the grid keeps a small box.
+
+        Keyword arguments:
+        location -- Vector2d, (x, y) coordinate of the site.
+
+        Returns True if the box grew.
+        """
+        dx = location.x - self.origin.location.x
+        dy = location.y - self.origin.location.y
+        if ISTOROIDAL:
+            dx = (dx + GRID_WIDTH / 2) % GRID_WIDTH - GRID_WIDTH / 2
+            dy = (dy + GRID_HEIGHT / 2) % GRID_HEIGHT - GRID_HEIGHT / 2
+
+        grew = False
+        if dx < self.minDx:
+            self.minDx = dx
+            grew = True
+        elif dx > self.maxDx:
+            self.maxDx = dx
+            grew = True
+        if dy < self.minDy:
+            self.minDy = dy
+            grew = True
+        elif dy > self.maxDy:
+            self.maxDy = dy
+            grew = True
+        return grew
+
+    def bounds(self):
+        """Gets the bounding box of the focus. The box covers the sites from x to x + width and y to y + height, both
+        inclusive, wrapping round the edges of a toroidal world.
+
+        Returns tuple (x, width, y, height).
+        """
+        width = min(self.maxDx - self.minDx, GRID_WIDTH - 1)
+        height = min(self.maxDy - self.minDy, GRID_HEIGHT - 1)
+        return ((self.origin.location.x + self.minDx) % GRID_WIDTH, width,
+                (self.origin.location.y + self.minDy) % GRID_HEIGHT, height)
+
+def intervalsTouch(startA, extentA, startB, extentB, size):
+    """Returns True if interval A overlaps interval B, or is next to it. Intervals cover start to start + extent
+    inclusive, wrapping round a toroidal world.
+
+    Keyword arguments:
+    startA, extentA -- Interval A.
+    startB, extentB -- Interval B.
+    size -- Size of the world along the axis of the intervals.
+    """
+    if ISTOROIDAL:
+        # Interval A grown by a site at each end covers every site
+        if extentA + 2 >= size - 1:
+            return True
+        offset = (startB - (startA - 1)) % size
+        return offset <= extentA + 2 or offset + extentB >= size
+    return startB <= startA + extentA + 1 and startA - 1 <= startB + extentB
+
+def intervalNear(start, extent, value, size):
+    """Returns True if a coordinate is in an interval or next to it. The interval covers start to start + extent
+    inclusive, wrapping round a toroidal world.
+
+    Keyword arguments:
+    start, extent -- The interval.
+    value -- The coordinate.
+    size -- Size of the world along the axis of the interval.
+    """
+    if ISTOROIDAL:
+        return (value - (start - 1)) % size <= extent + 2
+    return start - 1 <= value <= start + extent + 1
+
 def getMooreNeighbourStateCount(world, location, state):
         """Parses through the adjacent sites in the toroidal world, returns number of Moore neighbours that possess the given state.
         
@@ -98,22 +174,22 @@ def getMooreNeighbourStateCount(world, location, state):
             if world[x-1 if x-1 > -1 else GRID_WIDTH-1][y].getECell().State == state:
                 neighbour += 1
 
-            if world[x-1 if x-1 > -1 else GRID_WIDTH-1][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell().State == state:
+            if world[x-1 if x-1 > -1 else GRID_WIDTH-1][y+1 if y+1<GRID_HEIGHT else 0].getECell().State == state:
                 neighbour += 1
 
             if world[x][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell().State == state:
                 neighbour += 1
 
-            if world[x][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell().State == state:
+            if world[x][y+1 if y+1<GRID_HEIGHT else 0].getECell().State == state:
                 neighbour += 1
 
-            if world[x+1 if x+1 < GRID_WIDTH-1 else 0][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell().State == state:
+            if world[x+1 if x+1 < GRID_WIDTH else 0][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell().State == state:
                 neighbour += 1
 
-            if world[x+1 if x+1 < GRID_WIDTH-1 else 0][y].getECell().State == state:
+            if world[x+1 if x+1 < GRID_WIDTH else 0][y].getECell().State == state:
                 neighbour += 1
 
-            if world[x+1 if x+1 < GRID_WIDTH-1 else 0][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell().State == state:
+            if world[x+1 if x+1 < GRID_WIDTH else 0][y+1 if y+1<GRID_HEIGHT else 0].getECell().State == state:
                 neighbour += 1
         else:
             if x-1 >= 0 and y-1 >= 0 and world[x-1][y-1].getECell().State == state:
@@ -161,23 +237,23 @@ def getMooreNeighbours(world, location, state = None):
         if world[x-1 if x-1 > -1 else GRID_WIDTH-1][y].getECell().State == state or state == None:
             neighbours.append(world[x-1 if x-1 > -1 else GRID_WIDTH-1][y].getECell())
 
-        if world[x-1 if x-1 > -1 else GRID_WIDTH-1][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell().State == state or state == None:
-            neighbours.append(world[x-1 if x-1 > -1 else GRID_WIDTH-1][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell())
+        if world[x-1 if x-1 > -1 else GRID_WIDTH-1][y+1 if y+1<GRID_HEIGHT else 0].getECell().State == state or state == None:
+            neighbours.append(world[x-1 if x-1 > -1 else GRID_WIDTH-1][y+1 if y+1<GRID_HEIGHT else 0].getECell())
 
         if world[x][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell().State == state or state == None:
             neighbours.append(world[x][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell())
 
-        if world[x][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell().State == state or state == None:
-            neighbours.append(world[x][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell())
+        if world[x][y+1 if y+1<GRID_HEIGHT else 0].getECell().State == state or state == None:
+            neighbours.append(world[x][y+1 if y+1<GRID_HEIGHT else 0].getECell())
 
-        if world[x+1 if x+1 < GRID_WIDTH-1 else 0][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell().State == state or state == None:
-            neighbours.append(world[x+1 if x+1 < GRID_WIDTH-1 else 0][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell())
+        if world[x+1 if x+1 < GRID_WIDTH else 0][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell().State == state or state == None:
+            neighbours.append(world[x+1 if x+1 < GRID_WIDTH else 0][y-1 if y-1>-1 else GRID_HEIGHT-1].getECell())
 
-        if world[x+1 if x+1 < GRID_WIDTH-1 else 0][y].getECell().State == state or state == None:
-            neighbours.append(world[x+1 if x+1 < GRID_WIDTH-1 else 0][y].getECell())
+        if world[x+1 if x+1 < GRID_WIDTH else 0][y].getECell().State == state or state == None:
+            neighbours.append(world[x+1 if x+1 < GRID_WIDTH else 0][y].getECell())
 
-        if world[x+1 if x+1 < GRID_WIDTH-1 else 0][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell().State == state or state == None:
-            neighbours.append(world[x+1 if x+1 < GRID_WIDTH-1 else 0][y+1 if y+1<GRID_HEIGHT-1 else 0].getECell())
+        if world[x+1 if x+1 < GRID_WIDTH else 0][y+1 if y+1<GRID_HEIGHT else 0].getECell().State == state or state == None:
+            neighbours.append(world[x+1 if x+1 < GRID_WIDTH else 0][y+1 if y+1<GRID_HEIGHT else 0].getECell())
     else:
         if x-1 >= 0 and y-1 >= 0 and world[x-1][y-1].getECell().State == state or state == None:
             neighbours.append(world[x-1][y-1].getECell())